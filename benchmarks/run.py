@@ -0,0 +1,236 @@
+"""
+benchmarks of pipeline stages on synthetic data, run from the project root:
+
+    python -m benchmarks.run --contracts 1000 --dates 20 --save results.json
+    python -m benchmarks.run --contracts 1000 --dates 20 --baseline results.json
+
+exit code is 1 if any stage is slower than baseline * tolerance.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import numpy as np
+from datetime import datetime
+from typing import Callable
+from husfort.qutility import SFG, SFY, SFR
+from typedef import EnumSigs, EnumStrategyName, CAccountTianqin
+from solutions.contracts import CContractIndex
+from solutions.fuai import get_fuai_cache_paths
+from solutions.md_store import CMdSnapshotStore
+from solutions.positions import convert_signal_to_positions, load_position_fuai, load_position_tqdb
+from solutions.trades import cal_trades_from_pos, split_trades, load_trades
+from solutions.orders import (
+    convert_trades_to_orders, update_price_tianqin, update_price_wind, save_orders, flush_orders_archive,
+)
+from benchmarks.synthetic import (
+    CSyntheticInstruMgr, gen_contracts, gen_dates, gen_signals, gen_fuai_exports, gen_trades_files,
+    gen_quote_snapshot, gen_wind_cache,
+    SIGNALS_FILE_NAME_TMPL, POSITIONS_FILE_NAME_TQDB_TMPL, POSITIONS_FILE_NAME_FUAI_TMPL,
+    TRADES_FILE_NAME_TMPL, ORDERS_FILE_NAME_TMPL,
+)
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic data")
+    arg_parser.add_argument("--contracts", type=int, default=500, help="number of contracts, 10 ~ 10000")
+    arg_parser.add_argument("--dates", type=int, default=10, help="number of dates")
+    arg_parser.add_argument("--accounts", type=int, default=4, help="number of accounts in Fuai exports")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="repeats of each stage")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--dst", type=str, default=None,
+                            help="directory for synthetic data, a temporary one is used and removed if not provided")
+    arg_parser.add_argument("--save", type=str, default=None, help="path to save results as json")
+    arg_parser.add_argument("--baseline", type=str, default=None, help="path of baseline results to compare with")
+    arg_parser.add_argument("--tolerance", type=float, default=1.25,
+                            help="a stage is regressed if its median is slower than baseline * tolerance")
+    return arg_parser.parse_args()
+
+
+def bench(name: str, fn: Callable[[], int], repeat: int) -> dict:
+    """
+
+    :param fn: runs the stage once, returns number of rows processed
+    :return: {"median", "min", "max", "rows", "rows_per_sec"}, in seconds
+    """
+    elapsed, rows = [], 0
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            rows = fn()
+            elapsed.append(time.perf_counter() - t0)
+    median = float(np.median(elapsed))
+    res = {
+        "median": median, "min": min(elapsed), "max": max(elapsed),
+        "rows": rows, "rows_per_sec": rows / median if median > 0 else None,
+    }
+    print(f"[INF] {name:<28s} median = {SFG(f'{median * 1000:10.2f}')} ms, rows = {rows}")
+    return res
+
+
+def run_benchmarks(args, data_dir: str) -> dict[str, dict]:
+    rng = np.random.default_rng(args.seed)
+    instru_mgr = CSyntheticInstruMgr(n_instrus=max(args.contracts // 2, 1), seed=args.seed)
+    contracts = gen_contracts(instru_mgr, args.contracts)
+    dates = gen_dates(args.dates)
+    dirs = {k: os.path.join(data_dir, k) for k in ["signals", "positions", "trades", "orders", "md_snapshots"]}
+    contract_index = CContractIndex(instru_mgr)
+    tq_codes = contract_index.lookup(contracts, "tq_code").tolist()
+    wind_codes = contract_index.lookup(contracts, "wind_code").tolist()
+
+    print(f"[INF] Generating data of {SFG(len(contracts))} contracts and {SFG(len(dates))} dates in {SFG(data_dir)}")
+    gen_signals(dates, contracts, dirs["signals"], rng)
+    gen_fuai_exports(dates, contracts, dirs["positions"], rng, n_accounts=args.accounts)
+    gen_trades_files(dates, contracts, dirs["trades"], rng)
+    md_store = CMdSnapshotStore(dirs["md_snapshots"], ttl=1e9)
+    gen_quote_snapshot(tq_codes, md_store, rng)
+    wind_cache = gen_wind_cache(dates, wind_codes, os.path.join(data_dir, "wind_md.csv"), rng)
+    pairs = [(d, t) for d in dates for t in EnumSigs]
+    results: dict[str, dict] = {}
+
+    def __positions() -> int:
+        for d, t in pairs:
+            convert_signal_to_positions(
+                sig_date=d, sig_type=t,
+                signals_file_name_tmpl=SIGNALS_FILE_NAME_TMPL, positions_file_name_tmpl=POSITIONS_FILE_NAME_TQDB_TMPL,
+                signals_dir=dirs["signals"], positions_dir=dirs["positions"],
+                allocated_equity=1e8, instru_mgr=instru_mgr, contract_index=contract_index,
+            )
+        return len(pairs) * int(len(contracts) * 0.8)
+
+    def __parse_fuai() -> int:
+        for d in dates:
+            pos_path = os.path.join(dirs["positions"], d[0:4], d[4:6], POSITIONS_FILE_NAME_FUAI_TMPL.format(d))
+            for cache_path in get_fuai_cache_paths(pos_path):
+                if os.path.exists(cache_path):
+                    os.remove(cache_path)
+            load_position_fuai(d, EnumSigs.opn, POSITIONS_FILE_NAME_FUAI_TMPL, dirs["positions"])
+        return len(dates) * len(contracts) * args.accounts
+
+    def __load_fuai() -> int:
+        return sum(
+            len(load_position_fuai(d, t, POSITIONS_FILE_NAME_FUAI_TMPL, dirs["positions"])) for d, t in pairs
+        )
+
+    results["convert_signal_to_positions"] = bench("convert_signal_to_positions", __positions, args.repeat)
+    results["parse_fuai_export"] = bench("parse_fuai_export", __parse_fuai, 1)
+    results["load_position_fuai"] = bench("load_position_fuai", __load_fuai, args.repeat)
+
+    this_grps = [load_position_tqdb(d, t, POSITIONS_FILE_NAME_TQDB_TMPL, dirs["positions"]) for d, t in pairs]
+    prev_grps = [load_position_fuai(d, t, POSITIONS_FILE_NAME_FUAI_TMPL, dirs["positions"]) for d, t in pairs]
+    trades_list = [load_trades(d, t, TRADES_FILE_NAME_TMPL, dirs["trades"]) for d, t in pairs]
+    n_trades = sum(len(z) for z in trades_list)
+
+    results["cal_trades_from_pos"] = bench(
+        "cal_trades_from_pos",
+        lambda: sum(len(cal_trades_from_pos(a, b)) for a, b in zip(this_grps, prev_grps)),
+        args.repeat,
+    )
+
+    def __split_trades() -> int:
+        for trades in trades_list:
+            split_trades(trades, instru_mgr, contract_index)
+        return n_trades
+
+    results["split_trades"] = bench("split_trades", __split_trades, args.repeat)
+
+    def __orders(t: EnumSigs, z: list):
+        return convert_trades_to_orders(z, instru_mgr, 0.03, EnumStrategyName[t.value].value, contract_index)
+
+    results["convert_trades_to_orders"] = bench(
+        "convert_trades_to_orders",
+        lambda: sum(len(__orders(t, z)) for (_, t), z in zip(pairs, trades_list)),
+        args.repeat,
+    )
+    orders_list = [__orders(t, z) for (_, t), z in zip(pairs, trades_list)]
+    n_orders = sum(len(z) for z in orders_list)
+    account = CAccountTianqin(userId="", password="")
+
+    def __price_tianqin() -> int:
+        for orders in orders_list:
+            update_price_tianqin(orders, account, instru_mgr, 0.03, md_store=md_store, contract_index=contract_index)
+        return n_orders
+
+    def __price_wind() -> int:
+        for (d, _), orders in zip(pairs, orders_list):
+            update_price_wind(orders, instru_mgr, 0.03, d, wind_cache=wind_cache, contract_index=contract_index)
+        return n_orders
+
+    def __save_orders() -> int:
+        for (d, t), orders in zip(pairs, orders_list):
+            save_orders(orders, d, d, t.value, "pm", ORDERS_FILE_NAME_TMPL, dirs["orders"])
+        flush_orders_archive()
+        return n_orders
+
+    results["update_price_tianqin"] = bench("update_price_tianqin(snapshot)", __price_tianqin, args.repeat)
+    results["update_price_wind"] = bench("update_price_wind(cache)", __price_wind, args.repeat)
+    results["save_orders"] = bench("save_orders", __save_orders, args.repeat)
+    return results
+
+
+def compare_with_baseline(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    """
+
+    :return: names of regressed stages
+    """
+    regressed = []
+    print(f"[INF] {'stage':<28s} {'baseline(ms)':>14s} {'current(ms)':>14s} {'ratio':>8s}")
+    for name, res in results.items():
+        if (base := baseline.get(name)) is None:
+            print(f"[INF] {name:<28s} {'-':>14s} {res['median'] * 1000:14.2f} {'-':>8s}")
+            continue
+        ratio = res["median"] / base["median"] if base["median"] > 0 else float("inf")
+        line = f"{name:<28s} {base['median'] * 1000:14.2f} {res['median'] * 1000:14.2f} {ratio:8.2f}"
+        if ratio > tolerance:
+            regressed.append(name)
+            print(f"[WRN] {SFR(line)}")
+        else:
+            print(f"[INF] {line}")
+    return regressed
+
+
+def main():
+    args = parse_args()
+    data_dir = args.dst or tempfile.mkdtemp(prefix="bench_")
+    try:
+        results = run_benchmarks(args, data_dir)
+    finally:
+        if args.dst is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "contracts": args.contracts,
+            "dates": args.dates,
+            "accounts": args.accounts,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INF] Results are saved to {SFG(args.save)}")
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline["meta"]["contracts"] != args.contracts or baseline["meta"]["dates"] != args.dates:
+            print(f"[WRN] Scale of baseline {SFY(args.baseline)} is different from this run")
+        if regressed := compare_with_baseline(results, baseline["results"], args.tolerance):
+            print(f"[WRN] {SFR(len(regressed))} stages are regressed: {SFR(', '.join(regressed))}")
+            sys.exit(1)
+    return 0
+
+
+if __name__ == "__main__":
+    main()
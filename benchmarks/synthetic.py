@@ -0,0 +1,167 @@
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from dataclasses import fields
+from husfort.qutility import check_and_makedirs
+from typedef import CDepthMd, CTradeBatch, EnumSigs, EnumStrategyName, WIND_EXCHANGE
+from solutions.md import CWindMdCache
+from solutions.md_store import CMdSnapshotStore
+
+SIGNALS_FILE_NAME_TMPL = "signals_sig-date_{}_{}.csv"
+POSITIONS_FILE_NAME_TQDB_TMPL = "positions_sig-date_{}_{}.csv"
+POSITIONS_FILE_NAME_FUAI_TMPL = "持仓汇总-{}.xls"
+TRADES_FILE_NAME_TMPL = "trades_sig-date_{}_{}.csv"
+ORDERS_FILE_NAME_TMPL = "orders_sig-date_{}_exe-date_{}_{}_{}_{}.xls"
+
+
+class CSyntheticInstruMgr:
+    def __init__(self, n_instrus: int, seed: int = 0):
+        """
+        stand-in of CInstruMgr for instruments named like "abc", with random exchange,
+        multiplier, mini spread and night session
+
+        """
+        rng = np.random.default_rng(seed)
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        names = itertools.chain(
+            ("".join(z) for z in itertools.product(letters, repeat=2)),
+            ("".join(z) for z in itertools.product(letters, repeat=3)),
+        )
+        self.instrus = list(itertools.islice(names, n_instrus))
+        exchanges = list(WIND_EXCHANGE)
+        self.info = pd.DataFrame({
+            "exchange": rng.choice(exchanges, size=n_instrus),
+            "multiplier": rng.choice([5, 10, 20, 100, 1000], size=n_instrus),
+            "mini_spread": rng.choice([0.2, 0.5, 1.0, 2.0, 5.0], size=n_instrus),
+            "has_ngt_sec": rng.random(size=n_instrus) < 0.6,
+        }, index=self.instrus)
+
+    def get_exchange(self, instrumentId: str) -> str:
+        return self.info.at[instrumentId, "exchange"]
+
+    def get_multiplier(self, instrumentId: str) -> int:
+        return int(self.info.at[instrumentId, "multiplier"])
+
+    def get_mini_spread(self, instrumentId: str) -> float:
+        return float(self.info.at[instrumentId, "mini_spread"])
+
+    def has_ngt_sec(self, instrumentId: str) -> bool:
+        return bool(self.info.at[instrumentId, "has_ngt_sec"])
+
+
+def gen_contracts(instru_mgr: CSyntheticInstruMgr, n_contracts: int) -> list[str]:
+    months = ["2505", "2509", "2601", "2605"]
+    contracts = [f"{instru}{m}" for m in months for instru in instru_mgr.instrus]
+    return contracts[0:n_contracts]
+
+
+def gen_dates(n_dates: int, bgn_date: str = "20250102") -> list[str]:
+    return pd.bdate_range(start=bgn_date, periods=n_dates).strftime("%Y%m%d").tolist()
+
+
+def get_month_dir(root_dir: str, date: str) -> str:
+    check_and_makedirs(d := os.path.join(root_dir, date[0:4], date[4:6]))
+    return d
+
+
+def gen_signals(
+        dates: list[str],
+        contracts: list[str],
+        signals_dir: str,
+        rng: np.random.Generator,
+        coverage: float = 0.8,
+):
+    """
+    one signal file for each (date, type), a random subset of contracts with weights summing to 0
+    """
+    close = pd.Series(rng.uniform(1000, 8000, size=len(contracts)), index=contracts)
+    for date in dates:
+        close *= np.exp(rng.normal(0, 0.01, size=len(contracts)))
+        for sig_type in EnumSigs:
+            selected = rng.random(len(contracts)) < coverage
+            weight = rng.normal(0, 1, size=selected.sum())
+            weight = (weight - weight.mean()) / np.abs(weight).sum()
+            df = pd.DataFrame({
+                "contract": np.array(contracts)[selected],
+                "weight": weight,
+                "close": close[selected].round(1).to_numpy(),
+            })
+            sig_file = SIGNALS_FILE_NAME_TMPL.format(date, sig_type.value)
+            df.to_csv(os.path.join(get_month_dir(signals_dir, date), sig_file), index=False)
+    return 0
+
+
+def gen_fuai_exports(
+        dates: list[str],
+        contracts: list[str],
+        positions_dir: str,
+        rng: np.random.Generator,
+        n_accounts: int = 4,
+):
+    """
+    one 持仓汇总 export for each date, with both strategy accounts and n_accounts - 2 others.
+    Saved as xlsx content with the .xls name of Fuai, pandas detects the format from content.
+    """
+    accounts = [s.value for s in EnumStrategyName] + [f"其他账户{i}" for i in range(max(n_accounts - 2, 0))]
+    for date in dates:
+        dfs = []
+        for account in accounts:
+            held = np.array(contracts)[rng.random(len(contracts)) < 0.5]
+            dfs.append(pd.DataFrame({
+                "合约": held,
+                "策略账户": account,
+                "买总持仓": rng.integers(0, 50, size=len(held)),
+                "卖总持仓": rng.integers(0, 50, size=len(held)),
+            }))
+        pos_file = POSITIONS_FILE_NAME_FUAI_TMPL.format(date)
+        pos_path = os.path.join(get_month_dir(positions_dir, date), pos_file)
+        pd.concat(dfs, axis=0, ignore_index=True).to_excel(pos_path, index=False, engine="openpyxl")
+    return 0
+
+
+def gen_trades_files(
+        dates: list[str],
+        contracts: list[str],
+        trades_dir: str,
+        rng: np.random.Generator,
+):
+    for date in dates:
+        for sig_type in EnumSigs:
+            n = len(contracts)
+            batch = CTradeBatch(
+                contract=np.array(contracts, dtype=object),
+                direction=rng.choice([1, -1], size=n),
+                qty=rng.integers(1, 50, size=n),
+                offset=rng.choice([1, -1], size=n),
+                base_price=rng.uniform(1000, 8000, size=n).round(1),
+                order_price=np.full(n, np.nan),
+            )
+            trades_file = TRADES_FILE_NAME_TMPL.format(date, sig_type.value)
+            batch.to_frame().to_csv(os.path.join(get_month_dir(trades_dir, date), trades_file), index=False)
+    return 0
+
+
+def gen_depth_md(tq_contracts: list[str], rng: np.random.Generator) -> dict[str, CDepthMd]:
+    n = len(tq_contracts)
+    last = rng.uniform(1000, 8000, size=n)
+    data = {f.name: rng.uniform(0, 1e4, size=n) for f in fields(CDepthMd)}
+    data.update(last=last, pre_close=last, upper_lim=last * 1.07, lower_lim=last * 0.93)
+    return {c: CDepthMd(**{k: float(v[i]) for k, v in data.items()}) for i, c in enumerate(tq_contracts)}
+
+
+def gen_quote_snapshot(tq_contracts: list[str], store: CMdSnapshotStore, rng: np.random.Generator) -> str:
+    return store.save(gen_depth_md(tq_contracts, rng))
+
+
+def gen_wind_cache(
+        dates: list[str],
+        wind_codes: list[str],
+        wind_cache_path: str,
+        rng: np.random.Generator,
+) -> CWindMdCache:
+    rows = [(code, date, rng.uniform(1000, 8000), 7.0) for date in dates for code in wind_codes]
+    df = pd.DataFrame(rows, columns=["code", "trade_date", "settle", "changelt"])
+    check_and_makedirs(os.path.dirname(wind_cache_path))
+    df.to_csv(wind_cache_path, index=False)
+    return CWindMdCache(wind_cache_path, readonly=True)
@@ -5,6 +5,10 @@ def parse_args():
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument(
         "-d", "--date", type=str, required=True, help="date of signals, format=[YYYYMMDD]")
+    arg_parser.add_argument(
+        "--mdttl", type=float, default=None,
+        help="seconds, quotes stored in md snapshots younger than it are reused instead of requested again. "
+             "Default is 0 for orders and daily, which always request live quotes, and 300 for others")
 
     sub_arg_parsers = arg_parser.add_subparsers(
         title="switch to sub functions",
@@ -20,10 +24,23 @@ def parse_args():
         "--bgn", type=str, default="20241201", help="begin date, format = [YYYYMMDD]")
 
     # --- sync signals
-    sub_arg_parsers.add_parser(name="sync", help="Sync signals")
+    sub_arg_parser = sub_arg_parsers.add_parser(name="sync", help="Sync signals")
+    sub_arg_parser.add_argument(
+        "--bgn", type=str, default=None,
+        help="begin date of range mode, format = [YYYYMMDD]. If not provided, only '--date' is synced")
+    sub_arg_parser.add_argument(
+        "--end", type=str, default=None,
+        help="end date (included) of range mode, format = [YYYYMMDD], default is '--date'")
+    sub_arg_parser.add_argument("--workers", type=int, default=8, help="number of concurrent downloads")
 
     # --- positions
-    sub_arg_parsers.add_parser(name="positions", help="Calculate positions from allocated and signals")
+    sub_arg_parser = sub_arg_parsers.add_parser(name="positions", help="Calculate positions from allocated and signals")
+    sub_arg_parser.add_argument(
+        "--bgn", type=str, default=None,
+        help="begin date of range mode, format = [YYYYMMDD]. If not provided, only '--date' is converted")
+    sub_arg_parser.add_argument(
+        "--end", type=str, default=None,
+        help="end date (included) of range mode, format = [YYYYMMDD], default is '--date'")
 
     # --- trades
     sub_arg_parser = sub_arg_parsers.add_parser(name="trades", help="Calculate trades from positions")
@@ -35,40 +52,114 @@ def parse_args():
     sub_arg_parser.add_argument("--sec", type=str, required=True, choices=("opn", "cls"), help="open or close")
     sub_arg_parser.add_argument("--rt", default=False, action="store_true", help="use real time data")
     sub_arg_parser.add_argument("--send", default=False, action="store_true", help="send emails")
+    sub_arg_parser.add_argument("--force", default=False, action="store_true",
+                                help="send orders again even if they were delivered")
+    sub_arg_parser.add_argument("--timeout", type=float, default=60.0,
+                                help="seconds to wait for real time data, contracts without real time data "
+                                     "are priced with settle from Wind")
+
+    # --- dispatch
+    sub_arg_parsers.add_parser(name="dispatch", help="Resume pending deliveries of orders in outbox")
+
+    # --- daily
+    sub_arg_parser = sub_arg_parsers.add_parser(
+        name="daily", help="Run allocated -> sync -> positions -> trades -> orders in one process")
+    sub_arg_parser.add_argument(
+        "--bgn", type=str, default="20241201", help="begin date for allocated equity, format = [YYYYMMDD]")
+    sub_arg_parser.add_argument("--usetq", default=False, action="store_true",
+                                help="Use this flag to use trans-quant data instead of fuai data")
+    sub_arg_parser.add_argument("--secs", type=str, nargs="+", default=["opn"], choices=("opn", "cls"),
+                                help="sections to generate orders for")
+    sub_arg_parser.add_argument("--rt", default=False, action="store_true", help="use real time data")
+    sub_arg_parser.add_argument("--send", default=False, action="store_true", help="send emails")
+    sub_arg_parser.add_argument("--force", default=False, action="store_true",
+                                help="send orders again even if they were delivered")
+    sub_arg_parser.add_argument("--workers", type=int, default=4, help="max number of concurrent stages")
+
+    # --- replay
+    sub_arg_parser = sub_arg_parsers.add_parser(
+        name="replay", help="Run signals -> positions -> trades -> orders over a range of history dates")
+    sub_arg_parser.add_argument("--bgn", type=str, required=True, help="begin date, format = [YYYYMMDD]")
+    sub_arg_parser.add_argument(
+        "--end", type=str, default=None, help="end date (included), format = [YYYYMMDD], default is '--date'")
+    sub_arg_parser.add_argument(
+        "--signals", type=str, default=None, help="directory of signals to replay, default is signals of project")
+    sub_arg_parser.add_argument(
+        "--dst", type=str, default=None, help="directory to save replayed artifacts, default is replay of project")
+    sub_arg_parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
 
     # --- check
     sub_arg_parser = sub_arg_parsers.add_parser(name="check", help="Check positions")
-    sub_arg_parser.add_argument("--sec", type=str, required=True, choices=("opn", "cls"), help="open or close")
+    sub_arg_parser.add_argument("--sec", type=str, default=None, choices=("opn", "cls"),
+                                help="open or close, required if '--bgn' is not provided, "
+                                     "both are checked in range mode if not provided")
+    sub_arg_parser.add_argument(
+        "--bgn", type=str, default=None,
+        help="begin signal date of range mode, format = [YYYYMMDD]. If not provided, only '--date' is checked")
+    sub_arg_parser.add_argument(
+        "--end", type=str, default=None,
+        help="end signal date (included) of range mode, format = [YYYYMMDD], default is '--date'")
 
     # --- pnl
     sub_arg_parser = sub_arg_parsers.add_parser(name="pnl", help="View pnl")
-    sub_arg_parser.add_argument("--sec", type=str, required=True, choices=("opn", "cls"), help="open or close")
+    sub_arg_parser.add_argument("--sec", type=str, default=None, choices=("opn", "cls"),
+                                help="open or close, required if '--stream' is not provided")
+    sub_arg_parser.add_argument("--stream", default=False, action="store_true",
+                                help="stream pnl of both accounts in console")
+    sub_arg_parser.add_argument("--refresh", type=float, default=2.0,
+                                help="seconds between two publications of streaming pnl")
+    sub_arg_parser.add_argument("--duration", type=float, default=None,
+                                help="seconds to stream, default is until Ctrl+C")
+
+    # --- nav
+    sub_arg_parser = sub_arg_parsers.add_parser(name="nav", help="Calculate history daily pnl and nav")
+    sub_arg_parser.add_argument(
+        "--bgn", type=str, default="20241201", help="first trade date, format = [YYYYMMDD]")
 
     # --- tests
     sub_arg_parser = sub_arg_parsers.add_parser(name="test", help="do some tests")
     sub_arg_parser.add_argument(
         "--sub", type=str, required=True, choices=("tianqin", "wind"), help="'tianqin' or 'wind'",
     )
+    sub_arg_parser.add_argument(
+        "--standin", type=str, default=None,
+        help="path to a csv file with columns [code, trade_date, settle, changelt], "
+             "use it instead of Wind terminal for '--sub wind'",
+    )
     __args = arg_parser.parse_args()
     return __args
 
 
 if __name__ == "__main__":
     import sys
-    from husfort.qcalendar import CCalendar
-    from husfort.qinstruments import CInstruMgr
+    import time
+    import atexit
     from husfort.qutility import SFY
     from typedef import EnumSigs
     from config import cfg
+    from solutions.snapshots import load_trade_dates, load_instru_mgr, CLazy
+    from solutions.calendar_index import CCalendarIndex
+    from solutions.trace import TRACER, get_trace_path
 
-    calendar = CCalendar(cfg.calendar_path)
-    instru_mgr = CInstruMgr(instru_info_path=cfg.instru_info_path)
     args = parse_args()
     sig_date = args.date
+
+    # stages record their spans to TRACER, which is saved as one json file per run on exit
+    TRACER.meta.update(sig_date=sig_date, switch=args.switch, argv=sys.argv[1:], start=time.time())
+
+    def save_trace():
+        TRACER.meta["wall"] = time.time() - TRACER.meta["start"]
+        TRACER.save(get_trace_path(cfg.traces_dir, run_id=f"{sig_date}_{args.switch}"))
+
+    atexit.register(save_trace)
+    calendar = CCalendarIndex(load_trade_dates(cfg.calendar_path, cfg.snapshots_dir))
     if not calendar.has_date(sig_date):
         print(f"[INF] {SFY(sig_date)} is not a valid trade date")
         sys.exit(0)
 
+    # instruments are loaded from local snapshot on first use, subcommands not using them skip loading
+    instru_mgr = CLazy(lambda: load_instru_mgr(cfg.instru_info_path, cfg.snapshots_dir))
+
     if args.switch == "allocated":
         from solutions.allocated_equity import gen_allocated_equity_from_cash_flow
 
@@ -82,40 +173,72 @@ if __name__ == "__main__":
             calendar=calendar,
         )
     elif args.switch == "sync":
-        from solutions.sync import download_signals_from
+        from solutions.sync import download_signals_range
+        from solutions.signal_store import CSignalStore
 
-        for sig_type in EnumSigs:
-            download_signals_from(
-                sig_date=sig_date,
-                sig_type=sig_type,
-                signals_file_name_tmpl=cfg.signals_file_name_tmpl,
-                src_signals_dir=cfg.src_signals_dir,
-                dst_signals_dir=cfg.signals_dir,
-                host=cfg.host,
-            )
+        if args.bgn is not None:
+            sig_dates = calendar.get_range(args.bgn, calendar.get_next_date(args.end or sig_date, shift=1)).tolist()
+        else:
+            sig_dates = [sig_date]
+        download_signals_range(
+            sig_dates=sig_dates,
+            sig_types=list(EnumSigs),
+            signals_file_name_tmpl=cfg.signals_file_name_tmpl,
+            src_signals_dir=cfg.src_signals_dir,
+            dst_signals_dir=cfg.signals_dir,
+            host=cfg.host,
+            max_workers=args.workers,
+        )
+        CSignalStore(cfg.signal_store_dir).ingest(
+            sig_dates=sig_dates,
+            sig_types=list(EnumSigs),
+            signals_file_name_tmpl=cfg.signals_file_name_tmpl,
+            signals_dir=cfg.signals_dir,
+        )
     elif args.switch == "positions":
         from solutions.allocated_equity import CReaderAllocatedEquity
-        from solutions.positions import convert_signal_to_positions
+        from solutions.positions import convert_signal_to_positions, convert_signals_to_positions_range
+        from solutions.contracts import load_contract_index
+        from solutions.signal_store import CSignalStore
 
         reader_alloc = CReaderAllocatedEquity(cfg.allocated_equity_path)
-        for sig_type in EnumSigs:
-            convert_signal_to_positions(
-                sig_date=sig_date,
-                sig_type=sig_type,
+        contract_index = load_contract_index(sig_date, cfg.contracts_dir, instru_mgr, cfg.instru_info_path)
+        if args.bgn is not None:
+            end = args.end or sig_date
+            sig_dates = calendar.get_range(args.bgn, calendar.get_next_date(end, shift=1)).tolist()
+            convert_signals_to_positions_range(
+                sig_dates=sig_dates,
+                sig_types=list(EnumSigs),
                 signals_file_name_tmpl=cfg.signals_file_name_tmpl,
                 positions_file_name_tmpl=cfg.positions_file_name_tqdb_tmpl,
                 signals_dir=cfg.signals_dir,
                 positions_dir=cfg.positions_dir,
-                allocated_equity=reader_alloc.get_allocated_equity(sig_date) * 0.5,
+                allocated_equity=dict(zip(sig_dates, reader_alloc.get_allocated_equity_batch(sig_dates) * 0.5)),
                 instru_mgr=instru_mgr,
+                contract_index=contract_index,
+                signal_store=CSignalStore(cfg.signal_store_dir),
             )
+        else:
+            for sig_type in EnumSigs:
+                convert_signal_to_positions(
+                    sig_date=sig_date,
+                    sig_type=sig_type,
+                    signals_file_name_tmpl=cfg.signals_file_name_tmpl,
+                    positions_file_name_tmpl=cfg.positions_file_name_tqdb_tmpl,
+                    signals_dir=cfg.signals_dir,
+                    positions_dir=cfg.positions_dir,
+                    allocated_equity=reader_alloc.get_allocated_equity(sig_date) * 0.5,
+                    instru_mgr=instru_mgr,
+                    contract_index=contract_index,
+                )
+        contract_index.save()
     elif args.switch == "trades":
-        from solutions.trades import gen_trades
-        from solutions.trades import save_trades
+        from solutions.trades import gen_trades_data
+        from solutions.trades import save_trades_data
 
         prev_sig_date = calendar.get_next_date(sig_date, -1)
         for sig_type in EnumSigs:
-            trades_opn = gen_trades(
+            trades_data = gen_trades_data(
                 this_sig_date=sig_date,
                 prev_sig_date=prev_sig_date,
                 sig_type=sig_type,
@@ -124,14 +247,19 @@ if __name__ == "__main__":
                 positions_dir=cfg.positions_dir,
                 use_tq=args.usetq,
             )
-            save_trades(trades_opn, sig_date, sig_type, cfg.trades_file_name_tmpl, cfg.trades_dir)
+            save_trades_data(trades_data, sig_date, sig_type, cfg.trades_file_name_tmpl, cfg.trades_dir)
     elif args.switch == "orders":
         from solutions.trades import load_trades, split_trades
-        from solutions.orders import main_order
-        from solutions.emails import send_orders_by_emails
-        from solutions.orbit import send_orders_by_orbit
+        from solutions.orders import main_order, flush_orders_archive
+        from solutions.outbox import COutbox, enqueue_orders, make_orders_deliverers
+        from solutions.md_store import CMdSnapshotStore
+        from solutions.md import CWindMdCache
+        from solutions.contracts import load_contract_index
         from typedef import EnumStrategyName
 
+        md_store = CMdSnapshotStore(cfg.md_snapshots_dir, ttl=args.mdttl or 0.0)
+        wind_cache = CWindMdCache(cfg.wind_md_cache_path)
+        contract_index = load_contract_index(sig_date, cfg.contracts_dir, instru_mgr, cfg.instru_info_path)
         exe_date = calendar.get_next_date(sig_date, shift=1)
         sig_type = EnumSigs(args.sec)
         trades = load_trades(
@@ -139,7 +267,7 @@ if __name__ == "__main__":
             trades_file_name_tmpl=cfg.trades_file_name_tmpl, trades_dir=cfg.trades_dir,
         )
         if args.sec == "opn":
-            opn_pm_trades, opn_am_trades = split_trades(trades, instru_mgr)
+            opn_pm_trades, opn_am_trades = split_trades(trades, instru_mgr, contract_index=contract_index)
             for tds, am_or_pm in zip([opn_pm_trades, opn_am_trades], ["pm", "am"]):
                 main_order(
                     trades=tds, sig_date=sig_date, exe_date=exe_date,
@@ -147,6 +275,8 @@ if __name__ == "__main__":
                     drift=cfg.drift, instru_mgr=instru_mgr,
                     using_rt=args.rt, account_tianqin=cfg.account_tianqin,
                     orders_file_name_tmpl=cfg.orders_file_name_tmpl, orders_dir=cfg.orders_dir,
+                    rt_timeout=args.timeout, md_store=md_store, wind_cache=wind_cache,
+                    contract_index=contract_index,
                 )
         elif args.sec == "cls":
             main_order(
@@ -155,69 +285,191 @@ if __name__ == "__main__":
                 drift=cfg.drift, instru_mgr=instru_mgr,
                 using_rt=args.rt, account_tianqin=cfg.account_tianqin,
                 orders_file_name_tmpl=cfg.orders_file_name_tmpl, orders_dir=cfg.orders_dir,
+                rt_timeout=args.timeout, md_store=md_store, wind_cache=wind_cache,
+                contract_index=contract_index,
             )
+        contract_index.save()
+        # errors of writing archive are raised before orders are dispatched
+        flush_orders_archive()
         if args.send:
-            send_orders_by_emails(
+            deliverers = make_orders_deliverers(
                 account_mail=cfg.account_mail,
-                sig_date=sig_date, exe_date=exe_date,
-                sec_type=args.sec,
+                receivers=cfg.receivers,
+                account_orbit=cfg.account_orbit,
                 orders_file_name_tmpl=cfg.orders_file_name_tmpl,
                 orders_dir=cfg.orders_dir,
-                receivers=cfg.receivers,
+                orbit_dir=cfg.orbit_dir,
             )
-            send_orders_by_orbit(
-                account_orbit=cfg.account_orbit,
+            outbox = COutbox(cfg.outbox_path)
+            job_id = enqueue_orders(
+                outbox=outbox,
                 sig_date=sig_date, exe_date=exe_date,
                 sec_type=args.sec,
                 orders_file_name_tmpl=cfg.orders_file_name_tmpl,
                 orders_dir=cfg.orders_dir,
+                channels=["email", "orbit"],
+                force=args.force,
             )
-    elif args.switch == "check":
-        from solutions.check import check_positions
+            if not outbox.run(deliverers, job_ids=[job_id]):
+                sys.exit(1)
+    elif args.switch == "dispatch":
+        from solutions.outbox import COutbox, make_orders_deliverers
 
-        exe_date = calendar.get_next_date(sig_date, shift=1)
-        sig_type = EnumSigs(args.sec)
-        check_positions(
-            exe_date=exe_date,
+        outbox = COutbox(cfg.outbox_path)
+        deliverers = make_orders_deliverers(
+            account_mail=cfg.account_mail,
+            receivers=cfg.receivers,
+            account_orbit=cfg.account_orbit,
+            orders_file_name_tmpl=cfg.orders_file_name_tmpl,
+            orders_dir=cfg.orders_dir,
+            orbit_dir=cfg.orbit_dir,
+        )
+        if not outbox.run(deliverers):
+            sys.exit(1)
+    elif args.switch == "daily":
+        from solutions.pipeline import run_daily
+
+        run_daily(
             sig_date=sig_date,
-            sig_type=sig_type,
-            positions_file_name_tqdb_tmpl=cfg.positions_file_name_tqdb_tmpl,
-            positions_file_name_fuai_tmpl=cfg.positions_file_name_fuai_tmpl,
-            positions_dir=cfg.positions_dir,
+            bgn_date=args.bgn,
+            secs=args.secs,
+            use_tq=args.usetq,
+            using_rt=args.rt,
+            send=args.send,
+            calendar=calendar,
+            instru_mgr=instru_mgr,
+            cfg=cfg,
+            max_workers=args.workers,
+            force=args.force,
+            md_ttl=args.mdttl or 0.0,
         )
+    elif args.switch == "replay":
+        from solutions.replay import replay
+
+        replay(
+            bgn_date=args.bgn,
+            end_date=args.end or sig_date,
+            signals_dir=args.signals or cfg.signals_dir,
+            replay_dir=args.dst or cfg.replay_dir,
+            calendar=calendar,
+            instru_mgr=instru_mgr,
+            cfg=cfg,
+            max_workers=args.workers,
+        )
+    elif args.switch == "check":
+        from solutions.check import check_positions, check_positions_range
+
+        if args.bgn is not None:
+            sig_dates = calendar.get_range(args.bgn, calendar.get_next_date(args.end or sig_date, shift=1))
+            n_diffs = check_positions_range(
+                sig_dates=sig_dates.tolist(),
+                exe_dates=calendar.shift_batch(sig_dates, 1).tolist(),
+                sig_types=[EnumSigs(args.sec)] if args.sec else list(EnumSigs),
+                positions_file_name_tqdb_tmpl=cfg.positions_file_name_tqdb_tmpl,
+                positions_file_name_fuai_tmpl=cfg.positions_file_name_fuai_tmpl,
+                positions_dir=cfg.positions_dir,
+                checks_dir=cfg.checks_dir,
+            )
+            if n_diffs > 0:
+                sys.exit(1)
+        elif args.sec is None:
+            print("[ERR] '--sec' is required if '--bgn' is not provided")
+            sys.exit(2)
+        else:
+            exe_date = calendar.get_next_date(sig_date, shift=1)
+            sig_type = EnumSigs(args.sec)
+            check_positions(
+                exe_date=exe_date,
+                sig_date=sig_date,
+                sig_type=sig_type,
+                positions_file_name_tqdb_tmpl=cfg.positions_file_name_tqdb_tmpl,
+                positions_file_name_fuai_tmpl=cfg.positions_file_name_fuai_tmpl,
+                positions_dir=cfg.positions_dir,
+            )
     elif args.switch == "pnl":
-        from solutions.view_pnl import view_pnl
+        from solutions.md_store import CMdSnapshotStore
+        from solutions.contracts import load_contract_index
 
         exe_date = calendar.get_next_date(sig_date, shift=1)
-        sig_type = EnumSigs(args.sec)
-        view_pnl(
-            exe_date=exe_date,
-            sig_type=sig_type,
-            account=cfg.account_tianqin,
-            positions_file_name_fuai_tmpl=cfg.positions_file_name_fuai_tmpl,
-            positions_dir=cfg.positions_dir,
+        md_store = CMdSnapshotStore(cfg.md_snapshots_dir, ttl=300.0 if args.mdttl is None else args.mdttl)
+        contract_index = load_contract_index(exe_date, cfg.contracts_dir, instru_mgr, cfg.instru_info_path)
+        if args.stream:
+            from solutions.pnl_stream import stream_pnl
+
+            stream_pnl(
+                exe_date=exe_date,
+                account=cfg.account_tianqin,
+                positions_file_name_fuai_tmpl=cfg.positions_file_name_fuai_tmpl,
+                positions_dir=cfg.positions_dir,
+                instru_mgr=instru_mgr,
+                refresh=args.refresh,
+                duration=args.duration,
+                md_store=md_store,
+                contract_index=contract_index,
+            )
+        elif args.sec is None:
+            print("[ERR] '--sec' is required if '--stream' is not provided")
+            sys.exit(2)
+        else:
+            from solutions.view_pnl import view_pnl
+
+            view_pnl(
+                exe_date=exe_date,
+                sig_type=EnumSigs(args.sec),
+                account=cfg.account_tianqin,
+                positions_file_name_fuai_tmpl=cfg.positions_file_name_fuai_tmpl,
+                positions_dir=cfg.positions_dir,
+                instru_mgr=instru_mgr,
+                md_store=md_store,
+                contract_index=contract_index,
+            )
+        contract_index.save()
+    elif args.switch == "nav":
+        import os
+        import pandas as pd
+        from solutions.pnl_history import gen_pnl_history, get_pnl_paths
+        from solutions.md import CWindMdCache
+        from solutions.contracts import load_contract_index
+
+        contract_index = load_contract_index(sig_date, cfg.contracts_dir, instru_mgr, cfg.instru_info_path)
+        gen_pnl_history(
+            bgn_date=args.bgn,
+            end_date=sig_date,
+            calendar=calendar,
             instru_mgr=instru_mgr,
+            cfg=cfg,
+            pnl_dir=cfg.pnl_dir,
+            wind_cache=CWindMdCache(cfg.wind_md_cache_path),
+            contract_index=contract_index,
         )
+        contract_index.save()
+        nav_path, _ = get_pnl_paths(cfg.pnl_dir)
+        if not os.path.exists(nav_path) or pd.read_csv(nav_path).empty:
+            print(f"[WRN] No pnl is saved for {SFY(args.bgn)} -> {SFY(sig_date)}, check positions, trades and settles")
+            sys.exit(1)
     elif args.switch == "test":
         import pandas as pd
 
         if args.sub == "tianqin":
             from dataclasses import asdict
-            from solutions.md import req_depth_md_tianqin
+            from solutions.md_store import CMdSnapshotStore, req_depth_md_tianqin_with_store
 
-            prices = req_depth_md_tianqin(
+            prices = req_depth_md_tianqin_with_store(
                 tq_contracts=["DCE.a2505", "SHFE.rb2505", "CZCE.CF505"],
                 tq_account=cfg.account_tianqin.userId,
                 tq_password=cfg.account_tianqin.password,
+                store=CMdSnapshotStore(cfg.md_snapshots_dir, ttl=300.0 if args.mdttl is None else args.mdttl),
             )
             print(pd.DataFrame.from_dict({k: asdict(v) for k, v in prices.items()}, orient="index"))
         elif args.sub == "wind":
-            from solutions.md import req_md_trade_date_wind
+            from solutions.md import req_md_wind_batch, set_wind_api, CWindStandIn, CWindMdCache
 
-            data = req_md_trade_date_wind(
-                wd_contracts=["A2505.DCE", "RB2505.SHF", "CF505.CZC"],
-                trade_date=sig_date,
+            if args.standin is not None:
+                set_wind_api(CWindStandIn(args.standin))
+            data = req_md_wind_batch(
+                wd_pairs=[(c, sig_date) for c in ["A2505.DCE", "RB2505.SHF", "CF505.CZC"]],
                 fields=["settle", "changelt"],
+                cache=CWindMdCache(cfg.wind_md_cache_path),
             )
             print(pd.DataFrame.from_dict(data, orient="index"))
         else:
@@ -1,5 +1,9 @@
+import os
+import numpy as np
 import pandas as pd
 from husfort.qcalendar import CCalendar
+from husfort.qutility import SFG
+from solutions.calendar_index import CCalendarIndex
 
 
 def gen_allocated_equity_from_cash_flow(
@@ -7,8 +11,15 @@ def gen_allocated_equity_from_cash_flow(
         stp_date: str,
         cash_flow_path: str,
         allocated_equity_path: str,
-        calendar: CCalendar,
+        calendar: CCalendar | CCalendarIndex,
 ):
+    """
+    allocated_equity.csv is maintained as an append-only ledger:
+    only dates after the last stored one are computed and appended. If a cash flow
+    of a stored date is changed(back-dated), the ledger is recomputed from that date forward.
+    If bgn_date is changed, the ledger is rebuilt.
+
+    """
     cash_flow = pd.read_csv(cash_flow_path, dtype={"trade_date": str})
     trade_dates = calendar.get_iter_list(bgn_date, stp_date)
     allocated_equity = pd.DataFrame({"trade_date": trade_dates}).merge(
@@ -16,15 +27,55 @@ def gen_allocated_equity_from_cash_flow(
         on="trade_date",
         how="left",
     ).fillna(0)
-    allocated_equity["equity"] = allocated_equity["cash_flow"].cumsum()
-    allocated_equity.to_csv(allocated_equity_path, index=False, float_format="%.2f")
-    print(allocated_equity.tail(20))
+
+    restart, base_equity, stored = 0, 0.0, None
+    if os.path.exists(allocated_equity_path):
+        stored = pd.read_csv(allocated_equity_path, dtype={"trade_date": str})
+        if (not stored.empty) and stored["trade_date"].iloc[0] == trade_dates[0]:
+            n = min(len(stored), len(allocated_equity))
+            changed = (stored["trade_date"].to_numpy()[:n] != allocated_equity["trade_date"].to_numpy()[:n]) | (
+                ~np.isclose(stored["cash_flow"].to_numpy()[:n], allocated_equity["cash_flow"].to_numpy()[:n])
+            )
+            restart = int(np.argmax(changed)) if changed.any() else n
+            base_equity = stored["equity"].iloc[restart - 1] if restart > 0 else 0.0
+
+    new_data = allocated_equity.iloc[restart:].copy()
+    new_data["equity"] = base_equity + new_data["cash_flow"].cumsum()
+    if stored is not None and restart == len(stored):
+        if not new_data.empty:
+            new_data.to_csv(allocated_equity_path, mode="a", header=False, index=False, float_format="%.2f")
+        print(f"[INF] {SFG(len(new_data))} dates are appended to {SFG(allocated_equity_path)}")
+    elif stored is not None and restart > 0:
+        ledger = pd.concat([stored.iloc[:restart], new_data], axis=0, ignore_index=True)
+        ledger.to_csv(allocated_equity_path, index=False, float_format="%.2f")
+        print(f"[INF] {SFG(allocated_equity_path)} is recomputed from {SFG(trade_dates[restart])}")
+    else:
+        new_data.to_csv(allocated_equity_path, index=False, float_format="%.2f")
+        print(f"[INF] {SFG(allocated_equity_path)} is rebuilt from {SFG(bgn_date)}")
+    print(new_data.tail(20))
     return 0
 
 
 class CReaderAllocatedEquity:
     def __init__(self, allocated_equity_path: str):
-        self.allocated_equity = pd.read_csv(allocated_equity_path, dtype={"trade_date": str}).set_index("trade_date")
+        allocated_equity = pd.read_csv(allocated_equity_path, dtype={"trade_date": str})
+        self.trade_dates: np.ndarray = allocated_equity["trade_date"].to_numpy(dtype=object)
+        self.equity: np.ndarray = allocated_equity["equity"].to_numpy(dtype=np.float64)
+        self.__ordinals: dict[str, int] = {d: i for i, d in enumerate(self.trade_dates)}
+
+    def get_ordinal(self, trade_date: str) -> int:
+        """
+
+        :param trade_date:
+        :return: ordinal of trade_date in the ledger, the first date of the ledger is 0
+        """
+        return self.__ordinals[trade_date]
+
+    def get_allocated_equity_by_ordinal(self, ordinal: int) -> float:
+        return self.equity[ordinal]
 
     def get_allocated_equity(self, trade_date: str) -> float:
-        return self.allocated_equity.loc[trade_date, "equity"]
+        return self.equity[self.__ordinals[trade_date]]
+
+    def get_allocated_equity_batch(self, trade_dates: list[str]) -> np.ndarray:
+        return self.equity[[self.__ordinals[d] for d in trade_dates]]
@@ -0,0 +1,95 @@
+import numpy as np
+
+
+class CCalendarIndex:
+    def __init__(self, trade_dates: np.ndarray):
+        """
+        trading calendar indexed by ordinal, i.e. the position of a trade date in the calendar.
+        Methods get_next_date, get_iter_list and has_date work like those of CCalendar,
+        so an instance can be passed wherever a calendar is expected.
+
+        :param trade_dates: sorted trade dates as int64 YYYYMMDD, like load_trade_dates
+        """
+        self.trade_dates = np.asarray(trade_dates, dtype=np.int64)
+        self.date_strs: np.ndarray = self.trade_dates.astype(str)
+        self.ordinals: dict[str, int] = {d: i for i, d in enumerate(self.date_strs.tolist())}
+        self.year_keys: np.ndarray = self.trade_dates // 10000
+        self.month_keys: np.ndarray = self.trade_dates // 100
+
+    def __len__(self) -> int:
+        return len(self.trade_dates)
+
+    def has_date(self, trade_date: str) -> bool:
+        return trade_date in self.ordinals
+
+    def get_ordinal(self, trade_date: str) -> int:
+        if (i := self.ordinals.get(trade_date)) is None:
+            raise ValueError(f"{trade_date} is not a trade date")
+        return i
+
+    def get_ordinals(self, trade_dates: list[str] | np.ndarray) -> np.ndarray:
+        """
+
+        :param trade_dates: like ["20250102", "20250103"]
+        :return: ordinal of each date, ValueError is raised if any of them is not a trade date
+        """
+        d = np.asarray(trade_dates).astype(np.int64)
+        i = np.searchsorted(self.trade_dates, d)
+        valid = (i < len(self.trade_dates)) & (self.trade_dates[np.minimum(i, len(self.trade_dates) - 1)] == d)
+        if not valid.all():
+            raise ValueError(f"{np.asarray(trade_dates)[~valid].tolist()} are not trade dates")
+        return i
+
+    def get_date(self, ordinal: int) -> str:
+        if not 0 <= ordinal < len(self.trade_dates):
+            raise IndexError(f"ordinal {ordinal} is out of calendar range")
+        return self.date_strs[ordinal]
+
+    def get_next_date(self, trade_date: str, shift: int = 1) -> str:
+        return self.get_date(self.get_ordinal(trade_date) + shift)
+
+    def shift_batch(self, trade_dates: list[str] | np.ndarray, shift: int | np.ndarray) -> np.ndarray:
+        """
+
+        :param trade_dates:
+        :param shift: one shift for all dates, or one for each date
+        :return: shifted dates as str array
+        """
+        i = self.get_ordinals(trade_dates) + shift
+        if (i < 0).any() or (i >= len(self.trade_dates)).any():
+            raise IndexError(f"shift {shift} moves some dates out of calendar range")
+        return self.date_strs[i]
+
+    def get_range_ordinals(self, bgn_date: str, stp_date: str) -> tuple[int, int]:
+        """
+
+        :return: [bgn, stp) ordinals of trade dates d with bgn_date <= d < stp_date,
+                 bgn_date and stp_date are not required to be trade dates
+        """
+        b = np.searchsorted(self.trade_dates, int(bgn_date), side="left")
+        s = np.searchsorted(self.trade_dates, int(stp_date), side="left")
+        return int(b), int(s)
+
+    def get_range(self, bgn_date: str, stp_date: str) -> np.ndarray:
+        b, s = self.get_range_ordinals(bgn_date, stp_date)
+        return self.date_strs[b:s]
+
+    def get_iter_list(self, bgn_date: str, stp_date: str) -> list[str]:
+        return self.get_range(bgn_date, stp_date).tolist()
+
+    def get_month_key(self, trade_date: str) -> tuple[str, str]:
+        """
+
+        :return: ("YYYY", "MM") of the date, used as partition dirs
+        """
+        m = int(self.month_keys[self.get_ordinal(trade_date)])
+        return f"{m // 100:04d}", f"{m % 100:02d}"
+
+    def get_month_groups(self, trade_dates: list[str] | np.ndarray) -> dict[int, np.ndarray]:
+        """
+
+        :return: {YYYYMM: dates in that month}, dates keep their original order
+        """
+        trade_dates = np.asarray(trade_dates)
+        keys = self.month_keys[self.get_ordinals(trade_dates)]
+        return {int(k): trade_dates[keys == k] for k in np.unique(keys)}
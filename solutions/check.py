@@ -1,7 +1,10 @@
+import os
+import numpy as np
 import pandas as pd
 from typedef import EnumSigs
 from solutions.positions import load_position_tqdb, load_position_fuai
-from husfort.qutility import SFG, SFY
+from solutions.positions import load_position_book_tqdb, load_position_book_fuai, get_position_path_fuai
+from husfort.qutility import check_and_makedirs, SFG, SFY, SFR
 
 
 def check_positions(
@@ -36,3 +39,94 @@ def check_positions(
         print(f"[WRN] {SFY(res_id)} differences exists.")
         print(diff_data)
     return 0
+
+
+def load_position_books_range(
+        sig_dates: list[str],
+        exe_dates: list[str],
+        sig_types: list[EnumSigs],
+        positions_file_name_tqdb_tmpl: str,
+        positions_file_name_fuai_tmpl: str,
+        positions_dir: str,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+
+    :return: target and actual positions of all (sig_date, sig_type) in two long DataFrames,
+             with columns ["sig_date", "exe_date", "sig_type", "contract", "direction", "qty"]
+    """
+    tgt_dfs, act_dfs = [], []
+    for sig_date, exe_date in zip(sig_dates, exe_dates):
+        for sig_type in sig_types:
+            for dfs, book in [
+                (tgt_dfs, load_position_book_tqdb(sig_date, sig_type, positions_file_name_tqdb_tmpl, positions_dir)),
+                (act_dfs, load_position_book_fuai(exe_date, sig_type, positions_file_name_fuai_tmpl, positions_dir)),
+            ]:
+                df = book.to_frame()[["contract", "direction", "qty"]]
+                df.insert(0, "sig_type", sig_type.value)
+                df.insert(0, "exe_date", exe_date)
+                df.insert(0, "sig_date", sig_date)
+                dfs.append(df)
+    return pd.concat(tgt_dfs, axis=0, ignore_index=True), pd.concat(act_dfs, axis=0, ignore_index=True)
+
+
+def check_positions_range(
+        sig_dates: list[str],
+        exe_dates: list[str],
+        sig_types: list[EnumSigs],
+        positions_file_name_tqdb_tmpl: str,
+        positions_file_name_fuai_tmpl: str,
+        positions_dir: str,
+        checks_dir: str,
+) -> int:
+    """
+    reconcile target positions of sig_date from tqdb against actual positions of exe_date from Fuai,
+    for all dates and types in one join. Rows with differences are saved to
+    checks_dir/check_{bgn}_{end}.csv, status is one of "missing_act", "missing_tgt", "qty_mismatch"
+    and "missing_export". Rows of exe dates without Fuai export are "missing_export", they are
+    saved and reported separately, but not counted as differences.
+
+    :return: number of rows with differences, excluding "missing_export" ones
+    """
+    keys = ["sig_date", "exe_date", "sig_type", "contract", "direction"]
+    tgt_data, act_data = load_position_books_range(
+        sig_dates, exe_dates, sig_types, positions_file_name_tqdb_tmpl, positions_file_name_fuai_tmpl, positions_dir,
+    )
+    merge_data = pd.merge(
+        left=tgt_data, right=act_data,
+        on=keys,
+        how="outer",
+        suffixes=("_tgt", "_act"),
+    )
+    qty_tgt = merge_data["qty_tgt"].fillna(0).to_numpy(dtype=np.int64)
+    qty_act = merge_data["qty_act"].fillna(0).to_numpy(dtype=np.int64)
+    merge_data["qty_tgt"], merge_data["qty_act"], merge_data["diff"] = qty_tgt, qty_act, qty_tgt - qty_act
+    missing_exe_dates = [
+        exe_date for exe_date in dict.fromkeys(exe_dates)
+        if not os.path.exists(get_position_path_fuai(exe_date, positions_file_name_fuai_tmpl, positions_dir))
+    ]
+    merge_data["status"] = np.select(
+        [merge_data["exe_date"].isin(missing_exe_dates).to_numpy(), qty_act == 0, qty_tgt == 0, qty_tgt != qty_act],
+        ["missing_export", "missing_act", "missing_tgt", "qty_mismatch"],
+        default="ok",
+    )
+    diff_data = merge_data[merge_data["diff"] != 0].sort_values(by=keys, ignore_index=True)
+    mismatch_data = diff_data[diff_data["status"] != "missing_export"]
+
+    check_and_makedirs(checks_dir)
+    report_path = os.path.join(checks_dir, f"check_{sig_dates[0]}_{sig_dates[-1]}.csv")
+    diff_data.to_csv(report_path, index=False)
+    summary = pd.pivot_table(
+        data=merge_data, index=["sig_date", "sig_type"], columns="status", values="contract", aggfunc="count",
+    ).fillna(0).astype(int)
+    print(summary)
+    if missing_exe_dates:
+        print(f"[WRN] Fuai exports of {SFY(len(missing_exe_dates))} exe dates are not available, "
+              f"positions of them are not checked: {SFY(', '.join(missing_exe_dates))}")
+    if mismatch_data.empty:
+        print(f"[INF] {SFG('Congratulations')}, no errors are found for positions of "
+              f"{SFG(sig_dates[0])} -> {SFG(sig_dates[-1])}")
+    else:
+        n_groups = mismatch_data[["sig_date", "sig_type"]].drop_duplicates().shape[0]
+        print(f"[WRN] {SFR(len(mismatch_data))} differences in {SFR(n_groups)} (sig_date, sig_type) are found, "
+              f"see {SFY(report_path)}")
+    return len(mismatch_data)
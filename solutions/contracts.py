@@ -0,0 +1,127 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+from husfort.qutility import check_and_makedirs, SFG
+from husfort.qinstruments import CInstruMgr, parse_instrument_from_contract
+from typedef import WIND_EXCHANGE
+from solutions.fuai import get_file_stamp
+
+CONTRACT_FIELDS = [
+    "contract", "instrument", "exchange", "multiplier", "mini_spread", "has_ngt_sec", "tq_code", "wind_code",
+]
+
+
+class CContractIndex:
+    def __init__(self, instru_mgr: CInstruMgr, index_path: str = None, instru_info_path: str = None):
+        """
+        contract level metadata, rows are added on demand and computed once from instru_mgr
+
+        :param instru_mgr:
+        :param index_path: csv file to persist the index, nothing is persisted if None
+        :param instru_info_path: path of instruments.csv, a persisted index is discarded
+                                 if the mtime or size of this file is changed
+        """
+        self.instru_mgr = instru_mgr
+        self.index_path = index_path
+        self.instru_info_path = instru_info_path
+        self.__lock = threading.Lock()
+        self.__rows: dict[str, int] = {}
+        self.__data: dict[str, list] = {f: [] for f in CONTRACT_FIELDS}
+        self.__arrays: dict[str, np.ndarray] = {}
+        self.__dirty = False
+        self.__load()
+
+    @property
+    def meta_path(self) -> str:
+        return f"{self.index_path}.json"
+
+    def __get_stamp(self) -> dict:
+        return get_file_stamp(self.instru_info_path) if self.instru_info_path else {}
+
+    def __load(self):
+        if self.index_path is None or not os.path.exists(self.index_path) or not os.path.exists(self.meta_path):
+            return 0
+        with open(self.meta_path, "r") as f:
+            if json.load(f) != self.__get_stamp():
+                print(f"[INF] {SFG(self.instru_info_path)} is changed, contract index will be rebuilt")
+                return 0
+        df = pd.read_csv(self.index_path, dtype={"contract": str, "instrument": str, "exchange": str})
+        for f in CONTRACT_FIELDS:
+            self.__data[f] = df[f].tolist()
+        self.__rows = {c: i for i, c in enumerate(self.__data["contract"])}
+        return 0
+
+    def save(self):
+        if self.index_path is None or not self.__dirty:
+            return 0
+        with self.__lock:
+            check_and_makedirs(os.path.dirname(self.index_path))
+            pd.DataFrame(self.__data, columns=CONTRACT_FIELDS).to_csv(self.index_path, index=False)
+            with open(self.meta_path, "w") as f:
+                json.dump(self.__get_stamp(), f)
+            self.__dirty = False
+        return 0
+
+    def add(self, contracts: list[str] | np.ndarray):
+        with self.__lock:
+            for contract in set(contracts):
+                if contract in self.__rows:
+                    continue
+                instru = parse_instrument_from_contract(contract)
+                exchange = self.instru_mgr.get_exchange(instru)
+                row = {
+                    "contract": contract,
+                    "instrument": instru,
+                    "exchange": exchange,
+                    "multiplier": self.instru_mgr.get_multiplier(instru),
+                    "mini_spread": self.instru_mgr.get_mini_spread(instru),
+                    "has_ngt_sec": bool(self.instru_mgr.has_ngt_sec(instru)),
+                    "tq_code": f"{exchange}.{contract}",
+                    "wind_code": f"{contract.upper()}.{WIND_EXCHANGE[exchange]}",
+                }
+                self.__rows[contract] = len(self.__rows)
+                for f in CONTRACT_FIELDS:
+                    self.__data[f].append(row[f])
+                self.__arrays.clear()
+                self.__dirty = True
+        return 0
+
+    def __get_array(self, field: str) -> np.ndarray:
+        if (arr := self.__arrays.get(field)) is None:
+            arr = self.__arrays[field] = np.asarray(self.__data[field])
+        return arr
+
+    def lookup(self, contracts: list[str] | np.ndarray, field: str) -> np.ndarray:
+        """
+
+        :param contracts: contracts like ["rb2505", "CF505"], missing ones are added
+        :param field: one of CONTRACT_FIELDS
+        :return: values of field for each contract
+        """
+        self.add(contracts)
+        with self.__lock:
+            idx = np.fromiter((self.__rows[c] for c in contracts), dtype=np.int64, count=len(contracts))
+            return self.__get_array(field)[idx]
+
+    def get(self, contract: str, field: str):
+        return self.lookup([contract], field)[0]
+
+
+def load_contract_index(
+        trade_date: str,
+        contracts_dir: str,
+        instru_mgr: CInstruMgr,
+        instru_info_path: str,
+) -> CContractIndex:
+    index_path = os.path.join(contracts_dir, trade_date[0:4], f"contracts_{trade_date}.csv")
+    return CContractIndex(instru_mgr, index_path=index_path, instru_info_path=instru_info_path)
+
+
+def get_contract_index(contract_index: CContractIndex | None, instru_mgr: CInstruMgr) -> CContractIndex:
+    """
+
+    :return: contract_index, or an in-memory index built from instru_mgr if it is None
+    """
+    return CContractIndex(instru_mgr) if contract_index is None else contract_index
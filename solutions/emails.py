@@ -1,7 +1,10 @@
 import os
-from husfort.qmails import CAgentEmail, CAttachmentText
+import ssl
+import smtplib
+from email.message import EmailMessage
 from typedef import CAccountMail
-from solutions.orders import parse_tm_from_sec_and_apm
+from solutions.orders import get_orders_file_names, get_orders_payload
+from solutions.trace import TRACER
 
 
 def send_orders_by_emails(
@@ -13,33 +16,36 @@ def send_orders_by_emails(
         orders_dir: str,
         receivers: list[str],
 ):
-    agent = CAgentEmail(
-        mail_host=account_mail.host,
-        mail_port=account_mail.port,
-        mail_sender=account_mail.sender,
-        mail_sender_pwd=account_mail.password,
-    )
     d = os.path.join(orders_dir, sig_date[0:4], sig_date[4:6])
-    if sec_type == "opn":
-        tm_pm = parse_tm_from_sec_and_apm(sec_type, am_or_pm="pm")
-        tm_am = parse_tm_from_sec_and_apm(sec_type, am_or_pm="am")
-        attachments = [
-            CAttachmentText(orders_file_name_tmpl.format(sig_date, sig_date, sec_type, "pm", tm_pm), d),
-            CAttachmentText(orders_file_name_tmpl.format(sig_date, exe_date, sec_type, "am", tm_am), d),
-        ]
-    elif sec_type == "cls":
-        tm = parse_tm_from_sec_and_apm(sec_type, am_or_pm="pm")
-        attachments = [
-            CAttachmentText(orders_file_name_tmpl.format(sig_date, exe_date, sec_type, "pm", tm), d),
-        ]
-    else:
-        raise ValueError(f"Invalid sig_type: {sec_type}")
+    msg = EmailMessage()
+    msg["From"] = account_mail.sender
+    msg["To"] = ",".join(receivers)
+    msg["Subject"] = f"仿真交易指令-sig-{sig_date}-exe-{exe_date}-{sec_type}"
+    msg.set_content("指令见附件")
+    for orders_file in get_orders_file_names(sig_date, exe_date, sec_type, orders_file_name_tmpl).values():
+        msg.add_attachment(
+            get_orders_payload(os.path.join(d, orders_file)),
+            maintype="application",
+            subtype="vnd.ms-excel",
+            filename=orders_file,
+        )
 
-    agent.write(
-        receivers=receivers,
-        msg_subject=f"仿真交易指令-sig-{sig_date}-exe-{exe_date}-{sec_type}",
-        msg_body="指令见附件",
-        attachments=attachments,
-    )
-    agent.send()
+    with TRACER.stage("emails.send", sig_type=sec_type, receivers=len(receivers)) as span:
+        span.bytes = len(msg.as_bytes())
+        # the password is never sent in clear text: SSL on 465, STARTTLS on other ports like 25
+        context = ssl.create_default_context()
+        if account_mail.port == 465:
+            smtp = smtplib.SMTP_SSL(host=account_mail.host, port=account_mail.port, context=context)
+        else:
+            smtp = smtplib.SMTP(host=account_mail.host, port=account_mail.port)
+        with smtp:
+            if account_mail.port != 465:
+                smtp.ehlo()
+                if not smtp.has_extn("starttls"):
+                    raise smtplib.SMTPNotSupportedError(
+                        f"{account_mail.host}:{account_mail.port} does not support STARTTLS, use port 465 for SSL"
+                    )
+                smtp.starttls(context=context)
+            smtp.login(account_mail.sender, account_mail.password)
+            smtp.send_message(msg, from_addr=account_mail.sender, to_addrs=receivers)
     return 0
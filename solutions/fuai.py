@@ -0,0 +1,61 @@
+import os
+import json
+import threading
+import pandas as pd
+from husfort.qutility import SFY
+from solutions.trace import TRACER
+
+FUAI_COLUMNS = ["合约", "策略账户", "买总持仓", "卖总持仓"]
+
+__fuai_lock = threading.Lock()
+__fuai_memo: dict[str, tuple[dict, pd.DataFrame]] = {}
+
+
+def get_file_stamp(path: str) -> dict:
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def get_fuai_cache_paths(pos_path: str) -> tuple[str, str]:
+    return f"{pos_path}.feather", f"{pos_path}.feather.json"
+
+
+def parse_fuai_export(pos_path: str) -> pd.DataFrame:
+    with TRACER.stage("fuai.parse", path=os.path.basename(pos_path)) as span:
+        df = pd.read_excel(pos_path, usecols=FUAI_COLUMNS)
+        span.rows, span.bytes = len(df), os.path.getsize(pos_path)
+    df["合约"] = df["合约"].astype(str)
+    df["策略账户"] = df["策略账户"].astype(str)
+    df[["买总持仓", "卖总持仓"]] = df[["买总持仓", "卖总持仓"]].fillna(0).astype("int64")
+    return df.reset_index(drop=True)
+
+
+def read_fuai_export(pos_path: str) -> pd.DataFrame:
+    """
+    read 持仓汇总 export from Fuai, the parsed columns are stored in a feather sidecar
+    next to the export and reused as long as the mtime and size of the export are unchanged.
+
+    :param pos_path: path to the .xls export
+    :return: DataFrame with columns FUAI_COLUMNS
+    """
+    stamp = get_file_stamp(pos_path)
+    with __fuai_lock:
+        if (memo := __fuai_memo.get(pos_path)) is not None and memo[0] == stamp:
+            return memo[1]
+
+        cache_path, meta_path = get_fuai_cache_paths(pos_path)
+        df = None
+        if os.path.exists(cache_path) and os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                if json.load(f) == stamp:
+                    df = pd.read_feather(cache_path)
+        if df is None:
+            df = parse_fuai_export(pos_path)
+            try:
+                df.to_feather(cache_path)
+                with open(meta_path, "w") as f:
+                    json.dump(stamp, f)
+            except OSError as e:
+                print(f"[WRN] Failed to save cache for {SFY(pos_path)}: {e}")
+        __fuai_memo[pos_path] = (stamp, df)
+        return df
@@ -1,9 +1,80 @@
+import os
+import math
+import time
+import atexit
+import threading
+from datetime import datetime
+from dataclasses import dataclass
 from tqsdk import TqApi, TqAuth
 from typedef import CDepthMd
-from husfort.qutility import SFR
-from WindPy import w as wapi
+from husfort.qutility import SFR, SFG, check_and_makedirs
+from solutions.trace import TRACER
 import pandas as pd
 
+# market data sessions are not thread-safe, requests from concurrent stages are serialized
+MD_LOCK = threading.Lock()
+
+
+@dataclass
+class CWindData:
+    ErrorCode: int
+    Codes: list[str]
+    Fields: list[str]
+    Data: list[list]
+
+
+class CWindStandIn:
+    def __init__(self, data_path: str):
+        """
+        file-backed stand-in of WindPy.w, for running and testing without a Wind terminal
+
+        :param data_path: csv file with columns ["code", "trade_date", *fields]
+        """
+        self.data_path = data_path
+        self.data = pd.read_csv(data_path, dtype={"code": str, "trade_date": str}).set_index(["code", "trade_date"])
+
+    def start(self):
+        return 0
+
+    def wss(self, codes: list[str], fields: list[str], options: str = "") -> CWindData:
+        opts = dict(kv.split("=") for kv in options.split(";") if kv)
+        trade_date = opts["tradeDate"]
+        index = pd.MultiIndex.from_arrays([codes, [trade_date] * len(codes)])
+        data = self.data.reindex(index=index, columns=fields)
+        return CWindData(
+            ErrorCode=0,
+            Codes=list(codes),
+            Fields=list(fields),
+            Data=[data[f].tolist() for f in fields],
+        )
+
+
+__wind_api = None
+
+
+def set_wind_api(api):
+    """
+
+    :param api: WindPy.w or CWindStandIn
+    """
+    global __wind_api
+    __wind_api = api
+    return 0
+
+
+def get_wind_api():
+    """
+    Wind session is started once in a process, call it with MD_LOCK held
+
+    """
+    global __wind_api
+    if __wind_api is None:
+        from WindPy import w as wapi
+
+        wapi.start()
+        __wind_api = wapi
+    return __wind_api
+
 
 def req_md_trade_date_wind(
         wd_contracts: list[str],
@@ -17,8 +88,8 @@ def req_md_trade_date_wind(
     :param fields:  ["settle", "changelt"]
     :return:
     """
-    wapi.start()
-    data = wapi.wss(wd_contracts, fields, options=f"tradeDate={trade_date};cycle=D")
+    with MD_LOCK:
+        data = get_wind_api().wss(wd_contracts, fields, options=f"tradeDate={trade_date};cycle=D")
     if data.ErrorCode == 0:
         reqed_data = pd.DataFrame(data.Data, index=fields, columns=data.Codes).T
         return reqed_data.to_dict(orient="index")
@@ -26,49 +97,238 @@ def req_md_trade_date_wind(
         raise Exception(f"Wind data ErrorCode = {data.ErrorCode}")
 
 
+class CWindMdCache:
+    def __init__(self, cache_path: str, fields: list[str] = None, readonly: bool = False):
+        """
+        local cache of Wind daily data, keyed by (code, trade_date)
+
+        :param cache_path: csv file with columns ["code", "trade_date", *fields]
+        :param fields: default is ["settle", "changelt"]
+        :param readonly: new records are kept in memory only, for caches shared by processes
+        """
+        self.cache_path = cache_path
+        self.fields = fields or ["settle", "changelt"]
+        self.readonly = readonly
+        self.__lock = threading.Lock()
+        if os.path.exists(cache_path):
+            df = pd.read_csv(cache_path, dtype={"code": str, "trade_date": str})
+            self.data: dict[tuple[str, str], dict[str, float]] = {
+                (code, trade_date): dict(zip(self.fields, values))
+                for code, trade_date, *values in df[["code", "trade_date"] + self.fields].itertuples(index=False)
+            }
+        else:
+            self.data = {}
+
+    def get(self, code: str, trade_date: str) -> dict[str, float] | None:
+        return self.data.get((code, trade_date))
+
+    def preload(self, records: dict[tuple[str, str], dict[str, float]]):
+        """
+        keep records in memory as they are, including NaN ones and those of today,
+        so they are never requested again by this instance. They are not saved.
+
+        """
+        with self.__lock:
+            self.data.update(records)
+        return 0
+
+    def update(self, reqed: dict[tuple[str, str], dict[str, float]]):
+        """
+        only records with all fields available and trade_date before today are cached,
+        since data of today may change.
+
+        """
+        today = datetime.now().strftime("%Y%m%d")
+        new_data = {
+            key: val for key, val in reqed.items()
+            if key[1] < today and all(pd.notna(val.get(f)) for f in self.fields)
+        }
+        if new_data:
+            with self.__lock:
+                self.data.update(new_data)
+                if not self.readonly:
+                    self.save()
+        return 0
+
+    def save(self):
+        df = pd.DataFrame(
+            [(code, trade_date, *[val[f] for f in self.fields]) for (code, trade_date), val in self.data.items()],
+            columns=["code", "trade_date"] + self.fields,
+        ).sort_values(by=["trade_date", "code"])
+        if d := os.path.dirname(self.cache_path):
+            check_and_makedirs(d)
+        tmp_path = f"{self.cache_path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.cache_path)
+        return 0
+
+
+def req_md_wind_batch(
+        wd_pairs: list[tuple[str, str]],
+        fields: list[str],
+        cache: CWindMdCache | None = None,
+) -> dict[tuple[str, str], dict[str, float]]:
+    """
+
+    :param wd_pairs: [(wind_code, trade_date)], like [("RB2505.SHF", "20250102"), ("CF505.CZC", "20250103")]
+    :param fields: ["settle", "changelt"], must be a subset of cache.fields if cache is provided
+    :param cache: pairs found in cache are not requested
+    :return: {(wind_code, trade_date): {field: value}}
+    """
+    res: dict[tuple[str, str], dict[str, float]] = {}
+    missing: dict[str, set[str]] = {}
+    for code, trade_date in set(wd_pairs):
+        if cache is not None and (val := cache.get(code, trade_date)) is not None:
+            res[(code, trade_date)] = {f: val[f] for f in fields}
+        else:
+            missing.setdefault(trade_date, set()).add(code)
+
+    reqed: dict[tuple[str, str], dict[str, float]] = {}
+    with TRACER.stage("md.wind", requested=sum(len(z) for z in missing.values()), calls=len(missing)) as span:
+        for trade_date, codes in sorted(missing.items()):
+            data = req_md_trade_date_wind(wd_contracts=sorted(codes), trade_date=trade_date, fields=fields)
+            for code, val in data.items():
+                reqed[(code, trade_date)] = val
+        span.rows = len(reqed)
+    if reqed:
+        n_calls = len(missing)
+        print(f"[INF] {SFG(len(reqed))} records are requested from Wind in {SFG(n_calls)} calls")
+        if cache is not None:
+            cache.update(reqed)
+    res.update(reqed)
+    return res
+
+
+def convert_quote_to_depth_md(quote) -> CDepthMd:
+    return CDepthMd(
+        last=quote.last_price,
+        open=quote.open,
+        high=quote.highest,
+        low=quote.lowest,
+        pre_close=quote.pre_close,
+        pre_settle=quote.pre_settlement,
+        volume=quote.volume,
+        amount=quote.amount,
+        open_interest=quote.open_interest,
+        bid_price=quote.bid_price1,
+        ask_price=quote.ask_price1,
+        bid_volume=quote.bid_volume1,
+        ask_volume=quote.ask_volume1,
+        upper_lim=quote.upper_limit,
+        lower_lim=quote.lower_limit,
+    )
+
+
+class CTqSession:
+    def __init__(self, tq_account: str, tq_password: str):
+        """
+        an authenticated TqApi kept open during the process, quotes are subscribed incrementally
+
+        """
+        self.api = TqApi(auth=TqAuth(user_name=tq_account, password=tq_password))
+        self.quotes: dict = {}
+
+    def subscribe(self, tq_contracts: list[str]):
+        for contract in tq_contracts:
+            if contract not in self.quotes:
+                self.quotes[contract] = self.api.get_quote(contract)
+        return 0
+
+    @staticmethod
+    def __scan(tq_contracts: list[str], quotes: list, res: dict[str, CDepthMd | None]) -> bool:
+        """
+        convert complete quotes into res
+
+        :return: True if quotes of all the contracts are complete
+        """
+        for contract, quote in zip(tq_contracts, quotes):
+            # missing fields of tqsdk quotes are NaN
+            fields = (quote.last_price, quote.upper_limit, quote.lower_limit)
+            if all(v is not None and math.isfinite(v) for v in fields):
+                res[contract] = convert_quote_to_depth_md(quote)
+        return all(md is not None for md in res.values())
+
+    def req_depth_md(self, tq_contracts: list[str], deadline: float = None) -> dict[str, CDepthMd | None]:
+        self.subscribe(tq_contracts)
+        quotes = [self.quotes[contract] for contract in tq_contracts]
+        res: dict[str, CDepthMd | None] = {contract: None for contract in tq_contracts}
+
+        # quotes of a reused session may be complete already, and no more updates would come
+        if self.__scan(tq_contracts, quotes, res):
+            return res
+        if deadline is None:
+            print(f"[INF] {SFR('本函数将请求实时行情,非交易时间调用本函数会导致程序暂停,直到再次收到行情推送.')}")
+        while True:
+            if not self.api.wait_update(deadline=deadline):
+                if not self.__scan(tq_contracts, quotes, res):
+                    print(f"[WRN] Deadline is reached before all quotes are received")
+                break
+            if self.__scan(tq_contracts, quotes, res):
+                break
+        return res
+
+    def close(self):
+        self.api.close()
+        return 0
+
+
+__tq_sessions: dict[str, CTqSession] = {}
+
+
+def get_tq_session(tq_account: str, tq_password: str) -> CTqSession:
+    """
+    one session for each account in a process, call it with MD_LOCK held
+
+    """
+    if (session := __tq_sessions.get(tq_account)) is None:
+        session = __tq_sessions[tq_account] = CTqSession(tq_account, tq_password)
+    return session
+
+
+def close_tq_sessions():
+    with MD_LOCK:
+        while __tq_sessions:
+            _, session = __tq_sessions.popitem()
+            session.close()
+    return 0
+
+
+atexit.register(close_tq_sessions)
+
+
 def req_depth_md_tianqin(
         tq_contracts: list[str],
         tq_account: str,
         tq_password: str,
-) -> dict[str, CDepthMd]:
+        deadline: float = None,
+        timeout: float = None,
+) -> dict[str, CDepthMd | None]:
     """
 
     :param tq_contracts: format = f"{exchange_id}.{contract}", like
                       ["DCE.a2505", "SHFE.rb2505", "CZCE.CF505"]
     :param tq_account:
     :param tq_password:
-    :return:
+    :param deadline: unix timestamp, stop waiting for quotes after it. None means waiting until
+                     all the contracts are complete.
+    :param timeout: seconds, stop waiting for quotes after it, counted from the call, so time spent
+                    waiting for MD_LOCK held by other requests is taken from it and the whole call is bounded
+    :return: contracts without complete quotes before deadline or timeout are mapped to None,
+             all of them are None if MD_LOCK is not acquired before deadline or timeout
     """
-    api = TqApi(auth=TqAuth(user_name=tq_account, password=tq_password))
-    quotes = [api.get_quote(contract) for contract in tq_contracts]
-    res: dict[str, CDepthMd | None] = {contract: None for contract in tq_contracts}
-
-    print(f"[INF] {SFR('本函数将请求实时行情,非交易时间调用本函数会导致程序暂停,直到再次收到行情推送.')}")
-
-    while True:
-        api.wait_update()
-        updated_ids = set()
-        for quote in quotes:
-            if (quote.last_price is not None) and (quote.upper_limit is not None) and (quote.lower_limit is not None):
-                res[quote.instrument_id] = CDepthMd(
-                    last=quote.last_price,
-                    open=quote.open,
-                    high=quote.highest,
-                    low=quote.lowest,
-                    pre_close=quote.pre_close,
-                    pre_settle=quote.pre_settlement,
-                    volume=quote.volume,
-                    amount=quote.amount,
-                    open_interest=quote.open_interest,
-                    bid_price=quote.bid_price1,
-                    ask_price=quote.ask_price1,
-                    bid_volume=quote.bid_volume1,
-                    ask_volume=quote.ask_volume1,
-                    upper_lim=quote.upper_limit,
-                    lower_lim=quote.lower_limit,
-                )
-                updated_ids.add(quote.instrument_id)
-        if len(updated_ids) == len(tq_contracts):
-            break
-    api.close()
-    return res
+    if timeout is not None:
+        deadline = time.time() + timeout if deadline is None else min(deadline, time.time() + timeout)
+    with TRACER.stage("md.tianqin", requested=len(tq_contracts)) as span:
+        lock_timeout = -1 if deadline is None else max(deadline - time.time(), 0)
+        if not MD_LOCK.acquire(timeout=lock_timeout):
+            print(f"[WRN] Quotes of {SFR(len(tq_contracts))} contracts are not requested, Tianqin session is busy until deadline")
+            span.status = "lock timeout"
+            span.rows = 0
+            return dict.fromkeys(tq_contracts)
+        try:
+            session = get_tq_session(tq_account, tq_password)
+            res = session.req_depth_md(tq_contracts, deadline=deadline)
+        finally:
+            MD_LOCK.release()
+        span.rows = sum(md is not None for md in res.values())
+        return res
@@ -0,0 +1,140 @@
+import os
+import time
+import pandas as pd
+from datetime import datetime, timedelta
+from dataclasses import asdict, fields
+from husfort.qutility import check_and_makedirs, SFG
+from typedef import CDepthMd
+from solutions.md import req_depth_md_tianqin
+
+
+class CMdSnapshotStore:
+    def __init__(
+            self,
+            store_dir: str,
+            ttl: float = 0.0,
+            max_bytes: int = 256 * 1024 * 1024,
+            keep_days: int = 7,
+            evict_interval: float = 600.0,
+    ):
+        """
+
+        :param store_dir: snapshots are saved as store_dir/YYYY/MM/depth_md_{date}_{timestamp}.csv,
+                          timestamp is in milliseconds, one row for each contract
+        :param ttl: seconds, snapshots older than ttl are not reused by default. Default 0 means
+                    quotes for live pricing are always requested, and snapshots only serve as audit trail
+        :param max_bytes: oldest snapshots are evicted when total size of the store exceeds it
+        :param keep_days: snapshots of the latest keep_days calendar days are never evicted
+        :param evict_interval: seconds, save() evicts at most once in this interval,
+                               since evicting walks the whole store
+        """
+        self.store_dir = store_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.keep_days = keep_days
+        self.evict_interval = evict_interval
+        self.__last_evict: float = 0.0
+
+    @staticmethod
+    def parse_snapshot_file(snapshot_file: str) -> tuple[str, int]:
+        _, _, date, ts = os.path.splitext(snapshot_file)[0].split("_")
+        return date, int(ts)
+
+    def get_snapshot_dir(self, date: str) -> str:
+        return os.path.join(self.store_dir, date[0:4], date[4:6])
+
+    def get_snapshot_paths(self, date: str) -> list[tuple[int, str]]:
+        """
+
+        :return: [(timestamp, path)] of date, newest first
+        """
+        d = self.get_snapshot_dir(date)
+        if not os.path.exists(d):
+            return []
+        res = []
+        for snapshot_file in os.listdir(d):
+            if snapshot_file.startswith(f"depth_md_{date}_") and snapshot_file.endswith(".csv"):
+                res.append((self.parse_snapshot_file(snapshot_file)[1], os.path.join(d, snapshot_file)))
+        return sorted(res, reverse=True)
+
+    def save(self, depth_md: dict[str, CDepthMd | None], timestamp: float = None) -> str:
+        timestamp = time.time() if timestamp is None else timestamp
+        date = datetime.fromtimestamp(timestamp).strftime("%Y%m%d")
+        data = {contract: asdict(md) for contract, md in depth_md.items() if md is not None}
+        if not data:
+            return ""
+        check_and_makedirs(d := self.get_snapshot_dir(date))
+        snapshot_path = os.path.join(d, f"depth_md_{date}_{int(timestamp * 1000)}.csv")
+        df = pd.DataFrame.from_dict(data, orient="index")
+        df.to_csv(snapshot_path, index_label="contract")
+        if time.time() - self.__last_evict >= self.evict_interval:
+            self.evict()
+        return snapshot_path
+
+    def load(self, contracts: list[str], ttl: float = None, now: float = None) -> dict[str, CDepthMd]:
+        """
+
+        :param contracts:
+        :param ttl: seconds, use self.ttl if None
+        :param now: unix timestamp, use time.time() if None
+        :return: the newest snapshot of each contract inside the freshness window,
+                 contracts not found are not included
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time() if now is None else now
+        date = datetime.fromtimestamp(now).strftime("%Y%m%d")
+        md_names = [f.name for f in fields(CDepthMd)]
+        missing, res = set(contracts), {}
+        for ts, snapshot_path in self.get_snapshot_paths(date):
+            if not missing or (now - ts / 1000 > ttl):
+                break
+            df = pd.read_csv(snapshot_path, index_col="contract")
+            for contract in missing.intersection(df.index):
+                res[contract] = CDepthMd(**df.loc[contract, md_names].to_dict())
+            missing.difference_update(res)
+        return res
+
+    def evict(self):
+        keep_date = (datetime.now() - timedelta(days=self.keep_days)).strftime("%Y%m%d")
+        snapshots: list[tuple[float, int, str, str]] = []
+        for root, _, files in os.walk(self.store_dir):
+            for snapshot_file in files:
+                if snapshot_file.startswith("depth_md_") and snapshot_file.endswith(".csv"):
+                    path = os.path.join(root, snapshot_file)
+                    date, ts = self.parse_snapshot_file(snapshot_file)
+                    snapshots.append((ts, os.path.getsize(path), path, date))
+        total = sum(s[1] for s in snapshots)
+        for _, size, path, date in sorted(snapshots):
+            if total <= self.max_bytes or date > keep_date:
+                break
+            os.remove(path)
+            total -= size
+        self.__last_evict = time.time()
+        return 0
+
+
+def req_depth_md_tianqin_with_store(
+        tq_contracts: list[str],
+        tq_account: str,
+        tq_password: str,
+        store: CMdSnapshotStore | None,
+        deadline: float = None,
+        ttl: float = None,
+        timeout: float = None,
+) -> dict[str, CDepthMd | None]:
+    """
+    like req_depth_md_tianqin, but contracts with a fresh snapshot in store are served from disk,
+    and quotes received from Tianqin are saved to store.
+
+    """
+    if store is None:
+        return req_depth_md_tianqin(tq_contracts, tq_account, tq_password, deadline=deadline, timeout=timeout)
+
+    res: dict[str, CDepthMd | None] = store.load(tq_contracts, ttl=ttl)
+    if res:
+        print(f"[INF] Quotes of {SFG(len(res))} contracts are loaded from {SFG(store.store_dir)}")
+    if missing := [contract for contract in tq_contracts if contract not in res]:
+        reqed = req_depth_md_tianqin(missing, tq_account, tq_password, deadline=deadline, timeout=timeout)
+        store.save(reqed)
+        res.update(reqed)
+    return res
@@ -1,13 +1,19 @@
 import os
+import time
+import json as json_lib
 import httpx
 import random
 import string
+import asyncio
 import hashlib
 from datetime import datetime
 from loguru import logger
 from husfort.qlog import define_logger
+from husfort.qutility import check_and_makedirs
 from typedef import CAccountOrbit
-from solutions.orders import parse_tm_from_sec_and_apm
+from solutions.trace import trace_request, trace_response, atrace_request, atrace_response
+from solutions.orders import parse_tm_from_sec_and_apm, parse_schedule_time, get_orders_file_names, get_orders_payload, \
+    get_orders_digest, flush_orders_archive
 
 define_logger()
 
@@ -25,13 +31,25 @@ class OrbitException(Exception):
         return f"{self.__class__.__name__}: {super().__str__()} (Code: {self.code})"
 
 
+def gen_api_code(account_orbit: CAccountOrbit) -> str:
+    emp_no = str(account_orbit.emp_no)
+    secret = str(account_orbit.api_password)
+    nonce = "".join(random.choice(string.ascii_letters + string.digits) for _ in range(6))
+    timestamp = str(int(datetime.now().timestamp()))
+    params = [emp_no, timestamp, nonce, secret]
+    hash_object = hashlib.sha1()
+    hash_object.update("".join(sorted(params)).encode("utf-8"))
+    signature = hash_object.hexdigest()
+    return "_".join([emp_no, timestamp, nonce, signature])
+
+
 class CClient:
     def __init__(self, account_orbit: CAccountOrbit):
         self.__account_orbit = account_orbit
         self.ACCESS_TOKEN = None
         self.__client = httpx.Client(
-            event_hooks={"request": [self.before_request],
-                         "response": [self.after_response]},
+            event_hooks={"request": [trace_request, self.before_request],
+                         "response": [trace_response, self.after_response]},
             base_url=account_orbit.server_base_url,
         )
 
@@ -53,15 +71,7 @@ class CClient:
             raise OrbitException(json.message, json.code)
 
     def login_by_code(self):
-        emp_no = str(self.__account_orbit.emp_no)
-        secret = str(self.__account_orbit.api_password)
-        nonce = "".join(random.choice(string.ascii_letters + string.digits) for _ in range(6))
-        timestamp = str(int(datetime.now().timestamp()))
-        params = [emp_no, timestamp, nonce, secret]
-        hash_object = hashlib.sha1()
-        hash_object.update("".join(sorted(params)).encode("utf-8"))
-        signature = hash_object.hexdigest()
-        api_code = "_".join([emp_no, timestamp, nonce, signature])
+        api_code = gen_api_code(self.__account_orbit)
         response = self.__client.post("/auth/loginByCode", json={"code": api_code})
         self.ACCESS_TOKEN = response.json()["data"]["token"]
         return 0
@@ -103,6 +113,204 @@ class CClient:
             return rsp
 
 
+class CAsyncClient:
+    def __init__(
+            self,
+            account_orbit: CAccountOrbit,
+            orbit_dir: str = None,
+            token_ttl: float = 3600.0,
+            max_retries: int = 3,
+            backoff: float = 1.0,
+    ):
+        """
+
+        :param account_orbit:
+        :param orbit_dir: access token and content hashes of accepted files are saved
+                          in this directory, nothing is saved if None
+        :param token_ttl: seconds, cached access token is reused until it expires
+        :param max_retries: retries for transport errors and 5xx responses
+        :param backoff: seconds, delay before the i-th retry is backoff * 2 ** i
+        """
+        self.__account_orbit = account_orbit
+        self.orbit_dir = orbit_dir
+        self.token_ttl = token_ttl
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.ACCESS_TOKEN = None
+        self.__submitted: dict[str, dict] = self.__load_json(self.submitted_path) if orbit_dir else {}
+        self.__client = httpx.AsyncClient(
+            event_hooks={"request": [atrace_request, self.before_request],
+                         "response": [atrace_response, self.after_response]},
+            base_url=account_orbit.server_base_url,
+        )
+
+    @property
+    def token_path(self) -> str:
+        return os.path.join(self.orbit_dir, "orbit_token.json")
+
+    @property
+    def submitted_path(self) -> str:
+        return os.path.join(self.orbit_dir, "orbit_submitted.json")
+
+    @staticmethod
+    def __load_json(path: str) -> dict:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json_lib.load(f)
+        return {}
+
+    def __save_json(self, path: str, data: dict):
+        if self.orbit_dir is None:
+            return 0
+        check_and_makedirs(self.orbit_dir)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json_lib.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return 0
+
+    async def before_request(self, request: httpx.Request):
+        logger.info(f"Sending reqeust: {request.url}")
+        request.headers["User-Agent"] = "Orbit-Python-Examples"
+        if self.ACCESS_TOKEN is not None:
+            request.headers["Access-Token"] = self.ACCESS_TOKEN
+
+    @staticmethod
+    async def after_response(response: httpx.Response):
+        logger.info(f"Received response status: {response.status_code}")
+        if response.is_error:
+            response.raise_for_status()
+        await response.aread()
+        json = response.json()
+        logger.info(f"Received response: {json}")
+        if json["code"] < 0:
+            raise OrbitException(json.get("message"), json.get("code"))
+
+    async def __post(self, url: str, idempotent: bool = True, **kwargs) -> httpx.Response:
+        """
+
+        :param idempotent: if False, only errors raised before the request is sent are retried,
+                           like ConnectError, other transport errors are raised at once
+        """
+        for i in range(self.max_retries + 1):
+            try:
+                return await self.__client.post(url, **kwargs)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 401 and url != "/auth/loginByCode":
+                    await self.login(force=True)
+                elif e.response.status_code < 500 or i == self.max_retries:
+                    raise
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if i == self.max_retries:
+                    raise
+            except httpx.TransportError:
+                if not idempotent or i == self.max_retries:
+                    raise
+            delay = self.backoff * 2 ** i
+            logger.info(f"Retry {url} in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+        raise OrbitException(f"Failed to post {url}")
+
+    async def login(self, force: bool = False):
+        if not force and self.orbit_dir is not None:
+            token = self.__load_json(self.token_path)
+            if token.get("emp_no") == self.__account_orbit.emp_no and token.get("expire_at", 0) > time.time():
+                self.ACCESS_TOKEN = token["token"]
+                return 0
+        self.ACCESS_TOKEN = None
+        response = await self.__post("/auth/loginByCode", json={"code": gen_api_code(self.__account_orbit)})
+        self.ACCESS_TOKEN = response.json()["data"]["token"]
+        self.__save_json(self.token_path, {
+            "emp_no": self.__account_orbit.emp_no,
+            "token": self.ACCESS_TOKEN,
+            "expire_at": time.time() + self.token_ttl,
+        })
+        return 0
+
+    async def upload(self, content: bytes, dst_path: str):
+        files = {"file": (dst_path, content, "application/vnd.ms-excel")}
+        response = await self.__post("/quant/upload", idempotent=False, files=files)
+        return response.json()["data"]
+
+    async def schedule_order(self, rsp, schedule_time: str):
+        json = {"id": rsp["id"], "scheduleTime": schedule_time}
+        response = await self.__post("/quant/scheduleOrder", json=json)
+        return response.json()["data"]
+
+    async def upload_and_schedule(self, content: bytes, dst_path: str, schedule_time: str, digest: str):
+        """
+        files are identified by dst_path, which contains dates, section and am/pm of the orders,
+        and digest of the order rows. A file already accepted is not uploaded again, and is not
+        scheduled again at the same schedule time. If the result of an upload is unknown, like a
+        timeout after the request is sent, it is recorded and later calls fail until it is checked
+        at Orbit and the record is removed from orbit_submitted.json.
+
+        :param content: bytes of the file
+        :param dst_path: file name at Orbit
+        :param schedule_time:
+        :param digest: from get_orders_digest
+        """
+        key = f"{dst_path}#{digest}"
+        if (record := self.__submitted.get(key)) is not None and record["rsp"] is None:
+            raise OrbitException(
+                f"Result of uploading {dst_path} is unknown, check it at Orbit and remove {key} "
+                f"from {self.submitted_path} to upload again"
+            )
+        if record is None:
+            for k, r in self.__submitted.items():
+                if r["file"] == dst_path and r["rsp"] is not None:
+                    logger.warning(f"{dst_path} was accepted as id = {r['rsp']['id']} with other orders ({k})")
+            record = self.__submitted[key] = {"file": dst_path, "rsp": None, "schedule_time": None}
+            self.__save_json(self.submitted_path, self.__submitted)
+            try:
+                record["rsp"] = await self.upload(content, dst_path)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.HTTPStatusError, OrbitException):
+                # the file is surely not accepted
+                del self.__submitted[key]
+                raise
+            finally:
+                self.__save_json(self.submitted_path, self.__submitted)
+        else:
+            logger.info(f"{dst_path} was accepted as id = {record['rsp']['id']}, skip uploading")
+        if record["schedule_time"] != schedule_time:
+            await self.schedule_order(record["rsp"], schedule_time=schedule_time)
+            record["schedule_time"] = schedule_time
+            self.__save_json(self.submitted_path, self.__submitted)
+        else:
+            logger.info(f"{dst_path} was scheduled at {schedule_time}, skip scheduling")
+        return record["rsp"]
+
+    async def aclose(self):
+        await self.__client.aclose()
+
+
+async def send_orders_by_orbit_async(
+        account_orbit: CAccountOrbit,
+        sig_date: str,
+        exe_date: str,
+        sec_type: str,
+        orders_file_name_tmpl: str,
+        orders_dir: str,
+        orbit_dir: str = None,
+):
+    client = CAsyncClient(account_orbit, orbit_dir=orbit_dir)
+    try:
+        await client.login()
+        d = os.path.join(orders_dir, sig_date[0:4], sig_date[4:6])
+        jobs = []
+        for am_or_pm, orders_file in get_orders_file_names(sig_date, exe_date, sec_type, orders_file_name_tmpl).items():
+            orders_path = os.path.join(d, orders_file)
+            schedule_time = parse_schedule_time(sec_type, am_or_pm, sig_date, exe_date)
+            jobs.append(client.upload_and_schedule(
+                get_orders_payload(orders_path), dst_path=orders_file, schedule_time=schedule_time,
+                digest=get_orders_digest(orders_path),
+            ))
+        await asyncio.gather(*jobs)
+    finally:
+        await client.aclose()
+    return 0
+
+
 def send_orders_by_orbit(
         account_orbit: CAccountOrbit,
         sig_date: str,
@@ -110,7 +318,25 @@ def send_orders_by_orbit(
         sec_type: str,
         orders_file_name_tmpl: str,
         orders_dir: str,
+        orbit_dir: str = None,
+        use_async: bool = True,
 ):
+    """
+
+    :param orbit_dir: directory for access token and accepted files, used by async client only
+    :param use_async: use CAsyncClient to upload and schedule files concurrently
+    """
+    if use_async:
+        return asyncio.run(send_orders_by_orbit_async(
+            account_orbit=account_orbit,
+            sig_date=sig_date, exe_date=exe_date,
+            sec_type=sec_type,
+            orders_file_name_tmpl=orders_file_name_tmpl,
+            orders_dir=orders_dir,
+            orbit_dir=orbit_dir,
+        ))
+
+    flush_orders_archive()
     client = CClient(account_orbit)
     client.login_by_code()
     d = os.path.join(orders_dir, sig_date[0:4], sig_date[4:6])
@@ -121,8 +347,8 @@ def send_orders_by_orbit(
         file_am = orders_file_name_tmpl.format(sig_date, exe_date, sec_type, "am", tm_am)
         path_pm = os.path.join(d, file_pm)
         path_am = os.path.join(d, file_am)
-        schedule_time_pm = f"{sig_date[0:4]}-{sig_date[4:6]}-{sig_date[6:8]} 21:00:00"
-        schedule_time_am = f"{exe_date[0:4]}-{exe_date[4:6]}-{exe_date[6:8]} 09:00:00"
+        schedule_time_pm = parse_schedule_time(sec_type, "pm", sig_date, exe_date)
+        schedule_time_am = parse_schedule_time(sec_type, "am", sig_date, exe_date)
         rsp = client.upload_orders(src_path=path_pm, dst_path=file_pm)
         client.schedule_order(rsp, schedule_time=schedule_time_pm)
         rsp = client.upload_orders(src_path=path_am, dst_path=file_am)
@@ -131,7 +357,7 @@ def send_orders_by_orbit(
         tm = parse_tm_from_sec_and_apm(sec_type, am_or_pm="pm")
         file_pm = orders_file_name_tmpl.format(sig_date, exe_date, sec_type, "pm", tm)
         path_pm = os.path.join(d, file_pm)
-        schedule_time_pm = f"{exe_date[0:4]}-{exe_date[4:6]}-{exe_date[6:8]} 14:59:00"
+        schedule_time_pm = parse_schedule_time(sec_type, "pm", sig_date, exe_date)
         rsp = client.upload_orders(src_path=path_pm, dst_path=file_pm)
         client.schedule_order(rsp, schedule_time=schedule_time_pm)
     else:
@@ -1,12 +1,22 @@
 import os
+import json
+import math
+import hashlib
+import threading
 import numpy as np
-import pandas as pd
 from typing import Literal
-from dataclasses import asdict
+from datetime import datetime
+from io import BytesIO
+from operator import attrgetter
+from concurrent.futures import ThreadPoolExecutor, Future
 from husfort.qutility import check_and_makedirs, SFG, SFY
-from husfort.qinstruments import CInstruMgr, parse_instrument_from_contract
-from typedef import CTrade, COrder, CAccountTianqin, CPriceBounds, EnumSigs, EnumStrategyName, CDepthMd
-from solutions.md import req_depth_md_tianqin, req_md_trade_date_wind
+from husfort.qinstruments import CInstruMgr
+from typedef import CTrade, COrder, CAccountTianqin, EnumSigs, EnumStrategyName, CDepthMd
+from solutions.md import CWindMdCache, req_md_wind_batch
+from solutions.pricing import cal_order_prices, cal_price_bounds_from_settle
+from solutions.contracts import CContractIndex, get_contract_index
+from solutions.md_store import CMdSnapshotStore, req_depth_md_tianqin_with_store
+from solutions.trace import TRACER
 
 
 def parse_tm_from_sec_and_apm(sec_type: str, am_or_pm: str) -> str:
@@ -20,29 +30,107 @@ def parse_tm_from_sec_and_apm(sec_type: str, am_or_pm: str) -> str:
         raise ValueError(f"Invalid combo for {sec_type}, {am_or_pm}")
 
 
+def parse_schedule_time(sec_type: str, am_or_pm: str, sig_date: str, exe_date: str) -> str:
+    """
+
+    :return: schedule time of orders at Orbit, format = "YYYY-MM-DD HH:MM:SS"
+    """
+    if (sec_type, am_or_pm) == ("opn", "pm"):
+        d, t = sig_date, "21:00:00"
+    elif (sec_type, am_or_pm) == ("opn", "am"):
+        d, t = exe_date, "09:00:00"
+    elif (sec_type, am_or_pm) == ("cls", "pm"):
+        d, t = exe_date, "14:59:00"
+    else:
+        raise ValueError(f"Invalid combo for {sec_type}, {am_or_pm}")
+    return f"{d[0:4]}-{d[4:6]}-{d[6:8]} {t}"
+
+
+def get_orders_file_names(
+        sig_date: str,
+        exe_date: str,
+        sec_type: str,
+        orders_file_name_tmpl: str,
+) -> dict[str, str]:
+    """
+
+    :return: {am_or_pm: orders_file_name}
+    """
+    if sec_type == "opn":
+        return {
+            "pm": orders_file_name_tmpl.format(
+                sig_date, sig_date, sec_type, "pm", parse_tm_from_sec_and_apm(sec_type, "pm")),
+            "am": orders_file_name_tmpl.format(
+                sig_date, exe_date, sec_type, "am", parse_tm_from_sec_and_apm(sec_type, "am")),
+        }
+    elif sec_type == "cls":
+        return {
+            "pm": orders_file_name_tmpl.format(
+                sig_date, exe_date, sec_type, "pm", parse_tm_from_sec_and_apm(sec_type, "pm")),
+        }
+    else:
+        raise ValueError(f"Invalid sig_type: {sec_type}")
+
+
+def apply_order_prices(
+        orders: list[COrder],
+        last: np.ndarray,
+        upper_lim: np.ndarray,
+        lower_lim: np.ndarray,
+        contract_index: CContractIndex,
+        drift: float,
+):
+    prices = cal_order_prices(
+        last=last,
+        upper_lim=upper_lim,
+        lower_lim=lower_lim,
+        mini_spread=contract_index.lookup([order.Instrument for order in orders], "mini_spread"),
+        is_buy=np.array([order.Direction == "买" for order in orders], dtype=bool),
+        drift=drift,
+    )
+    for order, price in zip(orders, prices):
+        order.Price = float(price)
+    return 0
+
+
 def convert_trades_to_orders(
         trades: list[CTrade],
         instru_mgr: CInstruMgr,
         drift: float,
         strategy: str,
+        contract_index: CContractIndex = None,
 ) -> list[COrder]:
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    trades = [trade for trade in trades if trade.qty > 0]
+    contracts = [trade.key.contract for trade in trades]
+    instrus = contract_index.lookup(contracts, "instrument")
+    exchanges = contract_index.lookup(contracts, "exchange")
+    mini_spreads = contract_index.lookup(contracts, "mini_spread")
+    base_prices = np.array([np.nan if t.base_price is None else t.base_price for t in trades], dtype=np.float64)
+    op_directions = [trade.op_direction for trade in trades]
+    order_prices = cal_order_prices(
+        last=base_prices,
+        upper_lim=np.inf,
+        lower_lim=-np.inf,
+        mini_spread=mini_spreads,
+        is_buy=np.array([d == "买" for d in op_directions], dtype=bool),
+        drift=drift,
+    )
     orders: list[COrder] = []
-    for trade in trades:
-        if trade.qty > 0:
-            instru = parse_instrument_from_contract(contract=trade.key.contract)
-            mini_spread = instru_mgr.get_mini_spread(instru)
-            trade.update_order_price(drift, mini_spread)
-            order = COrder(
-                Exchange=instru_mgr.get_exchange(instrumentId=instru),
-                Product=instru,
-                Instrument=trade.key.contract,
-                Direction=trade.op_direction,
-                Price=trade.order_price,
-                OfstFlag=trade.offsetFlag,
-                VolumeTotal=trade.qty,
-                Strategy=strategy,
-            )
-            orders.append(order)
+    for trade, instru, exchange, op_direction, order_price in zip(
+            trades, instrus, exchanges, op_directions, order_prices):
+        trade.order_price = float(order_price)
+        order = COrder(
+            Exchange=exchange,
+            Product=instru,
+            Instrument=trade.key.contract,
+            Direction=op_direction,
+            Price=trade.order_price,
+            OfstFlag=trade.offsetFlag,
+            VolumeTotal=trade.qty,
+            Strategy=strategy,
+        )
+        orders.append(order)
     return orders
 
 
@@ -67,32 +155,69 @@ def update_price_tianqin(
         account: CAccountTianqin,
         instru_mgr: CInstruMgr,
         drift: float,
-):
-    tq_contracts = [f"{order.Exchange}.{order.Instrument}" for order in orders]
-    depth_md: dict[str, CDepthMd] = req_depth_md_tianqin(
+        deadline: float = None,
+        timeout: float = None,
+        fallback_trade_date: str = None,
+        md_store: CMdSnapshotStore = None,
+        wind_cache: CWindMdCache = None,
+        contract_index: CContractIndex = None,
+) -> list[str]:
+    """
+
+    :param orders:
+    :param account:
+    :param instru_mgr:
+    :param drift:
+    :param deadline: unix timestamp, see req_depth_md_tianqin
+    :param timeout: seconds, counted from when quotes are requested, see req_depth_md_tianqin
+    :param fallback_trade_date: contracts without real time quotes before deadline are priced
+                                with settle-based bounds of this date from Wind, like update_price_wind
+    :param md_store: fresh quotes in store are reused, and new quotes are saved to it
+    :param wind_cache: local cache of Wind data for fallback
+    :param contract_index:
+    :return: contracts priced by fallback
+    """
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    tq_contracts = contract_index.lookup([order.Instrument for order in orders], "tq_code").tolist()
+    depth_md: dict[str, CDepthMd | None] = req_depth_md_tianqin_with_store(
         tq_contracts=list(set(tq_contracts)),
         tq_account=account.userId,
         tq_password=account.password,
+        store=md_store,
+        deadline=deadline,
+        timeout=timeout,
     )
-    for order in orders:
-        contract = f"{order.Exchange}.{order.Instrument}"
-        mini_spread = instru_mgr.get_mini_spread(order.Product)
-        cntrct_depth_md = depth_md[contract]
-        price_bounds = CPriceBounds(
-            last=cntrct_depth_md.last,
-            upper_lim=cntrct_depth_md.upper_lim,
-            lower_lim=cntrct_depth_md.lower_lim,
+    rt_orders: list[COrder] = []
+    fallback_orders: list[COrder] = []
+    # quotes with NaN last or limits are treated as missing and priced by fallback
+    valid = {
+        contract: md is not None and bool(np.isfinite([md.last, md.upper_lim, md.lower_lim]).all())
+        for contract, md in depth_md.items()
+    }
+    for order, contract in zip(orders, tq_contracts):
+        (rt_orders if valid[contract] else fallback_orders).append(order)
+    rt_depth_md = [depth_md[contract] for contract in tq_contracts if valid[contract]]
+    apply_order_prices(
+        orders=rt_orders,
+        last=np.array([md.last for md in rt_depth_md], dtype=np.float64),
+        upper_lim=np.array([md.upper_lim for md in rt_depth_md], dtype=np.float64),
+        lower_lim=np.array([md.lower_lim for md in rt_depth_md], dtype=np.float64),
+        contract_index=contract_index,
+        drift=drift,
+    )
+    fallback_contracts = sorted(set(order.Instrument for order in fallback_orders))
+    if fallback_contracts:
+        if fallback_trade_date is None:
+            raise ValueError(f"Real time quotes are not available for {fallback_contracts}")
+        print(
+            f"[WRN] Real time quotes are not available for {SFY(len(fallback_contracts))} contracts, "
+            f"use settle of {SFY(fallback_trade_date)} from Wind instead: {SFY(', '.join(fallback_contracts))}"
         )
-        order.update_order_price(
-            price_bounds=price_bounds,
-            drift=drift,
-            mini_spread=mini_spread,
+        update_price_wind(
+            fallback_orders, instru_mgr, drift, fallback_trade_date,
+            wind_cache=wind_cache, contract_index=contract_index,
         )
-    return 0
-
-
-def convert_to_integer_multiple(raw: float, minispread: float) -> float:
-    return int(np.round(raw // minispread * minispread))
+    return fallback_contracts
 
 
 def update_price_wind(
@@ -100,32 +225,142 @@ def update_price_wind(
         instru_mgr: CInstruMgr,
         drift: float,
         trade_date: str,
+        wind_cache: CWindMdCache = None,
+        contract_index: CContractIndex = None,
 ):
-    wd_contracts = [order.wind_code for order in orders]
-    md = req_md_trade_date_wind(
-        wd_contracts=list(set(wd_contracts)),
-        trade_date=trade_date,
-        fields=["settle", "changelt"],
+    if not orders:
+        return 0
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    contracts = [order.Instrument for order in orders]
+    wd_pairs = [(wind_code, trade_date) for wind_code in contract_index.lookup(contracts, "wind_code")]
+    md = req_md_wind_batch(wd_pairs=wd_pairs, fields=["settle", "changelt"], cache=wind_cache)
+    settle = np.array([md[pair]["settle"] for pair in wd_pairs], dtype=np.float64)
+    changelt = np.array([md[pair]["changelt"] for pair in wd_pairs], dtype=np.float64)
+    mini_spreads = contract_index.lookup(contracts, "mini_spread")
+    upper_lim, lower_lim = cal_price_bounds_from_settle(settle, changelt, mini_spreads)
+    apply_order_prices(
+        orders=orders,
+        last=settle,
+        upper_lim=upper_lim,
+        lower_lim=lower_lim,
+        contract_index=contract_index,
+        drift=drift,
     )
-    for order in orders:
-        order_req_data = md[order.wind_code]
-        settle, changelt = order_req_data["settle"], order_req_data["changelt"]
-        mini_spread = instru_mgr.get_mini_spread(order.Product)
-        price_bounds = CPriceBounds(
-            last=settle,
-            upper_lim=convert_to_integer_multiple(settle * (1 + changelt / 100), mini_spread) - mini_spread,
-            lower_lim=convert_to_integer_multiple(settle * (1 - changelt / 100), mini_spread) + mini_spread,
-        )
-        order.update_order_price(
-            price_bounds=price_bounds,
-            drift=drift,
-            mini_spread=mini_spread,
-        )
-        # if order.wind_code == "AP505.CZC":
-        #     breakpoint()
     return 0
 
 
+__payloads: dict[str, bytes] = {}
+__digests: dict[str, str] = {}
+__payloads_lock = threading.Lock()
+__archive_executor = ThreadPoolExecutor(max_workers=1)
+__archive_futures: list[Future] = []
+
+
+def __to_cell(v):
+    # numpy scalars are converted to python ones, so cells are hashed like those read back from disk
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float):
+        return round(v, 2) if math.isfinite(v) else None
+    return v
+
+
+def get_orders_rows(orders: list[COrder]) -> list[list]:
+    """
+    header and records of the workbook, floats are rounded to 2 decimals
+    like to_excel(float_format="%.2f"), and non-finite ones are written as empty cells like to_excel
+
+    """
+    names = COrder.names()
+    getter = attrgetter(*names)
+    return [list(names)] + [[__to_cell(v) for v in getter(order)] for order in orders]
+
+
+def hash_orders_rows(rows: list[list]) -> str:
+    """
+    digest of the cells, bytes of a workbook are not stable because openpyxl
+    writes the time of saving into it, so orders are identified by this digest.
+
+    """
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def get_digest_path(orders_path: str) -> str:
+    return f"{orders_path}.sha256"
+
+
+def write_orders_workbook(orders: list[COrder], rows: list[list] = None) -> bytes:
+    """
+    build the workbook from order records directly
+
+    :param orders:
+    :param rows: rows from get_orders_rows(orders), built if not provided
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="Sheet1")
+    for row in (rows if rows is not None else get_orders_rows(orders)):
+        ws.append(row)
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def __write_archive(orders_path: str, payload: bytes, digest: str):
+    tmp_path = f"{orders_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, orders_path)
+    with open(get_digest_path(orders_path), "w") as f:
+        f.write(digest)
+    return 0
+
+
+def flush_orders_archive():
+    with __payloads_lock:
+        futures = list(__archive_futures)
+        __archive_futures.clear()
+    for future in futures:
+        future.result()
+    return 0
+
+
+def get_orders_payload(orders_path: str) -> bytes:
+    """
+
+    :return: bytes of the orders file saved in this process, or read from disk
+    """
+    with __payloads_lock:
+        if (payload := __payloads.get(orders_path)) is not None:
+            return payload
+    with open(orders_path, "rb") as f:
+        return f.read()
+
+
+def get_orders_digest(orders_path: str) -> str:
+    """
+
+    :return: digest of the orders saved in this process, or from the sidecar saved with the archive,
+             or from the cells of the file on disk
+    """
+    with __payloads_lock:
+        if (digest := __digests.get(orders_path)) is not None:
+            return digest
+    if os.path.exists(digest_path := get_digest_path(orders_path)):
+        with open(digest_path, "r") as f:
+            return f.read().strip()
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(orders_path, read_only=True)
+    try:
+        rows = [list(row) for row in wb.worksheets[0].iter_rows(values_only=True)]
+    finally:
+        wb.close()
+    return hash_orders_rows(rows)
+
+
 def save_orders(
         orders: list[COrder],
         sig_date: str,
@@ -134,14 +369,14 @@ def save_orders(
         am_or_pm: Literal["am", "pm"],
         orders_file_name_tmpl: str,
         orders_dir: str,
-):
-    pd.set_option("display.unicode.east_asian_width", True)
-    orders_data: list[dict] = [asdict(order) for order in orders]
-    if orders_data:
-        df = pd.DataFrame(data=orders_data)
-        # print(df)
-    else:
-        df = pd.DataFrame(columns=COrder.names())
+) -> str:
+    """
+    workbook is built in memory and kept by path for get_orders_payload,
+    the on-disk copy for archive is written in background, use flush_orders_archive to wait for it.
+
+    :return: path of the orders file
+    """
+    if not orders:
         print(f"[INF] There are no orders available for {SFY(sig_date)}-{SFY(sec_type)}-{SFY(am_or_pm)}")
     check_and_makedirs(d := os.path.join(orders_dir, sig_date[0:4], sig_date[4:6]))
     if sec_type == "opn" and am_or_pm == "pm":
@@ -149,9 +384,17 @@ def save_orders(
     tm = parse_tm_from_sec_and_apm(sec_type, am_or_pm)
     orders_file = orders_file_name_tmpl.format(sig_date, exe_date, sec_type, am_or_pm, tm)
     orders_path = os.path.join(d, orders_file)
-    df.to_excel(orders_path, index=False, float_format="%.2f", engine='openpyxl')
+    with TRACER.stage("orders.save", sig_type=sec_type, am_or_pm=am_or_pm) as span:
+        rows = get_orders_rows(orders)
+        digest = hash_orders_rows(rows)
+        payload = write_orders_workbook(orders, rows=rows)
+        with __payloads_lock:
+            __payloads[orders_path] = payload
+            __digests[orders_path] = digest
+            __archive_futures.append(__archive_executor.submit(__write_archive, orders_path, payload, digest))
+        span.rows, span.bytes = len(orders), len(payload)
     print(f"[INF] Orders of {sig_date}-{sec_type}-{am_or_pm} are saved to {SFG(orders_path)}")
-    return 0
+    return orders_path
 
 
 def main_order(
@@ -167,12 +410,43 @@ def main_order(
         account_tianqin: CAccountTianqin,
         orders_file_name_tmpl: str,
         orders_dir: str,
+        rt_timeout: float = 60.0,
+        rt_margin: float = 60.0,
+        md_store: CMdSnapshotStore = None,
+        wind_cache: CWindMdCache = None,
+        contract_index: CContractIndex = None,
 ):
-    orders = convert_trades_to_orders(trades, instru_mgr, drift, strategy=strategy.value)
-    if using_rt:
-        update_price_tianqin(orders, account_tianqin, instru_mgr, drift)
-    else:
-        update_price_wind(orders, instru_mgr, drift, sig_date)
+    """
+
+    :param rt_timeout: seconds to wait for real time quotes
+    :param rt_margin: real time quotes are never waited for later than
+                      rt_margin seconds before the schedule time at Orbit
+    :param md_store: snapshot store of real time quotes
+    :param wind_cache: local cache of Wind data
+    :param contract_index: contract metadata shared by stages
+    """
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    with TRACER.stage("orders.convert", sig_type=sig_type.value) as span:
+        orders = convert_trades_to_orders(
+            trades, instru_mgr, drift, strategy=strategy.value, contract_index=contract_index,
+        )
+        span.rows = len(orders)
+    with TRACER.stage("orders.price", sig_type=sig_type.value, source="tianqin" if using_rt else "wind") as span:
+        span.rows = len(orders)
+        if using_rt:
+            schedule_time = parse_schedule_time(sig_type.value, am_or_pm, sig_date, exe_date)
+            schedule_ts = datetime.strptime(schedule_time, "%Y-%m-%d %H:%M:%S").timestamp()
+            # rt_timeout is counted after other quote requests of this process are finished
+            fallback_contracts = update_price_tianqin(
+                orders, account_tianqin, instru_mgr, drift,
+                deadline=schedule_ts - rt_margin, timeout=rt_timeout, fallback_trade_date=sig_date, md_store=md_store, wind_cache=wind_cache,
+                contract_index=contract_index,
+            )
+            span.attrs["fallback"] = len(fallback_contracts)
+        else:
+            update_price_wind(
+                orders, instru_mgr, drift, sig_date, wind_cache=wind_cache, contract_index=contract_index,
+            )
     adjust_for_regulation_exception(orders)
     save_orders(
         orders=orders,
@@ -0,0 +1,209 @@
+import os
+import time
+import json
+import threading
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from husfort.qutility import check_and_makedirs, SFG, SFY, SFR
+from typedef import CAccountMail, CAccountOrbit
+from solutions.orders import get_orders_file_names, get_orders_digest
+
+STATE_PENDING = "pending"
+STATE_DELIVERED = "delivered"
+STATE_FAILED = "failed"
+
+
+class COutbox:
+    def __init__(self, outbox_path: str, max_retries: int = 3, backoff: float = 2.0):
+        """
+        persisted dispatch queue, each job is a group of order files with its target channels,
+        delivery state of each (job, channel) is saved to outbox_path after every change.
+
+        :param outbox_path: json file
+        :param max_retries: retries for each (job, channel)
+        :param backoff: seconds, delay before the i-th retry is backoff * 2 ** i
+        """
+        self.outbox_path = outbox_path
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.__lock = threading.Lock()
+        self.__inflight: set[tuple[str, str]] = set()
+        if os.path.exists(outbox_path):
+            with open(outbox_path, "r", encoding="utf-8") as f:
+                self.jobs: dict[str, dict] = json.load(f)
+        else:
+            self.jobs = {}
+
+    def save(self):
+        check_and_makedirs(os.path.dirname(self.outbox_path))
+        tmp_path = f"{self.outbox_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.outbox_path)
+        return 0
+
+    def enqueue(
+            self,
+            job_id: str,
+            params: dict,
+            files: list[str],
+            channels: list[str],
+            force: bool = False,
+    ) -> dict:
+        """
+
+        :param job_id:
+        :param params: parameters passed to deliverers, must be json serializable
+        :param files: paths of order files to deliver, identified by get_orders_digest
+        :param channels: names of deliverers, like ["email", "orbit"]
+        :param force: reset delivered channels to pending, even if the orders are not changed
+        :return: the job. Delivered channels are kept if the orders are not changed and force is
+                 not set. If the orders are changed, all channels are reset to pending, so the
+                 corrected orders are delivered, Orbit skips files already accepted by digest.
+        """
+        digests = {f: get_orders_digest(f) for f in files}
+        with self.__lock:
+            if (job := self.jobs.get(job_id)) is None:
+                job = self.jobs[job_id] = {"params": params, "files": digests, "channels": {}}
+            changed = job["files"] != digests
+            if changed:
+                delivered = [c for c, s in job["channels"].items() if s["state"] == STATE_DELIVERED]
+                if delivered:
+                    print(
+                        f"[WRN] Orders of {SFY(job_id)} are changed after delivered by {SFY(', '.join(delivered))}, "
+                        f"they are delivered again"
+                    )
+                job["params"], job["files"] = params, digests
+            for c in channels:
+                state = job["channels"].get(c)
+                if state is None or state["state"] != STATE_DELIVERED or changed or force:
+                    job["channels"][c] = {"state": STATE_PENDING, "attempts": 0, "error": None}
+            self.save()
+        return job
+
+    def get_pending(self, job_ids: list[str] = None) -> list[tuple[str, str]]:
+        """
+
+        :param job_ids: None means all jobs
+        :return: (job, channel) not delivered and not being delivered
+        """
+        return [
+            (job_id, channel)
+            for job_id, job in self.jobs.items()
+            if job_ids is None or job_id in job_ids
+            for channel, state in job["channels"].items()
+            if state["state"] != STATE_DELIVERED and (job_id, channel) not in self.__inflight
+        ]
+
+    def __claim(self, job_ids: list[str] | None, channels: list[str]) -> list[tuple[str, str]]:
+        with self.__lock:
+            claimed = [z for z in self.get_pending(job_ids) if z[1] in channels]
+            self.__inflight.update(claimed)
+        return claimed
+
+    def __set_state(self, job_id: str, channel: str, state: str, error: str = None):
+        with self.__lock:
+            channel_state = self.jobs[job_id]["channels"][channel]
+            channel_state["state"] = state
+            channel_state["attempts"] += 1
+            channel_state["error"] = error
+            self.save()
+
+    def __deliver(self, job_id: str, channel: str, deliver: Callable[[dict], object]) -> bool:
+        params = self.jobs[job_id]["params"]
+        try:
+            for i in range(self.max_retries + 1):
+                try:
+                    deliver(params)
+                    self.__set_state(job_id, channel, STATE_DELIVERED)
+                    print(f"[INF] {SFG(job_id)} is delivered by {SFG(channel)}")
+                    return True
+                except Exception as e:
+                    self.__set_state(job_id, channel, STATE_FAILED, error=repr(e))
+                    print(f"[WRN] Failed to deliver {SFY(job_id)} by {SFY(channel)}: {e}")
+                    if i < self.max_retries:
+                        time.sleep(self.backoff * 2 ** i)
+            return False
+        finally:
+            with self.__lock:
+                self.__inflight.discard((job_id, channel))
+
+    def run(self, deliverers: dict[str, Callable[[dict], object]], job_ids: list[str] = None) -> bool:
+        """
+        deliver pending (job, channel) in parallel, each of them is claimed as in-flight
+        before delivery, so concurrent calls never deliver the same one twice.
+
+        :param deliverers:
+        :param job_ids: jobs to deliver, None means all jobs in outbox, which is for 'dispatch' only
+        :return: True if all claimed are delivered
+        """
+        pending = self.__claim(job_ids, list(deliverers))
+        if not pending:
+            print(f"[INF] There is nothing to deliver in {SFG(self.outbox_path)}")
+            return True
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            results = list(executor.map(lambda z: self.__deliver(z[0], z[1], deliverers[z[1]]), pending))
+        if not all(results):
+            print(f"[WRN] {SFR(results.count(False))} deliveries failed, run again to resume")
+        return all(results)
+
+
+def enqueue_orders(
+        outbox: COutbox,
+        sig_date: str,
+        exe_date: str,
+        sec_type: str,
+        orders_file_name_tmpl: str,
+        orders_dir: str,
+        channels: list[str],
+        force: bool = False,
+) -> str:
+    """
+
+    :return: id of the job
+    """
+    d = os.path.join(orders_dir, sig_date[0:4], sig_date[4:6])
+    files = get_orders_file_names(sig_date, exe_date, sec_type, orders_file_name_tmpl).values()
+    job_id = f"orders-sig-{sig_date}-exe-{exe_date}-{sec_type}"
+    outbox.enqueue(
+        job_id=job_id,
+        params={"sig_date": sig_date, "exe_date": exe_date, "sec_type": sec_type},
+        files=[os.path.join(d, f) for f in files],
+        channels=channels,
+        force=force,
+    )
+    return job_id
+
+
+def make_orders_deliverers(
+        account_mail: CAccountMail,
+        receivers: list[str],
+        account_orbit: CAccountOrbit,
+        orders_file_name_tmpl: str,
+        orders_dir: str,
+        orbit_dir: str,
+) -> dict[str, Callable[[dict], object]]:
+    from solutions.emails import send_orders_by_emails
+    from solutions.orbit import send_orders_by_orbit
+
+    def __email(params: dict):
+        return send_orders_by_emails(
+            account_mail=account_mail,
+            sig_date=params["sig_date"], exe_date=params["exe_date"],
+            sec_type=params["sec_type"],
+            orders_file_name_tmpl=orders_file_name_tmpl,
+            orders_dir=orders_dir,
+            receivers=receivers,
+        )
+
+    def __orbit(params: dict):
+        return send_orders_by_orbit(
+            account_orbit=account_orbit,
+            sig_date=params["sig_date"], exe_date=params["exe_date"],
+            sec_type=params["sec_type"],
+            orders_file_name_tmpl=orders_file_name_tmpl,
+            orders_dir=orders_dir,
+            orbit_dir=orbit_dir,
+        )
+
+    return {"email": __email, "orbit": __orbit}
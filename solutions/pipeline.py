@@ -0,0 +1,219 @@
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from husfort.qutility import SFG, SFY
+from husfort.qcalendar import CCalendar
+from husfort.qinstruments import CInstruMgr
+from solutions.calendar_index import CCalendarIndex
+from solutions.trace import TRACER
+from typedef import CCfg, EnumSigs, EnumStrategyName
+
+
+@dataclass
+class CNode:
+    name: str
+    func: Callable[[], object]
+    deps: list[str] = field(default_factory=list)
+
+
+class CDagRunner:
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.nodes: dict[str, CNode] = {}
+
+    def add(self, name: str, func: Callable[[], object], deps: list[str] = None):
+        if name in self.nodes:
+            raise ValueError(f"Node {name} is already defined")
+        self.nodes[name] = CNode(name=name, func=func, deps=deps or [])
+        return 0
+
+    def __check(self):
+        for node in self.nodes.values():
+            for dep in node.deps:
+                if dep not in self.nodes:
+                    raise ValueError(f"Node {node.name} depends on an undefined node {dep}")
+
+    @staticmethod
+    def __run_node(node: CNode):
+        with TRACER.stage(f"dag.{node.name}"):
+            return node.func()
+
+    def run(self):
+        """
+        run each node as soon as all of its dependencies are finished,
+        independent nodes run concurrently in a thread pool. The first
+        exception raised by a node is re-raised after running nodes finish.
+        """
+        self.__check()
+        pending: dict[str, CNode] = dict(self.nodes)
+        finished: set[str] = set()
+        running: dict[Future, tuple[str, float]] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                ready = [node for node in pending.values() if all(dep in finished for dep in node.deps)]
+                for node in ready:
+                    del pending[node.name]
+                    running[executor.submit(self.__run_node, node)] = (node.name, time.time())
+                if not running:
+                    raise ValueError(f"Nodes {list(pending)} have circular dependencies")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, t0 = running.pop(future)
+                    future.result()
+                    finished.add(name)
+                    print(f"[INF] Stage {SFG(name)} finished in {time.time() - t0:.2f} seconds")
+        return 0
+
+
+def run_daily(
+        sig_date: str,
+        bgn_date: str,
+        secs: list[str],
+        use_tq: bool,
+        using_rt: bool,
+        send: bool,
+        calendar: CCalendar | CCalendarIndex,
+        instru_mgr: CInstruMgr,
+        cfg: CCfg,
+        max_workers: int = 4,
+        force: bool = False,
+        md_ttl: float = 0.0,
+):
+    """
+    allocated -> sync -> positions -> trades -> orders [-> send] in one process,
+    calendar, instrument manager, contract index and allocated equity are loaded once and shared by all stages.
+
+    :param force: send orders again even if they were delivered
+    :param md_ttl: seconds, stored quotes younger than it are reused, 0 means always request live quotes
+    """
+    from solutions.allocated_equity import gen_allocated_equity_from_cash_flow, CReaderAllocatedEquity
+    from solutions.sync import download_signals_range
+    from solutions.positions import convert_signal_to_positions
+    from solutions.trades import gen_trades_data, save_trades_data, load_trades, split_trades
+    from solutions.orders import main_order, flush_orders_archive
+    from solutions.outbox import COutbox, enqueue_orders, make_orders_deliverers
+    from solutions.md_store import CMdSnapshotStore
+    from solutions.md import CWindMdCache
+    from solutions.contracts import load_contract_index
+    from solutions.signal_store import CSignalStore
+
+    prev_sig_date = calendar.get_next_date(sig_date, shift=-1)
+    exe_date = calendar.get_next_date(sig_date, shift=1)
+    shared: dict[str, CReaderAllocatedEquity] = {}
+    md_store = CMdSnapshotStore(cfg.md_snapshots_dir, ttl=md_ttl)
+    wind_cache = CWindMdCache(cfg.wind_md_cache_path)
+    contract_index = load_contract_index(sig_date, cfg.contracts_dir, instru_mgr, cfg.instru_info_path)
+    signal_store = CSignalStore(cfg.signal_store_dir)
+
+    def __allocated():
+        gen_allocated_equity_from_cash_flow(
+            bgn_date=bgn_date,
+            stp_date=exe_date,
+            cash_flow_path=cfg.cash_flow_path,
+            allocated_equity_path=cfg.allocated_equity_path,
+            calendar=calendar,
+        )
+        shared["reader_alloc"] = CReaderAllocatedEquity(cfg.allocated_equity_path)
+
+    def __sync():
+        res = download_signals_range(
+            sig_dates=[sig_date],
+            sig_types=list(EnumSigs),
+            signals_file_name_tmpl=cfg.signals_file_name_tmpl,
+            src_signals_dir=cfg.src_signals_dir,
+            dst_signals_dir=cfg.signals_dir,
+            host=cfg.host,
+        )
+        if res["missing"] > 0:
+            raise FileNotFoundError(f"{res['missing']} signal files of {sig_date} are not found in {cfg.src_signals_dir}")
+        signal_store.ingest([sig_date], list(EnumSigs), cfg.signals_file_name_tmpl, cfg.signals_dir)
+
+    def __positions(sig_type: EnumSigs):
+        convert_signal_to_positions(
+            sig_date=sig_date,
+            sig_type=sig_type,
+            signals_file_name_tmpl=cfg.signals_file_name_tmpl,
+            positions_file_name_tmpl=cfg.positions_file_name_tqdb_tmpl,
+            signals_dir=cfg.signals_dir,
+            positions_dir=cfg.positions_dir,
+            allocated_equity=shared["reader_alloc"].get_allocated_equity(sig_date) * 0.5,
+            instru_mgr=instru_mgr,
+            contract_index=contract_index,
+        )
+
+    def __trades(sig_type: EnumSigs):
+        trades_data = gen_trades_data(
+            this_sig_date=sig_date,
+            prev_sig_date=prev_sig_date,
+            sig_type=sig_type,
+            positions_file_name_tqdb_tmpl=cfg.positions_file_name_tqdb_tmpl,
+            positions_file_name_fuai_tmpl=cfg.positions_file_name_fuai_tmpl,
+            positions_dir=cfg.positions_dir,
+            use_tq=use_tq,
+        )
+        save_trades_data(trades_data, sig_date, sig_type, cfg.trades_file_name_tmpl, cfg.trades_dir)
+
+    def __orders(sig_type: EnumSigs, am_or_pm: str):
+        trades = load_trades(
+            sig_date=sig_date, sig_type=sig_type,
+            trades_file_name_tmpl=cfg.trades_file_name_tmpl, trades_dir=cfg.trades_dir,
+        )
+        if sig_type == EnumSigs.opn:
+            opn_pm_trades, opn_am_trades = split_trades(trades, instru_mgr, contract_index=contract_index)
+            trades = opn_pm_trades if am_or_pm == "pm" else opn_am_trades
+        main_order(
+            trades=trades, sig_date=sig_date, exe_date=exe_date,
+            sig_type=sig_type, strategy=EnumStrategyName[sig_type.value], am_or_pm=am_or_pm,
+            drift=cfg.drift, instru_mgr=instru_mgr,
+            using_rt=using_rt, account_tianqin=cfg.account_tianqin,
+            orders_file_name_tmpl=cfg.orders_file_name_tmpl, orders_dir=cfg.orders_dir,
+            md_store=md_store, wind_cache=wind_cache, contract_index=contract_index,
+        )
+
+    outbox = COutbox(cfg.outbox_path)
+    deliverers = make_orders_deliverers(
+        account_mail=cfg.account_mail,
+        receivers=cfg.receivers,
+        account_orbit=cfg.account_orbit,
+        orders_file_name_tmpl=cfg.orders_file_name_tmpl,
+        orders_dir=cfg.orders_dir,
+        orbit_dir=cfg.orbit_dir,
+    )
+
+    def __send(sec: str):
+        # errors of writing archive are raised before orders are dispatched
+        flush_orders_archive()
+        job_id = enqueue_orders(
+            outbox=outbox,
+            sig_date=sig_date, exe_date=exe_date,
+            sec_type=sec,
+            orders_file_name_tmpl=cfg.orders_file_name_tmpl,
+            orders_dir=cfg.orders_dir,
+            channels=["email", "orbit"],
+            force=force,
+        )
+        if not outbox.run(deliverers, job_ids=[job_id]):
+            raise RuntimeError(f"Failed to deliver orders of {sig_date}-{sec}, use 'dispatch' to resume")
+
+    runner = CDagRunner(max_workers=max_workers)
+    runner.add("allocated", __allocated)
+    runner.add("sync", __sync)
+    for sig_type in EnumSigs:
+        t = sig_type.value
+        runner.add(f"positions-{t}", lambda z=sig_type: __positions(z), deps=["allocated", "sync"])
+        runner.add(f"trades-{t}", lambda z=sig_type: __trades(z), deps=[f"positions-{t}"])
+    for sec in secs:
+        apms = ["pm", "am"] if sec == "opn" else ["pm"]
+        for apm in apms:
+            runner.add(f"orders-{sec}-{apm}", lambda z=EnumSigs(sec), a=apm: __orders(z, a), deps=[f"trades-{sec}"])
+        if send:
+            runner.add(f"send-{sec}", lambda z=sec: __send(z), deps=[f"orders-{sec}-{apm}" for apm in apms])
+
+    print(f"[INF] Daily pipeline for {SFY(sig_date)} with stages: {SFG(', '.join(runner.nodes))}")
+    try:
+        runner.run()
+        flush_orders_archive()
+    finally:
+        contract_index.save()
+    return 0
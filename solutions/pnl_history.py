@@ -0,0 +1,245 @@
+import os
+import numpy as np
+import pandas as pd
+from husfort.qutility import check_and_makedirs, SFG, SFY
+from husfort.qinstruments import CInstruMgr
+from typedef import CCfg, EnumSigs, CTradeBatch, CPositionBook
+from solutions.calendar_index import CCalendarIndex
+from solutions.contracts import CContractIndex, get_contract_index
+from solutions.md import CWindMdCache, req_md_wind_batch
+from solutions.positions import load_position_book_tqdb
+from solutions.trades import load_trades_batch
+
+NAV_COLUMNS = ["trade_date", "sig_type", "pnl", "equity", "ret", "nav"]
+PNL_CONTRACT_COLUMNS = ["trade_date", "sig_type", "contract", "pnl"]
+
+
+def get_pnl_paths(pnl_dir: str) -> tuple[str, str]:
+    return os.path.join(pnl_dir, "nav.csv"), os.path.join(pnl_dir, "pnl_contracts.csv")
+
+
+def __load_trades_or_none(sig_date: str, sig_type: EnumSigs, cfg: CCfg) -> CTradeBatch | None:
+    try:
+        return load_trades_batch(sig_date, sig_type, cfg.trades_file_name_tmpl, cfg.trades_dir)
+    except FileNotFoundError:
+        print(f"[INF] Trades of {SFY(sig_date)}-{SFY(sig_type.value)} are not available")
+        return None
+
+
+def __has_positions(sig_date: str, sig_type: EnumSigs, cfg: CCfg) -> bool:
+    pos_file = cfg.positions_file_name_tqdb_tmpl.format(sig_date, sig_type.value)
+    return os.path.exists(os.path.join(cfg.positions_dir, sig_date[0:4], sig_date[4:6], pos_file))
+
+
+def get_complete_dates(
+        books: list[CPositionBook],
+        trades: list[CTradeBatch],
+        available: np.ndarray,
+        contracts: np.ndarray,
+        settle: np.ndarray,
+) -> np.ndarray:
+    """
+    pnl of date d is complete if positions and trades of d-1 and d are available, settles of d-1 and d
+    of contracts held at d-1 are available, and settles of d of contracts traded on d are available.
+
+    :param books: T books, like cal_pnl_matrix
+    :param trades: T batches, like cal_pnl_matrix
+    :param available: shape = (T,), positions and trades files of each date are available
+    :param contracts: shape = (C,)
+    :param settle: shape = (T, C)
+    :return: shape = (T - 1,), bool
+    """
+    col = {c: j for j, c in enumerate(contracts)}
+    finite = np.isfinite(settle)
+    res = available[:-1] & available[1:]
+    for i in range(1, len(books)):
+        held = [col[c] for c in books[i - 1].contract]
+        traded = [col[c] for c in trades[i].contract]
+        res[i - 1] &= bool(finite[i - 1, held].all() and finite[i, held].all() and finite[i, traded].all())
+    return res
+
+
+def cal_pnl_matrix(
+        books: list[CPositionBook],
+        trades: list[CTradeBatch],
+        contracts: np.ndarray,
+        settle: np.ndarray,
+        multiplier: np.ndarray,
+) -> np.ndarray:
+    """
+    daily pnl of one strategy over T trade dates, the first one is the base date.
+    Holding at the close of date d is the target position of signal date prev(d),
+    pnl of date d = holding of d-1 * (settle of d - settle of d-1)
+                  + trades executed on d * (settle of d - trade price),
+    trade price is order_price, or base_price if order_price is not available.
+
+    :param books: holding at the close of each date, T books
+    :param trades: trades executed on each date, T batches, the first one is ignored
+    :param contracts: shape = (C,)
+    :param settle: shape = (T, C)
+    :param multiplier: shape = (C,)
+    :return: pnl of dates[1:], shape = (T - 1, C)
+    """
+    col = {c: j for j, c in enumerate(contracts)}
+    size = np.zeros((len(books), len(contracts)))
+    for i, book in enumerate(books):
+        j = np.fromiter((col[c] for c in book.contract), dtype=np.int64, count=len(book))
+        np.add.at(size[i], j, book.qty * book.direction)
+
+    trade_qty = np.zeros((len(books), len(contracts)))
+    trade_val = np.zeros((len(books), len(contracts)))
+    for i, batch in enumerate(trades[1:], start=1):
+        j = np.fromiter((col[c] for c in batch.contract), dtype=np.int64, count=len(batch))
+        signed_qty = batch.qty * batch.direction * batch.offset
+        price = np.where(np.isfinite(batch.order_price), batch.order_price, batch.base_price)
+        price = np.where(np.isfinite(price), price, settle[i - 1, j])
+        np.add.at(trade_qty[i], j, signed_qty)
+        np.add.at(trade_val[i], j, signed_qty * price)
+
+    size, trade_qty, trade_val = size * multiplier, trade_qty * multiplier, trade_val * multiplier
+    carry = size[:-1] * (settle[1:] - settle[:-1])
+    execution = trade_qty[1:] * settle[1:] - trade_val[1:]
+    return np.nan_to_num(carry) + np.nan_to_num(execution)
+
+
+def gen_pnl_history(
+        bgn_date: str,
+        end_date: str,
+        calendar: CCalendarIndex,
+        instru_mgr: CInstruMgr,
+        cfg: CCfg,
+        pnl_dir: str,
+        wind_cache: CWindMdCache = None,
+        contract_index: CContractIndex = None,
+):
+    """
+    daily pnl of each contract and each strategy from positions, trades and settle prices,
+    with nav against allocated equity * 0.5 of each strategy. Results are saved to
+    pnl_dir/{nav.csv, pnl_contracts.csv}, only dates after the last cached one are computed.
+    If bgn_date is not the first cached date, the cache is rebuilt.
+
+    :param bgn_date: first trade date
+    :param end_date: last trade date, included
+    :param calendar:
+    :param instru_mgr:
+    :param cfg:
+    :param pnl_dir:
+    :param wind_cache: settle prices are read from it, and missing ones are requested from Wind
+    :param contract_index:
+    :return:
+    """
+    from solutions.allocated_equity import CReaderAllocatedEquity
+
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    trade_dates = calendar.get_range(bgn_date, calendar.get_next_date(end_date, shift=1))
+    if len(trade_dates) == 0:
+        print(f"[INF] There are no trade dates in {SFY(bgn_date)} -> {SFY(end_date)}")
+        return 0
+
+    nav_path, pnl_contract_path = get_pnl_paths(pnl_dir)
+    nav_data, pnl_contract_data = pd.DataFrame(columns=NAV_COLUMNS), pd.DataFrame(columns=PNL_CONTRACT_COLUMNS)
+    if os.path.exists(nav_path) and os.path.exists(pnl_contract_path):
+        nav_data = pd.read_csv(nav_path, dtype={"trade_date": str})
+        pnl_contract_data = pd.read_csv(pnl_contract_path, dtype={"trade_date": str})
+        if nav_data.empty or nav_data["trade_date"].iloc[0] != trade_dates[0]:
+            print(f"[INF] Begin date is changed, pnl history in {SFG(pnl_dir)} will be rebuilt")
+            nav_data, pnl_contract_data = nav_data.iloc[0:0], pnl_contract_data.iloc[0:0]
+        else:
+            trade_dates = trade_dates[trade_dates > nav_data["trade_date"].iloc[-1]]
+    if len(trade_dates) == 0:
+        print(f"[INF] PnL history in {SFG(pnl_dir)} is up to date")
+        return 0
+
+    # --- dates[0] is the base date, pnl is computed for dates[1:]
+    dates = np.concatenate([[calendar.get_next_date(trade_dates[0], shift=-1)], trade_dates])
+    sig_dates = calendar.shift_batch(dates, -1)
+
+    # --- no signals are traded before the first date of the allocated equity ledger,
+    # --- positions and trades of those dates are flat instead of missing
+    reader_alloc = CReaderAllocatedEquity(cfg.allocated_equity_path)
+    first_sig_date, last_sig_date = reader_alloc.trade_dates[0], reader_alloc.trade_dates[-1]
+    is_flat = sig_dates < first_sig_date
+    books: dict[EnumSigs, list[CPositionBook]] = {}
+    trades: dict[EnumSigs, list[CTradeBatch]] = {}
+    available: dict[EnumSigs, np.ndarray] = {}
+    contract_set: set[str] = set()
+    for sig_type in EnumSigs:
+        books[sig_type] = [
+            CPositionBook.empty() if flat else
+            load_position_book_tqdb(sig_date, sig_type, cfg.positions_file_name_tqdb_tmpl, cfg.positions_dir)
+            for sig_date, flat in zip(sig_dates, is_flat)
+        ]
+        raw_trades = [CTradeBatch.empty()] + [
+            CTradeBatch.empty() if flat else __load_trades_or_none(sig_date, sig_type, cfg)
+            for sig_date, flat in zip(sig_dates[1:], is_flat[1:])
+        ]
+        trades[sig_type] = [CTradeBatch.empty() if z is None else z for z in raw_trades]
+        available[sig_type] = np.array([
+            flat or (__has_positions(sig_date, sig_type, cfg) and z is not None)
+            for sig_date, flat, z in zip(sig_dates, is_flat, raw_trades)
+        ], dtype=bool)
+        for data in books[sig_type] + trades[sig_type]:
+            contract_set.update(data.contract.tolist())
+    contracts = np.array(sorted(contract_set), dtype=object)
+
+    wind_codes = contract_index.lookup(contracts, "wind_code").tolist()
+    wd_pairs = [(code, d) for d in dates.tolist() for code in wind_codes]
+    md = req_md_wind_batch(wd_pairs=wd_pairs, fields=["settle", "changelt"], cache=wind_cache)
+    settle = np.array(
+        [[md.get((code, d), {}).get("settle", np.nan) for code in wind_codes] for d in dates.tolist()],
+        dtype=np.float64,
+    )
+    settle = settle.reshape(len(dates), len(contracts))
+    multiplier = contract_index.lookup(contracts, "multiplier").astype(np.float64)
+
+    # --- only leading complete dates are saved, so the incremental cache never holds a partial pnl,
+    # --- the first incomplete date and later ones are computed again in later runs
+    complete = np.ones(len(trade_dates), dtype=bool)
+    for sig_type in EnumSigs:
+        complete &= get_complete_dates(books[sig_type], trades[sig_type], available[sig_type], contracts, settle)
+    n_complete = len(trade_dates) if complete.all() else int(np.argmin(complete))
+    if n_complete < len(trade_dates):
+        print(
+            f"[WRN] Settles, positions or trades of {SFY(trade_dates[n_complete])} are not available, "
+            f"pnl of it and later dates is not saved"
+        )
+    if n_complete == 0:
+        return 0
+    trade_dates = trade_dates[:n_complete]
+
+    # --- equity of dates out of the ledger is taken from the nearest ledger date, pnl of them is 0
+    eq_dates = sig_dates[1:n_complete + 1]
+    eq_dates = np.where(eq_dates < first_sig_date, first_sig_date, eq_dates)
+    eq_dates = np.where(eq_dates > last_sig_date, last_sig_date, eq_dates)
+    equity = reader_alloc.get_allocated_equity_batch(eq_dates.tolist()) * 0.5
+    last_nav = nav_data.groupby("sig_type")["nav"].last().to_dict()
+    new_nav, new_pnl_contract = [], []
+    total_pnl = np.zeros(len(trade_dates))
+    for sig_type in EnumSigs:
+        pnl = cal_pnl_matrix(books[sig_type], trades[sig_type], contracts, settle, multiplier)[:n_complete]
+        i, j = np.nonzero(pnl)
+        new_pnl_contract.append(pd.DataFrame({
+            "trade_date": trade_dates[i], "sig_type": sig_type.value, "contract": contracts[j], "pnl": pnl[i, j],
+        }))
+        new_nav.append((sig_type.value, pnl.sum(axis=1), equity))
+        total_pnl += pnl.sum(axis=1)
+    new_nav.append(("total", total_pnl, equity * len(EnumSigs)))
+
+    nav_dfs = []
+    for sig_type, pnl, eq in new_nav:
+        ret = pnl / eq
+        nav = last_nav.get(sig_type, 1.0) * np.cumprod(1 + ret)
+        nav_dfs.append(pd.DataFrame({
+            "trade_date": trade_dates, "sig_type": sig_type, "pnl": pnl, "equity": eq, "ret": ret, "nav": nav,
+        }))
+    nav_data = pd.concat([nav_data] + nav_dfs, axis=0, ignore_index=True).sort_values(
+        by=["trade_date", "sig_type"], kind="stable", ignore_index=True)
+    pnl_contract_data = pd.concat([pnl_contract_data] + new_pnl_contract, axis=0, ignore_index=True)
+
+    check_and_makedirs(pnl_dir)
+    nav_data.to_csv(nav_path, index=False, float_format="%.8f")
+    pnl_contract_data.to_csv(pnl_contract_path, index=False, float_format="%.4f")
+    print(f"[INF] PnL of {SFG(len(trade_dates))} dates {SFG(trade_dates[0])} -> {SFG(trade_dates[-1])} "
+          f"are saved to {SFG(pnl_dir)}")
+    print(nav_data.pivot(index="trade_date", columns="sig_type", values="nav").tail(10))
+    return 0
@@ -0,0 +1,150 @@
+import time
+import numpy as np
+import pandas as pd
+from husfort.qutility import SFG, SFY
+from husfort.qinstruments import CInstruMgr
+from typedef import EnumSigs, CAccountTianqin, CPositionBook
+from solutions.contracts import CContractIndex, get_contract_index
+from solutions.md import MD_LOCK, get_tq_session
+from solutions.md_store import CMdSnapshotStore, req_depth_md_tianqin_with_store
+from solutions.positions import load_position_book_fuai
+
+
+class CPnlBook:
+    def __init__(
+            self,
+            books: dict[str, CPositionBook],
+            contract_index: CContractIndex,
+    ):
+        """
+        positions of several accounts kept as arrays, pnl of each row is
+        multiplier * qty * direction * (last - base), and is only recomputed for
+        rows whose contract ticked.
+
+        :param books: {account: book}
+        :param contract_index:
+        """
+        self.accounts = list(books)
+        frames = []
+        for i, book in enumerate(books.values()):
+            df = book.to_frame()[["contract", "direction", "qty"]]
+            df["account"] = i
+            frames.append(df)
+        data = pd.concat(frames, axis=0, ignore_index=True)
+        contracts = data["contract"].to_numpy(dtype=object)
+        self.tq_codes, self.row_contract = np.unique(contract_index.lookup(contracts, "tq_code"), return_inverse=True)
+        self.row_account = data["account"].to_numpy(dtype=np.int64)
+        self.row_size = (
+                contract_index.lookup(contracts, "multiplier").astype(np.float64)
+                * data["qty"].to_numpy(dtype=np.float64)
+                * data["direction"].to_numpy(dtype=np.float64)
+        )
+        self.row_base = np.full(len(data), np.nan)
+        self.row_pnl = np.zeros(len(data))
+        self.last = np.full(len(self.tq_codes), np.nan)
+        self.pnl = np.zeros(len(self.accounts))
+        self.__rows_of = [np.flatnonzero(self.row_contract == c) for c in range(len(self.tq_codes))]
+
+    def set_base(self, base: np.ndarray):
+        """
+
+        :param base: base price of each contract in self.tq_codes, like pre_close,
+                     pnl of contracts without a finite base is kept at 0
+        """
+        self.row_base = np.asarray(base, dtype=np.float64)[self.row_contract]
+        self.last = np.asarray(base, dtype=np.float64).copy()
+        self.row_pnl[:] = 0
+        self.pnl[:] = 0
+        if len(no_base := self.tq_codes[~np.isfinite(base)]):
+            print(f"[WRN] Base prices of {SFY(len(no_base))} contracts are not available, "
+                  f"their pnl is not counted: {SFY(', '.join(no_base))}")
+        return 0
+
+    def update(self, contract_ids: np.ndarray, prices: np.ndarray):
+        """
+        mark contract_ids at prices, invalid prices are ignored
+
+        """
+        valid = np.isfinite(prices)
+        contract_ids, prices = contract_ids[valid], prices[valid]
+        if len(contract_ids) == 0:
+            return 0
+        self.last[contract_ids] = prices
+        rows = np.concatenate([self.__rows_of[c] for c in contract_ids])
+        row_base = self.row_base[rows]
+        new_pnl = np.where(
+            np.isfinite(row_base), self.row_size[rows] * (self.last[self.row_contract[rows]] - row_base), 0.0,
+        )
+        self.pnl += np.bincount(self.row_account[rows], weights=new_pnl - self.row_pnl[rows], minlength=len(self.pnl))
+        self.row_pnl[rows] = new_pnl
+        return 0
+
+    def get_contract_pnl(self) -> pd.Series:
+        return pd.Series(np.bincount(self.row_contract, weights=self.row_pnl), index=self.tq_codes)
+
+
+def publish_pnl(pnl_book: CPnlBook, n_ticked: int, top: int = 5):
+    ts = time.strftime("%H:%M:%S")
+    accounts = ", ".join(f"{a} = {SFG(f'{v:,.0f}')}" for a, v in zip(pnl_book.accounts, pnl_book.pnl))
+    contract_pnl = pnl_book.get_contract_pnl()
+    worst = contract_pnl.nsmallest(top)
+    print(
+        f"[INF] {ts} PnL: {accounts}, total = {SFG(f'{pnl_book.pnl.sum():,.0f}')}, "
+        f"ticked = {n_ticked}/{len(pnl_book.tq_codes)}, "
+        f"worst: {SFY(', '.join(f'{k}={v:,.0f}' for k, v in worst.items()))}"
+    )
+    return 0
+
+
+def stream_pnl(
+        exe_date: str,
+        account: CAccountTianqin,
+        positions_file_name_fuai_tmpl: str,
+        positions_dir: str,
+        instru_mgr: CInstruMgr,
+        refresh: float = 2.0,
+        duration: float = None,
+        md_store: CMdSnapshotStore = None,
+        contract_index: CContractIndex = None,
+):
+    """
+    live PnL of both strategy accounts from Fuai positions of exe_date against pre_close.
+    Quotes are streamed from Tianqin, marks are only updated for contracts whose last price
+    changed since the previous publication, and PnL is published at most once every refresh seconds.
+
+    :param refresh: seconds between two publications
+    :param duration: seconds to stream, None means until Ctrl+C
+    """
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    books = {
+        sig_type.value: load_position_book_fuai(exe_date, sig_type, positions_file_name_fuai_tmpl, positions_dir)
+        for sig_type in EnumSigs
+    }
+    pnl_book = CPnlBook(books, contract_index)
+    if len(pnl_book.tq_codes) == 0:
+        print(f"[INF] There are no positions available for {SFY(exe_date)}")
+        return 0
+
+    tq_codes = pnl_book.tq_codes.tolist()
+    depth_md = req_depth_md_tianqin_with_store(tq_codes, account.userId, account.password, store=md_store)
+    pnl_book.set_base(np.array([md.pre_close if (md := depth_md.get(c)) else np.nan for c in tq_codes]))
+
+    stp_ts = None if duration is None else time.time() + duration
+    with MD_LOCK:
+        session = get_tq_session(account.userId, account.password)
+        session.subscribe(tq_codes)
+        quotes = [session.quotes[c] for c in tq_codes]
+        next_ts = time.time()
+        try:
+            while stp_ts is None or time.time() < stp_ts:
+                # quotes are only merged by wait_update between two publications, nothing is computed per tick
+                session.api.wait_update(deadline=next_ts if stp_ts is None else min(next_ts, stp_ts))
+                if time.time() >= next_ts:
+                    last = np.fromiter((q.last_price for q in quotes), dtype=np.float64, count=len(quotes))
+                    ids = np.flatnonzero(np.isfinite(last) & (last != pnl_book.last))
+                    pnl_book.update(ids, last[ids])
+                    publish_pnl(pnl_book, n_ticked=len(ids))
+                    next_ts = time.time() + refresh
+        except KeyboardInterrupt:
+            print(f"[INF] Streaming PnL of {SFG(exe_date)} is stopped")
+    return 0
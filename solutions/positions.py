@@ -2,8 +2,43 @@ import os
 import numpy as np
 import pandas as pd
 from husfort.qutility import SFY, SFG, check_and_makedirs
-from husfort.qinstruments import CInstruMgr, parse_instrument_from_contract
-from typedef import CKey, CPos, EnumSigs, EnumPOSD
+from husfort.qinstruments import CInstruMgr
+from typedef import CKey, CPos, CPositionBook, EnumSigs, EnumPOSD
+from solutions.fuai import read_fuai_export
+from solutions.contracts import CContractIndex, get_contract_index
+from solutions.signal_store import CSignalStore
+from solutions.trace import TRACER
+
+
+def size_positions(
+        pos_data: pd.DataFrame,
+        instru_mgr: CInstruMgr,
+        contract_index: CContractIndex = None,
+) -> pd.DataFrame:
+    """
+
+    :param pos_data: a DataFrame with columns ["contract", "weight", "close", "total_equity"],
+                     rows may come from any number of dates and signal types
+    :param instru_mgr:
+    :param contract_index: contract level lookups are done in bulk through it
+    :return: pos_data with sizing columns appended, all computed column-wise.
+             ValueError is raised if any weight, close or total_equity is not finite.
+    """
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    contracts = pos_data["contract"].to_numpy()
+    pos_data["allocated_equity"] = pos_data["total_equity"] * pos_data["weight"]
+    pos_data["instrument"] = contract_index.lookup(contracts, "instrument")
+    pos_data["multiplier"] = contract_index.lookup(contracts, "multiplier")
+    qty_raw = pos_data["allocated_equity"].to_numpy(dtype=np.float64) / (
+            pos_data["multiplier"].to_numpy(dtype=np.float64) * pos_data["close"].to_numpy(dtype=np.float64)
+    )
+    if not (valid := np.isfinite(qty_raw)).all():
+        invalid = pos_data.loc[~valid, "contract"].tolist()
+        raise ValueError(f"Sizes of {len(invalid)} contracts are not finite, check weight, close and equity: {invalid}")
+    pos_data["qty_raw"] = qty_raw
+    pos_data["quantity"] = np.abs(np.round(qty_raw, 0)).astype(int)
+    pos_data["direction"] = np.sign(qty_raw).astype(int)
+    return pos_data
 
 
 def convert_signal_to_positions(
@@ -15,67 +50,149 @@ def convert_signal_to_positions(
         positions_dir: str,
         allocated_equity: float,
         instru_mgr: CInstruMgr,
+        contract_index: CContractIndex = None,
 ):
     sig_file = signals_file_name_tmpl.format(sig_date, sig_type.value)
     sig_path = os.path.join(signals_dir, sig_date[0:4], sig_date[4:6], sig_file)
     if not os.path.exists(sig_path):
         raise FileNotFoundError(sig_path)
 
-    sig_data = pd.read_csv(sig_path)
-    pos_data = sig_data[["contract", "weight", "close"]].copy()
-    pos_data["total_equity"] = allocated_equity
-    pos_data["allocated_equity"] = allocated_equity * pos_data["weight"]
-    pos_data["instrument"] = pos_data["contract"].map(parse_instrument_from_contract)
-    pos_data["multiplier"] = pos_data["instrument"].map(lambda z: instru_mgr.get_multiplier(z))
-    pos_data["qty_raw"] = pos_data.apply(
-        lambda z: z["allocated_equity"] / z["multiplier"] / z["close"],
-        axis=1,
-    )
-    pos_data["quantity"] = pos_data["qty_raw"].round(0).abs().astype(int)
-    pos_data["direction"] = pos_data["qty_raw"].map(lambda z: int(np.sign(z)))
+    # mtime of the signal file is the start of signal to order latency in the trace summary
+    with TRACER.stage("positions.convert", sig_type=sig_type.value, signal_mtime=os.path.getmtime(sig_path)) as span:
+        sig_data = pd.read_csv(sig_path)
+        pos_data = sig_data[["contract", "weight", "close"]].copy()
+        pos_data["total_equity"] = allocated_equity
+        pos_data = size_positions(pos_data, instru_mgr, contract_index)
 
-    pos_file = positions_file_name_tmpl.format(sig_date, sig_type.value)
-    check_and_makedirs(pos_d := os.path.join(positions_dir, sig_date[0:4], sig_date[4:6]))
-    pos_path = os.path.join(pos_d, pos_file)
-    pos_data.to_csv(pos_path, index=False, float_format="%.8f")
+        pos_file = positions_file_name_tmpl.format(sig_date, sig_type.value)
+        check_and_makedirs(pos_d := os.path.join(positions_dir, sig_date[0:4], sig_date[4:6]))
+        pos_path = os.path.join(pos_d, pos_file)
+        pos_data.to_csv(pos_path, index=False, float_format="%.8f")
+        span.rows, span.bytes = len(pos_data), os.path.getsize(pos_path)
     print(f"[INF] Positions of {sig_date}-{sig_type.value} saved to {SFG(pos_path)}")
     return 0
 
 
-def load_position_tqdb(
+def load_signals_range(
+        sig_dates: list[str],
+        sig_types: list[EnumSigs],
+        signals_file_name_tmpl: str,
+        signals_dir: str,
+        signal_store: CSignalStore = None,
+) -> pd.DataFrame:
+    """
+
+    :param signal_store: if provided, new or changed signal files are ingested to it first,
+                         then all signals are read from it in one pass
+    :return: a long DataFrame with columns ["sig_date", "sig_type", "contract", "weight", "close"]
+             for all (sig_date, sig_type) whose signal file exists.
+    """
+    if signal_store is not None:
+        signal_store.ingest(sig_dates, sig_types, signals_file_name_tmpl, signals_dir)
+        df = signal_store.read(min(sig_dates), max(sig_dates), sig_types)
+        return df[df["sig_date"].isin(sig_dates)].reset_index(drop=True)
+
+    dfs: list[pd.DataFrame] = []
+    for sig_date in sig_dates:
+        for sig_type in sig_types:
+            sig_file = signals_file_name_tmpl.format(sig_date, sig_type.value)
+            sig_path = os.path.join(signals_dir, sig_date[0:4], sig_date[4:6], sig_file)
+            if not os.path.exists(sig_path):
+                print(f"[INF] {SFY(sig_path)} is not available")
+                continue
+            df = pd.read_csv(sig_path, usecols=["contract", "weight", "close"])
+            df.insert(0, "sig_type", sig_type.value)
+            df.insert(0, "sig_date", sig_date)
+            dfs.append(df)
+    if dfs:
+        return pd.concat(dfs, axis=0, ignore_index=True)
+    return pd.DataFrame(columns=["sig_date", "sig_type", "contract", "weight", "close"])
+
+
+def convert_signals_to_positions_range(
+        sig_dates: list[str],
+        sig_types: list[EnumSigs],
+        signals_file_name_tmpl: str,
+        positions_file_name_tmpl: str,
+        signals_dir: str,
+        positions_dir: str,
+        allocated_equity: dict[str, float],
+        instru_mgr: CInstruMgr,
+        contract_index: CContractIndex = None,
+        signal_store: CSignalStore = None,
+):
+    """
+
+    :param sig_dates: signal dates to convert, in any order
+    :param sig_types:
+    :param signals_file_name_tmpl:
+    :param positions_file_name_tmpl:
+    :param signals_dir:
+    :param positions_dir:
+    :param allocated_equity: allocated equity for each signal type of each date, i.e. {sig_date: equity}
+    :param instru_mgr:
+    :param contract_index:
+    :param signal_store: see load_signals_range
+    :return:
+    """
+    if len(sig_dates) == 0:
+        print(f"[INF] There are no signal dates to convert")
+        return 0
+
+    sig_data = load_signals_range(sig_dates, sig_types, signals_file_name_tmpl, signals_dir, signal_store)
+    if sig_data.empty:
+        print(f"[INF] There are no signals available for {SFY(sig_dates[0])} -> {SFY(sig_dates[-1])}")
+        return 0
+
+    sig_data["total_equity"] = sig_data["sig_date"].map(allocated_equity)
+    pos_data = size_positions(sig_data, instru_mgr, contract_index)
+    for (sig_date, sig_type), date_pos_data in pos_data.groupby(by=["sig_date", "sig_type"], sort=True):
+        pos_file = positions_file_name_tmpl.format(sig_date, sig_type)
+        check_and_makedirs(pos_d := os.path.join(positions_dir, sig_date[0:4], sig_date[4:6]))
+        pos_path = os.path.join(pos_d, pos_file)
+        date_pos_data.drop(columns=["sig_date", "sig_type"]).to_csv(pos_path, index=False, float_format="%.8f")
+    n_files = pos_data[["sig_date", "sig_type"]].drop_duplicates().shape[0]
+    print(f"[INF] {SFG(n_files)} position files of {sig_dates[0]} -> {sig_dates[-1]} saved to {SFG(positions_dir)}")
+    return 0
+
+
+def load_position_book_tqdb(
         sig_date: str,
         sig_type: EnumSigs,
         positions_file_name_tmpl: str,
         positions_dir: str,
-) -> dict[CKey, CPos]:
+) -> CPositionBook:
     pos_file = positions_file_name_tmpl.format(sig_date, sig_type.value)
     pos_path = os.path.join(positions_dir, sig_date[0:4], sig_date[4:6], pos_file)
     if not os.path.exists(pos_path):
         print(f"[INF] {SFY(pos_path)} is not available")
-        return {}
+        return CPositionBook.empty()
 
-    pos_df = pd.read_csv(pos_path)
-    res: dict[CKey, CPos] = {}
-    for contract, direction, qty, close in zip(
-            pos_df["contract"], pos_df["direction"], pos_df["quantity"], pos_df["close"]):
-        if direction != 0:
-            key = CKey(contract=contract, direction=EnumPOSD(direction))
-            pos = CPos(key=key, qty=qty, base_price=close)
-            res[key] = pos
-    return res
+    pos_df = pd.read_csv(pos_path, usecols=["contract", "direction", "quantity", "close"])
+    pos_df = pos_df[pos_df["direction"] != 0]
+    return CPositionBook(
+        contract=pos_df["contract"].to_numpy(),
+        direction=pos_df["direction"].to_numpy(),
+        qty=pos_df["quantity"].to_numpy(),
+        base_price=pos_df["close"].to_numpy(),
+    )
 
 
-def load_position_fuai(
+def get_position_path_fuai(sig_date: str, positions_file_name_fuai_tmpl: str, positions_dir: str) -> str:
+    pos_file = positions_file_name_fuai_tmpl.format(sig_date)
+    return os.path.join(positions_dir, sig_date[0:4], sig_date[4:6], pos_file)
+
+
+def load_position_book_fuai(
         sig_date: str,
         sig_type: EnumSigs,
         positions_file_name_fuai_tmpl: str,
         positions_dir: str,
-) -> dict[CKey, CPos]:
-    pos_file = positions_file_name_fuai_tmpl.format(sig_date)
-    pos_path = os.path.join(positions_dir, sig_date[0:4], sig_date[4:6], pos_file)
+) -> CPositionBook:
+    pos_path = get_position_path_fuai(sig_date, positions_file_name_fuai_tmpl, positions_dir)
     if not os.path.exists(pos_path):
         print(f"[INF] {SFY(pos_path)} is not available")
-        return {}
+        return CPositionBook.empty()
 
     if sig_type == EnumSigs.opn:
         account = "胡晓欧截面CTA开盘"
@@ -84,16 +201,36 @@ def load_position_fuai(
     else:
         raise ValueError(f"Invalid sig_type ={sig_type}")
 
-    pos_df = pd.read_excel(pos_path).set_index("合约").query(f"策略账户 == '{account}'")
-    res: dict[CKey, CPos] = {}
-    for contract, r in pos_df.iterrows():
-        contract: str
-        if (qty := r["买总持仓"]) > 0:
-            key = CKey(contract=contract, direction=EnumPOSD.LNG)
-            pos = CPos(key=key, qty=qty)
-            res[key] = pos
-        if (qty := r["卖总持仓"]) > 0:
-            key = CKey(contract=contract, direction=EnumPOSD.SRT)
-            pos = CPos(key=key, qty=qty)
-            res[key] = pos
-    return res
+    fuai_df = read_fuai_export(pos_path)
+    pos_df = fuai_df[fuai_df["策略账户"] == account]
+    contracts = pos_df["合约"].to_numpy(dtype=object)
+    qty_lng = pos_df["买总持仓"].to_numpy()
+    qty_srt = pos_df["卖总持仓"].to_numpy()
+    has_lng, has_srt = qty_lng > 0, qty_srt > 0
+    return CPositionBook(
+        contract=np.concatenate([contracts[has_lng], contracts[has_srt]]),
+        direction=np.concatenate([
+            np.full(has_lng.sum(), EnumPOSD.LNG.value),
+            np.full(has_srt.sum(), EnumPOSD.SRT.value),
+        ]),
+        qty=np.concatenate([qty_lng[has_lng], qty_srt[has_srt]]),
+        base_price=np.full(has_lng.sum() + has_srt.sum(), np.nan),
+    )
+
+
+def load_position_tqdb(
+        sig_date: str,
+        sig_type: EnumSigs,
+        positions_file_name_tmpl: str,
+        positions_dir: str,
+) -> dict[CKey, CPos]:
+    return load_position_book_tqdb(sig_date, sig_type, positions_file_name_tmpl, positions_dir).to_dict()
+
+
+def load_position_fuai(
+        sig_date: str,
+        sig_type: EnumSigs,
+        positions_file_name_fuai_tmpl: str,
+        positions_dir: str,
+) -> dict[CKey, CPos]:
+    return load_position_book_fuai(sig_date, sig_type, positions_file_name_fuai_tmpl, positions_dir).to_dict()
@@ -0,0 +1,46 @@
+import numpy as np
+from typedef import floor_to_tick
+
+
+def cal_order_prices(
+        last: np.ndarray,
+        upper_lim: np.ndarray,
+        lower_lim: np.ndarray,
+        mini_spread: np.ndarray,
+        is_buy: np.ndarray,
+        drift: float,
+) -> np.ndarray:
+    """
+    buy orders are priced at last * (1 + drift) floored to tick and capped by upper_lim,
+    sell orders at last * (1 - drift) floored to tick and floored by lower_lim,
+    like COrder.update_order_price. Use +/-np.inf as limits to skip clamping.
+    Non-finite last or limits give NaN prices, never a price at the limit.
+
+    """
+    is_buy = np.asarray(is_buy, dtype=bool)
+    raw = np.asarray(last, dtype=np.float64) * np.where(is_buy, 1 + drift, 1 - drift)
+    ticked = floor_to_tick(raw, np.asarray(mini_spread, dtype=np.float64))
+    return np.where(
+        is_buy,
+        np.minimum(ticked, np.asarray(upper_lim, dtype=np.float64)),
+        np.maximum(ticked, np.asarray(lower_lim, dtype=np.float64)),
+    )
+
+
+def cal_price_bounds_from_settle(
+        settle: np.ndarray,
+        changelt: np.ndarray,
+        mini_spread: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    limits are settle * (1 +/- changelt%) floored to tick and rounded to integer,
+    then moved one tick inside, like update_price_wind
+
+    :return: upper_lim, lower_lim
+    """
+    settle = np.asarray(settle, dtype=np.float64)
+    changelt = np.asarray(changelt, dtype=np.float64)
+    mini_spread = np.asarray(mini_spread, dtype=np.float64)
+    upper_lim = np.round(floor_to_tick(settle * (1 + changelt / 100), mini_spread)) - mini_spread
+    lower_lim = np.round(floor_to_tick(settle * (1 - changelt / 100), mini_spread)) + mini_spread
+    return upper_lim, lower_lim
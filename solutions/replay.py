@@ -0,0 +1,187 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from husfort.qutility import SFG, SFY
+from husfort.qinstruments import CInstruMgr
+from solutions.calendar_index import CCalendarIndex
+from solutions.contracts import CContractIndex
+from typedef import CCfg, EnumSigs, EnumStrategyName
+
+__worker_ctx: dict[str, object] = {}
+
+
+def __init_replay_worker(instru_info_path: str, snapshots_dir: str):
+    from solutions.snapshots import load_instru_mgr
+
+    instru_mgr = load_instru_mgr(instru_info_path, snapshots_dir)
+    __worker_ctx["instru_mgr"] = instru_mgr
+    __worker_ctx["contract_index"] = CContractIndex(instru_mgr)
+
+
+def __replay_trades(sig_date: str, prev_sig_date: str, cfg: CCfg, replay_dirs: dict[str, str]) -> list[str]:
+    """
+
+    :return: contracts traded on sig_date
+    """
+    from solutions.trades import gen_trades_data, save_trades_data
+
+    contracts: set[str] = set()
+    for sig_type in EnumSigs:
+        trades_data = gen_trades_data(
+            this_sig_date=sig_date,
+            prev_sig_date=prev_sig_date,
+            sig_type=sig_type,
+            positions_file_name_tqdb_tmpl=cfg.positions_file_name_tqdb_tmpl,
+            positions_file_name_fuai_tmpl=cfg.positions_file_name_fuai_tmpl,
+            positions_dir=replay_dirs["positions"],
+            use_tq=True,
+        )
+        save_trades_data(trades_data, sig_date, sig_type, cfg.trades_file_name_tmpl, replay_dirs["trades"])
+        contracts.update(trades_data.contract[trades_data.qty > 0].tolist())
+    return sorted(contracts)
+
+
+def __replay_orders(
+        sig_date: str,
+        exe_date: str,
+        cfg: CCfg,
+        replay_dirs: dict[str, str],
+        settles: dict[tuple[str, str], dict[str, float]],
+) -> int:
+    """
+
+    :param settles: Wind data of contracts traded on sig_date fetched by the parent process,
+                    including NaN ones, so workers never request Wind
+    """
+    from solutions.trades import load_trades, split_trades
+    from solutions.orders import main_order, flush_orders_archive
+    from solutions.md import CWindMdCache
+
+    # loaded on first use, after settles are cached by the parent process
+    if "wind_cache" not in __worker_ctx:
+        __worker_ctx["wind_cache"] = CWindMdCache(cfg.wind_md_cache_path, readonly=True)
+    __worker_ctx["wind_cache"].preload(settles)
+    instru_mgr: CInstruMgr = __worker_ctx["instru_mgr"]
+    contract_index: CContractIndex = __worker_ctx["contract_index"]
+    for sig_type in EnumSigs:
+        trades = load_trades(
+            sig_date=sig_date, sig_type=sig_type,
+            trades_file_name_tmpl=cfg.trades_file_name_tmpl, trades_dir=replay_dirs["trades"],
+        )
+        if sig_type == EnumSigs.opn:
+            opn_pm_trades, opn_am_trades = split_trades(trades, instru_mgr, contract_index=contract_index)
+            groups = [(opn_pm_trades, "pm"), (opn_am_trades, "am")]
+        else:
+            groups = [(trades, "pm")]
+        for tds, am_or_pm in groups:
+            main_order(
+                trades=tds, sig_date=sig_date, exe_date=exe_date,
+                sig_type=sig_type, strategy=EnumStrategyName[sig_type.value], am_or_pm=am_or_pm,
+                drift=cfg.drift, instru_mgr=instru_mgr,
+                using_rt=False, account_tianqin=cfg.account_tianqin,
+                orders_file_name_tmpl=cfg.orders_file_name_tmpl, orders_dir=replay_dirs["orders"],
+                wind_cache=__worker_ctx["wind_cache"], contract_index=contract_index,
+            )
+    flush_orders_archive()
+    return 0
+
+
+def get_replay_dirs(replay_dir: str) -> dict[str, str]:
+    return {k: os.path.join(replay_dir, k) for k in ["positions", "trades", "orders"]}
+
+
+def replay(
+        bgn_date: str,
+        end_date: str,
+        signals_dir: str,
+        replay_dir: str,
+        calendar: CCalendarIndex,
+        instru_mgr: CInstruMgr,
+        cfg: CCfg,
+        max_workers: int = None,
+):
+    """
+    signals -> positions -> trades -> orders for every trade date in [bgn_date, end_date],
+    artifacts are saved to replay_dir/{positions, trades, orders} with the same layout as the
+    daily ones, and signals are ingested to replay_dir/signal_store. Orders are priced with settle from Wind.
+
+    positions of all dates are sized in one pass, since they only depend on signals and
+    allocated equity. Trades of each date depend on positions of this date and the previous
+    one, and orders on trades of this date, so trades and orders are computed for all dates
+    in parallel by a process pool. Wind settles are requested by the parent process in one
+    batch before pricing, and passed to the workers, so that workers never request Wind.
+
+    :param bgn_date: first signal date
+    :param end_date: last signal date, included
+    :param signals_dir: signals to replay, like cfg.signals_dir
+    :param replay_dir:
+    :param calendar:
+    :param instru_mgr:
+    :param cfg:
+    :param max_workers: number of worker processes, default is os.cpu_count()
+    :return:
+    """
+    from solutions.allocated_equity import CReaderAllocatedEquity
+    from solutions.positions import convert_signals_to_positions_range
+    from solutions.contracts import load_contract_index
+    from solutions.signal_store import CSignalStore
+    from solutions.md import CWindMdCache, req_md_wind_batch
+
+    sig_dates = calendar.get_range(bgn_date, calendar.get_next_date(end_date, shift=1))
+    if len(sig_dates) == 0:
+        print(f"[INF] There are no trade dates in {SFY(bgn_date)} -> {SFY(end_date)}")
+        return 0
+    prev_sig_dates = calendar.shift_batch(sig_dates, -1)
+    exe_dates = calendar.shift_batch(sig_dates, 1)
+    replay_dirs = get_replay_dirs(replay_dir)
+    contract_index = load_contract_index(bgn_date, cfg.contracts_dir, instru_mgr, cfg.instru_info_path)
+
+    # --- positions of previous date of bgn_date are needed by trades of bgn_date. Dates before the
+    # --- first date of allocated equity have no positions, so trades of the first date open from flat
+    reader_alloc = CReaderAllocatedEquity(cfg.allocated_equity_path)
+    if sig_dates[-1] > (last_alloc_date := reader_alloc.trade_dates[-1]):
+        raise ValueError(
+            f"Allocated equity is available until {last_alloc_date}, "
+            f"run 'allocated' first to replay until {sig_dates[-1]}"
+        )
+    first_alloc_date = reader_alloc.trade_dates[0]
+    pos_dates = [d for d in [prev_sig_dates[0]] + sig_dates.tolist() if d >= first_alloc_date]
+    convert_signals_to_positions_range(
+        sig_dates=pos_dates,
+        sig_types=list(EnumSigs),
+        signals_file_name_tmpl=cfg.signals_file_name_tmpl,
+        positions_file_name_tmpl=cfg.positions_file_name_tqdb_tmpl,
+        signals_dir=signals_dir,
+        positions_dir=replay_dirs["positions"],
+        allocated_equity=dict(zip(pos_dates, reader_alloc.get_allocated_equity_batch(pos_dates) * 0.5)),
+        instru_mgr=instru_mgr,
+        contract_index=contract_index,
+        signal_store=CSignalStore(os.path.join(replay_dir, "signal_store")),
+    )
+
+    initargs = (cfg.instru_info_path, cfg.snapshots_dir)
+    n = len(sig_dates)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=__init_replay_worker, initargs=initargs) as pool:
+        traded = list(pool.map(
+            __replay_trades, sig_dates.tolist(), prev_sig_dates.tolist(), [cfg] * n, [replay_dirs] * n,
+        ))
+
+        # --- settles of all traded contracts are requested once, pairs without data from Wind are
+        # --- passed as NaN, since CWindMdCache does not keep them and workers would request them again
+        fields = ["settle", "changelt"]
+        wd_pairs_by_date = [
+            [(wind_code, sig_date) for wind_code in contract_index.lookup(contracts, "wind_code").tolist()]
+            for sig_date, contracts in zip(sig_dates.tolist(), traded)
+        ]
+        md = req_md_wind_batch(
+            wd_pairs=[z for pairs in wd_pairs_by_date for z in pairs], fields=fields,
+            cache=CWindMdCache(cfg.wind_md_cache_path),
+        )
+        settles = [{z: md.get(z, dict.fromkeys(fields, np.nan)) for z in pairs} for pairs in wd_pairs_by_date]
+        contract_index.save()
+
+        list(pool.map(
+            __replay_orders, sig_dates.tolist(), exe_dates.tolist(), [cfg] * n, [replay_dirs] * n, settles,
+        ))
+    print(f"[INF] Replay of {SFG(n)} dates {SFG(sig_dates[0])} -> {SFG(sig_dates[-1])} is saved to {SFG(replay_dir)}")
+    return 0
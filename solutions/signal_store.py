@@ -0,0 +1,128 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from husfort.qutility import check_and_makedirs, SFG, SFY
+from typedef import EnumSigs
+from solutions.fuai import get_file_stamp
+
+SIGNAL_COLUMNS = ["sig_date", "sig_type", "contract", "weight", "close"]
+
+
+class CSignalStore:
+    def __init__(self, store_dir: str):
+        """
+        signals of all dates and types in Arrow files partitioned by month,
+        store_dir/YYYY/signals_{YYYYMM}.feather, uncompressed so that they can be memory-mapped.
+        sig_date is saved as int32 YYYYMMDD, rows are sorted by (sig_date, sig_type, contract).
+        Stamps of ingested csv files are kept in store_dir/manifest.json.
+
+        :param store_dir:
+        """
+        self.store_dir = store_dir
+        self.__lock = threading.Lock()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                self.manifest: dict[str, dict] = json.load(f)
+        else:
+            self.manifest = {}
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.store_dir, "manifest.json")
+
+    def get_partition_path(self, month: int) -> str:
+        return os.path.join(self.store_dir, f"{month // 100:04d}", f"signals_{month}.feather")
+
+    def save_manifest(self):
+        check_and_makedirs(self.store_dir)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        return 0
+
+    def __write_partition(self, month: int, new_data: pd.DataFrame):
+        partition_path = self.get_partition_path(month)
+        if os.path.exists(partition_path):
+            old_data = feather.read_table(partition_path).to_pandas()
+            keys = set(zip(new_data["sig_date"], new_data["sig_type"]))
+            keep = [k not in keys for k in zip(old_data["sig_date"], old_data["sig_type"])]
+            new_data = pd.concat([old_data[keep], new_data], axis=0, ignore_index=True)
+        new_data = new_data.sort_values(by=["sig_date", "sig_type", "contract"], ignore_index=True)
+        check_and_makedirs(os.path.dirname(partition_path))
+        tmp_path = f"{partition_path}.tmp"
+        feather.write_feather(new_data, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, partition_path)
+        return 0
+
+    def ingest(
+            self,
+            sig_dates: list[str],
+            sig_types: list[EnumSigs],
+            signals_file_name_tmpl: str,
+            signals_dir: str,
+    ) -> int:
+        """
+        append signal csv files to the store, files with unchanged mtime and size are skipped,
+        changed ones replace their old rows.
+
+        :return: number of files ingested
+        """
+        ingested: dict[int, list[pd.DataFrame]] = {}
+        stamps: dict[str, dict] = {}
+        for sig_date in sig_dates:
+            for sig_type in sig_types:
+                sig_file = signals_file_name_tmpl.format(sig_date, sig_type.value)
+                sig_path = os.path.join(signals_dir, sig_date[0:4], sig_date[4:6], sig_file)
+                if not os.path.exists(sig_path):
+                    continue
+                stamp = get_file_stamp(sig_path)
+                if self.manifest.get(sig_file) == stamp:
+                    continue
+                df = pd.read_csv(sig_path, usecols=["contract", "weight", "close"])
+                df.insert(0, "sig_type", sig_type.value)
+                df.insert(0, "sig_date", np.int32(sig_date))
+                ingested.setdefault(int(sig_date) // 100, []).append(df)
+                stamps[sig_file] = stamp
+        if not stamps:
+            return 0
+
+        with self.__lock:
+            for month, dfs in ingested.items():
+                self.__write_partition(month, pd.concat(dfs, axis=0, ignore_index=True))
+            self.manifest.update(stamps)
+            self.save_manifest()
+        print(f"[INF] {SFG(len(stamps))} signal files are ingested to {SFG(self.store_dir)}")
+        return len(stamps)
+
+    def read(self, bgn_date: str, end_date: str, sig_types: list[EnumSigs] = None) -> pd.DataFrame:
+        """
+
+        :param bgn_date: first date
+        :param end_date: last date, included
+        :param sig_types: all types if None
+        :return: a long DataFrame with columns SIGNAL_COLUMNS, sig_date is str like load_signals_range
+        """
+        bgn, end = int(bgn_date), int(end_date)
+        months = pd.period_range(pd.Timestamp(bgn_date), pd.Timestamp(end_date), freq="M").strftime("%Y%m")
+        tables: list[pa.Table] = []
+        for month in months.astype(int):
+            partition_path = self.get_partition_path(month)
+            if not os.path.exists(partition_path):
+                continue
+            table = feather.read_table(partition_path, memory_map=True)
+            mask = pc.and_(pc.greater_equal(table["sig_date"], bgn), pc.less_equal(table["sig_date"], end))
+            if sig_types is not None:
+                mask = pc.and_(mask, pc.is_in(table["sig_type"], pa.array([t.value for t in sig_types])))
+            tables.append(table.filter(mask))
+        if not tables:
+            print(f"[INF] There are no signals in {SFY(self.store_dir)} for {SFY(bgn_date)} -> {SFY(end_date)}")
+            return pd.DataFrame(columns=SIGNAL_COLUMNS)
+        df = pa.concat_tables(tables).to_pandas()
+        df["sig_date"] = df["sig_date"].astype(str)
+        return df[SIGNAL_COLUMNS]
@@ -0,0 +1,128 @@
+import os
+import json
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+from typing import Callable, TypeVar
+from husfort.qutility import check_and_makedirs, SFG, SFY
+from solutions.fuai import get_file_stamp
+
+T = TypeVar("T")
+
+
+def get_snapshot_path(src_path: str, snapshots_dir: str, ext: str) -> str:
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    return os.path.join(snapshots_dir, f"{stem}{ext}")
+
+
+def __is_fresh(snapshot_path: str, stamp: dict) -> bool:
+    meta_path = f"{snapshot_path}.json"
+    if not os.path.exists(snapshot_path) or not os.path.exists(meta_path):
+        return False
+    with open(meta_path, "r") as f:
+        return json.load(f) == stamp
+
+
+def __save_meta(snapshot_path: str, stamp: dict):
+    with open(f"{snapshot_path}.json", "w") as f:
+        json.dump(stamp, f)
+    return 0
+
+
+def load_table_snapshot(src_path: str, snapshots_dir: str, builder: Callable[[str], T]) -> T:
+    """
+    load an object built from src_path by builder, the object is pickled to snapshots_dir
+    and reused as long as the mtime and size of src_path are unchanged.
+
+    :param src_path: source csv
+    :param snapshots_dir: a local directory
+    :param builder: like CCalendar, or lambda z: CInstruMgr(instru_info_path=z)
+    :return:
+    """
+    stamp = get_file_stamp(src_path)
+    snapshot_path = get_snapshot_path(src_path, snapshots_dir, ".pkl")
+    if __is_fresh(snapshot_path, stamp):
+        with open(snapshot_path, "rb") as f:
+            return pickle.load(f)
+
+    obj = builder(src_path)
+    try:
+        check_and_makedirs(snapshots_dir)
+        tmp_path = f"{snapshot_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+        __save_meta(snapshot_path, stamp)
+        print(f"[INF] Snapshot of {SFG(src_path)} is saved to {SFG(snapshot_path)}")
+    except (OSError, pickle.PicklingError) as e:
+        print(f"[WRN] Failed to save snapshot for {SFY(src_path)}: {e}")
+    return obj
+
+
+def load_trade_dates(calendar_path: str, snapshots_dir: str) -> np.ndarray:
+    """
+
+    :param calendar_path: csv with column 'trade_date'
+    :param snapshots_dir:
+    :return: sorted trade dates as int64 YYYYMMDD, memory-mapped from a .npy snapshot
+    """
+    stamp = get_file_stamp(calendar_path)
+    snapshot_path = get_snapshot_path(calendar_path, snapshots_dir, ".npy")
+    if __is_fresh(snapshot_path, stamp):
+        return np.load(snapshot_path, mmap_mode="r")
+
+    trade_dates = np.sort(pd.read_csv(calendar_path, dtype={"trade_date": str})["trade_date"].astype(np.int64).values)
+    try:
+        check_and_makedirs(snapshots_dir)
+        tmp_path = f"{snapshot_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, trade_dates)
+        os.replace(tmp_path, snapshot_path)
+        __save_meta(snapshot_path, stamp)
+    except OSError as e:
+        print(f"[WRN] Failed to save snapshot for {SFY(calendar_path)}: {e}")
+    return trade_dates
+
+
+def load_instru_mgr(instru_info_path: str, snapshots_dir: str):
+    from husfort.qinstruments import CInstruMgr
+
+    return load_table_snapshot(instru_info_path, snapshots_dir, builder=lambda z: CInstruMgr(instru_info_path=z))
+
+
+def load_lazy_target(obj: T) -> T:
+    """
+    pickled CLazy is loaded as the object it proxies
+
+    """
+    return obj
+
+
+class CLazy:
+    def __init__(self, loader: Callable[[], object]):
+        """
+        proxy of the object returned by loader, loader is called on first attribute access
+
+        """
+        self.__loader = loader
+        self.__obj = None
+        self.__lock = threading.Lock()
+
+    def get(self):
+        if self.__obj is None:
+            with self.__lock:
+                if self.__obj is None:
+                    self.__obj = self.__loader()
+        return self.__obj
+
+    def __getattr__(self, name: str):
+        # private names are never delegated, get() reads _CLazy__obj, which is missing on an instance
+        # created without __init__, and delegating it would recurse through get()
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __reduce__(self):
+        # the lock can not be pickled, copy and pickle the loaded object instead of the proxy
+        return load_lazy_target, (self.get(),)
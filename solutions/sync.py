@@ -1,5 +1,11 @@
 import os
-from husfort.qutility import check_and_makedirs
+import json
+import posixpath
+import stat
+import threading
+import paramiko
+from concurrent.futures import ThreadPoolExecutor
+from husfort.qutility import check_and_makedirs, SFG, SFY
 from husfort.qremote import CHost, scp_from_remote
 from typedef import EnumSigs
 
@@ -24,3 +30,166 @@ def download_signals_from(
         recursive=False,
     )
     return 0
+
+
+class CSftpSync:
+    def __init__(self, host: CHost, manifest_path: str, max_workers: int = 8):
+        """
+        download files over one SSH connection, each worker thread uses its own SFTP channel.
+        Remote size and mtime of downloaded files are kept in a manifest, files with unchanged
+        size and mtime are skipped as long as the local copy exists.
+
+        :param host:
+        :param manifest_path: json file, {remote_path: {"size": int, "mtime": int}}
+        :param max_workers: number of concurrent SFTP channels
+        """
+        self.host = host
+        self.manifest_path = manifest_path
+        self.max_workers = max_workers
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__channels: list[paramiko.SFTPClient] = []
+        self.__client: paramiko.SSHClient | None = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                self.manifest: dict[str, dict[str, int]] = json.load(f)
+        else:
+            self.manifest = {}
+
+    def get_identity_files(self) -> list[str] | None:
+        """
+        identity files of the host in ~/.ssh/config, like scp does, None if not configured
+
+        """
+        config_path = os.path.expanduser("~/.ssh/config")
+        if not os.path.exists(config_path):
+            return None
+        config = paramiko.SSHConfig.from_path(config_path)
+        return config.lookup(self.host.hostname).get("identityfile")
+
+    def __enter__(self):
+        # authenticated like scp of scp_from_remote: hosts must be in known_hosts, keys are taken
+        # from ~/.ssh/config, ssh-agent and default key files
+        self.__client = paramiko.SSHClient()
+        self.__client.load_system_host_keys()
+        self.__client.set_missing_host_key_policy(paramiko.RejectPolicy())
+        self.__client.connect(
+            hostname=self.host.hostname, port=self.host.port, username=self.host.username,
+            key_filename=self.get_identity_files(), allow_agent=True, look_for_keys=True,
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for sftp in self.__channels:
+            sftp.close()
+        self.__channels.clear()
+        self.__client.close()
+        self.save()
+
+    def save(self):
+        check_and_makedirs(os.path.dirname(self.manifest_path))
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        return 0
+
+    def get_sftp(self) -> paramiko.SFTPClient:
+        if (sftp := getattr(self.__local, "sftp", None)) is None:
+            sftp = self.__local.sftp = self.__client.open_sftp()
+            with self.__lock:
+                self.__channels.append(sftp)
+        return sftp
+
+    def list_remote(self, remote_dirs: list[str]) -> dict[str, paramiko.SFTPAttributes]:
+        """
+
+        :return: {remote_path: attributes} of regular files in remote_dirs, missing dirs are ignored
+        """
+        def __list(remote_dir: str) -> dict[str, paramiko.SFTPAttributes]:
+            try:
+                attrs = self.get_sftp().listdir_attr(remote_dir)
+            except FileNotFoundError:
+                return {}
+            return {f"{remote_dir}/{a.filename}": a for a in attrs if stat.S_ISREG(a.st_mode or 0)}
+
+        res: dict[str, paramiko.SFTPAttributes] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for attrs in executor.map(__list, remote_dirs):
+                res.update(attrs)
+        return res
+
+    def is_unchanged(self, remote_path: str, local_path: str, attr: paramiko.SFTPAttributes) -> bool:
+        record = self.manifest.get(remote_path)
+        return (
+                record is not None
+                and record["size"] == attr.st_size and record["mtime"] == attr.st_mtime
+                and os.path.exists(local_path) and os.path.getsize(local_path) == attr.st_size
+        )
+
+    def __download(self, remote_path: str, local_path: str, attr: paramiko.SFTPAttributes):
+        check_and_makedirs(os.path.dirname(local_path))
+        tmp_path = f"{local_path}.tmp"
+        self.get_sftp().get(remote_path, tmp_path)
+        os.replace(tmp_path, local_path)
+        os.utime(local_path, (attr.st_atime, attr.st_mtime))
+        with self.__lock:
+            self.manifest[remote_path] = {"size": attr.st_size, "mtime": attr.st_mtime}
+        return 0
+
+    def sync(self, pairs: list[tuple[str, str]]) -> dict[str, int]:
+        """
+
+        :param pairs: [(remote_path, local_path)]
+        :return: number of files in each state, {"downloaded", "skipped", "missing"}
+        """
+        remote_attrs = self.list_remote(sorted({posixpath.dirname(r) for r, _ in pairs}))
+        tasks, res = [], {"downloaded": 0, "skipped": 0, "missing": 0}
+        for remote_path, local_path in pairs:
+            if (attr := remote_attrs.get(remote_path)) is None:
+                print(f"[WRN] {SFY(remote_path)} is not available on {SFY(self.host.hostname)}")
+                res["missing"] += 1
+            elif self.is_unchanged(remote_path, local_path, attr):
+                res["skipped"] += 1
+            else:
+                tasks.append((remote_path, local_path, attr))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(lambda z: self.__download(*z), tasks))
+        res["downloaded"] = len(tasks)
+        return res
+
+
+def download_signals_range(
+        sig_dates: list[str],
+        sig_types: list[EnumSigs],
+        signals_file_name_tmpl: str,
+        src_signals_dir: str,
+        dst_signals_dir: str,
+        host: CHost,
+        max_workers: int = 8,
+) -> dict[str, int]:
+    """
+    download signals of all dates and types in one SSH session, unchanged files are skipped.
+    The manifest is saved as dst_signals_dir/sync_manifest.json
+
+    """
+    if len(sig_dates) == 0:
+        print(f"[INF] There are no signal dates to sync")
+        return {"downloaded": 0, "skipped": 0, "missing": 0}
+
+    pairs: list[tuple[str, str]] = []
+    for sig_date in sig_dates:
+        for sig_type in sig_types:
+            target_file = signals_file_name_tmpl.format(sig_date, sig_type.value)
+            pairs.append((
+                f"{src_signals_dir}/{sig_date[0:4]}/{sig_date[4:6]}/{target_file}",
+                os.path.join(dst_signals_dir, sig_date[0:4], sig_date[4:6], target_file),
+            ))
+    manifest_path = os.path.join(dst_signals_dir, "sync_manifest.json")
+    with CSftpSync(host=host, manifest_path=manifest_path, max_workers=max_workers) as sftp_sync:
+        res = sftp_sync.sync(pairs)
+    print(
+        f"[INF] Signals of {SFG(sig_dates[0])} -> {SFG(sig_dates[-1])} are synced to {SFG(dst_signals_dir)}, "
+        f"downloaded = {SFG(res['downloaded'])}, skipped = {SFG(res['skipped'])}, missing = {SFY(res['missing'])}"
+    )
+    return res
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Callable
+import httpx
+from husfort.qutility import check_and_makedirs, SFG
+
+
+@dataclass(slots=True)
+class CSpan:
+    name: str
+    start: float  # unix timestamp
+    wall: float = 0.0  # seconds
+    rows: int = None
+    bytes: int = None
+    status: str = "ok"
+    parent: str = None
+    thread: str = None
+    attrs: dict = field(default_factory=dict)
+
+
+class CTracer:
+    def __init__(self):
+        """
+        process wide recorder of stages, spans of nested stages keep the name of their parent
+
+        """
+        self.meta: dict[str, object] = {}
+        self.spans: list[CSpan] = []
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def __get_stack(self) -> list[CSpan]:
+        if (stack := getattr(self.__local, "stack", None)) is None:
+            stack = self.__local.stack = []
+        return stack
+
+    def add(self, span: CSpan):
+        with self.__lock:
+            self.spans.append(span)
+        return 0
+
+    @contextmanager
+    def stage(self, name: str, **attrs):
+        """
+        with TRACER.stage("orders.save", sec="opn") as span:
+            ...
+            span.rows = len(orders)
+
+        """
+        stack = self.__get_stack()
+        span = CSpan(
+            name=name, start=time.time(),
+            parent=stack[-1].name if stack else None,
+            thread=threading.current_thread().name,
+            attrs=attrs,
+        )
+        t0 = time.perf_counter()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = f"error: {type(e).__name__}"
+            raise
+        finally:
+            stack.pop()
+            span.wall = time.perf_counter() - t0
+            self.add(span)
+
+    def traced(self, name: str = None, rows: Callable[[object], int] = None):
+        """
+        decorator version of stage
+
+        :param name: default is module.function
+        :param rows: function of the return value to get rows of the span
+        """
+
+        def decorator(func: Callable):
+            span_name = name or f"{func.__module__}.{func.__name__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(span_name) as span:
+                    res = func(*args, **kwargs)
+                    if rows is not None:
+                        span.rows = rows(res)
+                    return res
+
+            return wrapper
+
+        return decorator
+
+    def summary(self) -> dict[str, dict]:
+        """
+
+        :return: {name: {"count", "wall", "rows", "bytes"}}, plus signal to order latency if available
+        """
+        res: dict[str, dict] = {}
+        with self.__lock:
+            spans = list(self.spans)
+        for span in spans:
+            s = res.setdefault(span.name, {"count": 0, "wall": 0.0, "rows": 0, "bytes": 0})
+            s["count"] += 1
+            s["wall"] += span.wall
+            s["rows"] += span.rows or 0
+            s["bytes"] += span.bytes or 0
+        signal_ts = [s.attrs["signal_mtime"] for s in spans if "signal_mtime" in s.attrs]
+        order_ts = [s.start + s.wall for s in spans if s.name == "orders.save"]
+        if signal_ts and order_ts:
+            res["signal_to_order"] = {"count": 1, "wall": max(order_ts) - min(signal_ts), "rows": 0, "bytes": 0}
+        return res
+
+    def save(self, trace_path: str) -> str:
+        if not self.spans:
+            return ""
+        check_and_makedirs(os.path.dirname(trace_path))
+        with self.__lock:
+            spans = [asdict(span) for span in self.spans]
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump({"meta": self.meta, "summary": self.summary(), "spans": spans}, f, ensure_ascii=False, indent=2)
+        print(f"[INF] Trace of this run is saved to {SFG(trace_path)}")
+        return trace_path
+
+
+TRACER = CTracer()
+
+
+def get_trace_path(traces_dir: str, run_id: str, timestamp: float = None) -> str:
+    """
+
+    :return: traces_dir/YYYY/MM/trace_{run_id}_{YYYYMMDD-HHMMSS}.json
+    """
+    ts = time.strftime("%Y%m%d-%H%M%S", time.localtime(timestamp))
+    return os.path.join(traces_dir, ts[0:4], ts[4:6], f"trace_{run_id}_{ts}.json")
+
+
+# --- httpx event hooks, put trace_request first in "request" hooks and trace_response first in
+# --- "response" hooks, so that wall time of a call is recorded even if later hooks raise
+
+
+def __get_content_length(message: httpx.Request | httpx.Response) -> int | None:
+    length = message.headers.get("content-length")
+    return int(length) if length is not None else None
+
+
+def trace_request(request: httpx.Request):
+    request.extensions["trace_t0"] = (time.time(), time.perf_counter())
+
+
+def trace_response(response: httpx.Response):
+    request = response.request
+    start, t0 = request.extensions.get("trace_t0", (time.time(), time.perf_counter()))
+    TRACER.add(CSpan(
+        name="http", start=start, wall=time.perf_counter() - t0,
+        bytes=(__get_content_length(request) or 0) + (__get_content_length(response) or 0),
+        status="ok" if response.is_success else f"http {response.status_code}",
+        thread=threading.current_thread().name,
+        attrs={"method": request.method, "path": request.url.path},
+    ))
+
+
+async def atrace_request(request: httpx.Request):
+    trace_request(request)
+
+
+async def atrace_response(response: httpx.Response):
+    trace_response(response)
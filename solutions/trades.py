@@ -1,29 +1,30 @@
 import os
 import pandas as pd
 from husfort.qutility import check_and_makedirs, SFG, SFY
-from husfort.qinstruments import parse_instrument_from_contract, CInstruMgr
-from typedef import CKey, CPos, CTrade, EnumSigs, EnumPOSD, EnumOFFSET
-from solutions.positions import load_position_tqdb, load_position_fuai
+from husfort.qinstruments import CInstruMgr
+from typedef import CKey, CPos, CPositionBook, CTrade, CTradeBatch, EnumSigs
+from solutions.positions import load_position_book_tqdb, load_position_book_fuai
+from solutions.contracts import CContractIndex, get_contract_index
+from solutions.trace import TRACER
+
+
+def cal_trades_from_book(this_book: CPositionBook, prev_book: CPositionBook) -> CTradeBatch:
+    return this_book.cal_trades_from_another(another=prev_book)
 
 
 def cal_trades_from_pos(
         this_pos_grp: dict[CKey, CPos],
         prev_pos_grp: dict[CKey, CPos],
 ) -> list[CTrade]:
-    res: list[CTrade] = []
-    for pos_key, prev_pos in prev_pos_grp.items():
-        this_pos = this_pos_grp.get(pos_key, CPos(key=pos_key, qty=0))
-        trade = this_pos.cal_trade_from_another(another=prev_pos)
-        res.append(trade) if trade.qty > 0 else None
-    for pos_key, this_pos in this_pos_grp.items():
-        if pos_key not in prev_pos_grp:
-            prev_pos = CPos(key=pos_key, qty=0)
-            trade = this_pos.cal_trade_from_another(another=prev_pos)
-            res.append(trade) if trade.qty > 0 else None
-    return res
+    trades_batch = cal_trades_from_book(
+        this_book=CPositionBook.from_dict(this_pos_grp),
+        prev_book=CPositionBook.from_dict(prev_pos_grp),
+    )
+    return trades_batch.to_trades()
 
 
-def gen_trades(
+@TRACER.traced("trades.gen", rows=len)
+def gen_trades_data(
         this_sig_date: str,
         prev_sig_date: str,
         sig_type: EnumSigs,
@@ -31,69 +32,96 @@ def gen_trades(
         positions_file_name_fuai_tmpl: str,
         positions_dir: str,
         use_tq: bool,
-) -> list[CTrade]:
-    this_pos_grp = load_position_tqdb(this_sig_date, sig_type, positions_file_name_tqdb_tmpl, positions_dir)
+) -> CTradeBatch:
+    this_book = load_position_book_tqdb(this_sig_date, sig_type, positions_file_name_tqdb_tmpl, positions_dir)
     if use_tq:
-        prev_pos_grp = load_position_tqdb(prev_sig_date, sig_type, positions_file_name_tqdb_tmpl, positions_dir)
+        prev_book = load_position_book_tqdb(prev_sig_date, sig_type, positions_file_name_tqdb_tmpl, positions_dir)
     else:
-        prev_pos_grp = load_position_fuai(this_sig_date, sig_type, positions_file_name_fuai_tmpl, positions_dir)
-    trades = cal_trades_from_pos(this_pos_grp=this_pos_grp, prev_pos_grp=prev_pos_grp)
-    return trades
+        prev_book = load_position_book_fuai(this_sig_date, sig_type, positions_file_name_fuai_tmpl, positions_dir)
+    return cal_trades_from_book(this_book=this_book, prev_book=prev_book)
 
 
-def save_trades(
-        trades: list[CTrade],
+def gen_trades(
+        this_sig_date: str,
+        prev_sig_date: str,
+        sig_type: EnumSigs,
+        positions_file_name_tqdb_tmpl: str,
+        positions_file_name_fuai_tmpl: str,
+        positions_dir: str,
+        use_tq: bool,
+) -> list[CTrade]:
+    trades_batch = gen_trades_data(
+        this_sig_date, prev_sig_date, sig_type,
+        positions_file_name_tqdb_tmpl, positions_file_name_fuai_tmpl, positions_dir, use_tq,
+    )
+    return trades_batch.to_trades()
+
+
+def save_trades_data(
+        trades_data: CTradeBatch,
         sig_date: str,
         sig_type: EnumSigs,
         trades_file_name_tmpl: str,
         trades_dir: str,
 ):
-    trades_data: list[dict] = []
-    for trade in trades:
-        trades_data.append(trade.to_dict())
     check_and_makedirs(d := os.path.join(trades_dir, sig_date[0:4], sig_date[4:6]))
     trades_file = trades_file_name_tmpl.format(sig_date, sig_type.value)
     trades_path = os.path.join(d, trades_file)
-    if trades_data:
-        df = pd.DataFrame(data=trades_data).sort_values(by="contract")
-        # print(df)
+    if len(trades_data) > 0:
+        df = trades_data.to_frame().sort_values(by="contract")
     else:
         df = pd.DataFrame(columns=CTrade.names())
         print(f"[INF] There are no trades available for {SFY(sig_date)}-{SFY(sig_type.value)}.")
-    df.to_csv(trades_path, index=False)
+    with TRACER.stage("trades.save", sig_type=sig_type.value) as span:
+        df.to_csv(trades_path, index=False)
+        span.rows, span.bytes = len(df), os.path.getsize(trades_path)
     print(f"[INF] Trades of {sig_date}-{sig_type.value} are saved to {SFG(trades_path)}")
     return 0
 
 
-def load_trades(
+def save_trades(
+        trades: list[CTrade],
         sig_date: str,
         sig_type: EnumSigs,
         trades_file_name_tmpl: str,
         trades_dir: str,
-) -> list[CTrade]:
+):
+    return save_trades_data(CTradeBatch.from_trades(trades), sig_date, sig_type, trades_file_name_tmpl, trades_dir)
+
+
+def load_trades_batch(
+        sig_date: str,
+        sig_type: EnumSigs,
+        trades_file_name_tmpl: str,
+        trades_dir: str,
+) -> CTradeBatch:
     trades_file = trades_file_name_tmpl.format(sig_date, sig_type.value)
     trades_path = os.path.join(trades_dir, sig_date[0:4], sig_date[4:6], trades_file)
     trades_data = pd.read_csv(trades_path, header=0)
-    trades: list[CTrade] = []
-    for _, r in trades_data.iterrows():
-        key = CKey(contract=r["contract"], direction=EnumPOSD(r["direction"]))
-        trade = CTrade(
-            key=key,
-            offset=EnumOFFSET(r["offset"]),
-            qty=r["qty"],
-            base_price=r["base_price"],
-            order_price=r["order_price"],
-        )
-        trades.append(trade)
-    return trades
-
-
-def split_trades(trades: list[CTrade], instru_mgr: CInstruMgr) -> tuple[list[CTrade], list[CTrade]]:
+    return CTradeBatch.from_frame(trades_data)
+
+
+def load_trades(
+        sig_date: str,
+        sig_type: EnumSigs,
+        trades_file_name_tmpl: str,
+        trades_dir: str,
+) -> list[CTrade]:
+    trades_batch = load_trades_batch(sig_date, sig_type, trades_file_name_tmpl, trades_dir)
+    return trades_batch.to_trades(nan_as_none=False)
+
+
+def split_trades(
+        trades: list[CTrade],
+        instru_mgr: CInstruMgr,
+        contract_index: CContractIndex = None,
+) -> tuple[list[CTrade], list[CTrade]]:
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    has_ngt_sec = contract_index.lookup([trade.key.contract for trade in trades], "has_ngt_sec")
     opn_pm_trades: list[CTrade] = []
     opn_am_trades: list[CTrade] = []
-    for trade in trades:
-        instru = parse_instrument_from_contract(contract=trade.key.contract)
-        if instru_mgr.has_ngt_sec(instru):
+    for trade, ngt in zip(trades, has_ngt_sec):
+        if ngt:
             opn_pm_trades.append(trade)
         else:
             opn_am_trades.append(trade)
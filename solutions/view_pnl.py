@@ -1,31 +1,36 @@
-from husfort.qinstruments import CInstruMgr, parse_instrument_from_contract
+from husfort.qinstruments import CInstruMgr
 from husfort.qviewer_pnl import CCfg, CManagerViewer, CPosition, CContract
-from solutions.md import req_depth_md_tianqin
+from solutions.contracts import CContractIndex, get_contract_index
+from solutions.md import close_tq_sessions
+from solutions.md_store import CMdSnapshotStore, req_depth_md_tianqin_with_store
 from solutions.positions import load_position_fuai
 from typedef import EnumSigs, CAccountTianqin, CKey, CPos, CDepthMd
 
 
-def convert_pos_to_tq_contracts(poses: dict[CKey, CPos], instru_mgr: CInstruMgr) -> list[str]:
-    tq_contracts: list[str] = []
-    for key, pos in poses.items():
-        instru = parse_instrument_from_contract(contract=key.contract)
-        exchange = instru_mgr.get_exchange(instru)
-        tq_contract = f"{exchange}.{key.contract}"
-        tq_contracts.append(tq_contract)
-    return tq_contracts
+def convert_pos_to_tq_contracts(
+        poses: dict[CKey, CPos],
+        instru_mgr: CInstruMgr,
+        contract_index: CContractIndex = None,
+) -> list[str]:
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    return contract_index.lookup([key.contract for key in poses], "tq_code").tolist()
 
 
 def convert_pos_to_positions(
         poses: dict[CKey, CPos],
         instru_mgr: CInstruMgr,
         depth_md: dict[str, CDepthMd],
+        contract_index: CContractIndex = None,
 ) -> list[CPosition]:
+    contract_index = get_contract_index(contract_index, instru_mgr)
+    contracts = [key.contract for key in poses]
+    instrus = contract_index.lookup(contracts, "instrument").tolist()
+    exchanges = contract_index.lookup(contracts, "exchange").tolist()
+    multipliers = contract_index.lookup(contracts, "multiplier").tolist()
+    tq_contracts = contract_index.lookup(contracts, "tq_code").tolist()
     positions: list[CPosition] = []
-    for key, pos in poses.items():
-        instru = parse_instrument_from_contract(contract=key.contract)
-        exchange = instru_mgr.get_exchange(instru)
-        multiplier = instru_mgr.get_multiplier(instru)
-        tq_contract = f"{exchange}.{key.contract}"
+    for (key, pos), instru, exchange, multiplier, tq_contract in zip(
+            poses.items(), instrus, exchanges, multipliers, tq_contracts):
         base_price = depth_md[tq_contract].pre_close
         position = CPosition(
             contract=CContract(
@@ -50,7 +55,10 @@ def view_pnl(
         positions_file_name_fuai_tmpl: str,
         positions_dir: str,
         instru_mgr: CInstruMgr,
+        md_store: CMdSnapshotStore = None,
+        contract_index: CContractIndex = None,
 ):
+    contract_index = get_contract_index(contract_index, instru_mgr)
     config = CCfg(account=account)
     poses = load_position_fuai(
         sig_date=exe_date,
@@ -58,13 +66,15 @@ def view_pnl(
         positions_file_name_fuai_tmpl=positions_file_name_fuai_tmpl,
         positions_dir=positions_dir,
     )
-    tq_contracts = convert_pos_to_tq_contracts(poses, instru_mgr)
-    depth_md: dict[str, CDepthMd] = req_depth_md_tianqin(
+    tq_contracts = convert_pos_to_tq_contracts(poses, instru_mgr, contract_index=contract_index)
+    depth_md: dict[str, CDepthMd] = req_depth_md_tianqin_with_store(
         tq_contracts=list(set(tq_contracts)),
         tq_account=account.userId,
         tq_password=account.password,
+        store=md_store,
     )
-    positions = convert_pos_to_positions(poses=poses, instru_mgr=instru_mgr, depth_md=depth_md)
+    positions = convert_pos_to_positions(poses=poses, instru_mgr=instru_mgr, depth_md=depth_md, contract_index=contract_index)
+    close_tq_sessions()  # CManagerViewer opens its own connection to Tianqin
     mgr = CManagerViewer(positions=positions, config=config, desc=f"{exe_date}-{sig_type.value}-PNL")
     mgr.main()
     return 0
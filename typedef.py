@@ -1,10 +1,25 @@
 import os
+import numpy as np
+import pandas as pd
 from enum import Enum
 from dataclasses import dataclass, fields
 from typing import Literal
 from husfort.qremote import CHost
 from husfort.qviewer_pnl import CAccountTianqin
 
+# ratios within this tolerance of an integer are treated as exact multiples of mini spread,
+# so 0.3 / 0.1 = 2.9999999999999996 is floored to 3 ticks instead of 2
+TICK_TOL = 1e-8
+
+
+def floor_to_tick(prices: np.ndarray | float, mini_spread: np.ndarray | float) -> np.ndarray:
+    """
+    largest multiple of mini_spread not greater than prices, without float-floor errors
+
+    """
+    ticks = np.floor(np.asarray(prices, dtype=np.float64) / mini_spread + TICK_TOL)
+    return np.round(ticks * mini_spread, 8)
+
 
 class EnumSigs(Enum):
     opn: str = "opn"
@@ -29,13 +44,34 @@ class EnumStrategyName(Enum):
     # cls: str = "胡晓欧截面CTA"
 
 
-@dataclass(frozen=True, eq=True)
+OP_DIRECTION: dict[tuple[EnumPOSD, EnumOFFSET], Literal["买", "卖"]] = {
+    (EnumPOSD.LNG, EnumOFFSET.OPN): "买",
+    (EnumPOSD.LNG, EnumOFFSET.CLS): "卖",
+    (EnumPOSD.SRT, EnumOFFSET.OPN): "卖",
+    (EnumPOSD.SRT, EnumOFFSET.CLS): "买",
+}
+
+OFFSET_FLAG: dict[EnumOFFSET, Literal["开仓", "平仓"]] = {
+    EnumOFFSET.OPN: "开仓",
+    EnumOFFSET.CLS: "平仓",
+}
+
+WIND_EXCHANGE: dict[str, str] = {
+    "SHFE": "SHF",
+    "DCE": "DCE",
+    "CZCE": "CZC",
+    "INE": "INE",
+    "GFE": "GFE",
+}
+
+
+@dataclass(frozen=True, eq=True, slots=True)
 class CKey:
     contract: str
     direction: EnumPOSD
 
 
-@dataclass
+@dataclass(slots=True)
 class CTrade:
     key: CKey
     offset: EnumOFFSET
@@ -45,20 +81,16 @@ class CTrade:
 
     @property
     def op_direction(self) -> Literal["买", "卖"]:
-        if self.key.direction == EnumPOSD.LNG:
-            return "买" if self.offset == EnumOFFSET.OPN else "卖"
-        elif self.key.direction == EnumPOSD.SRT:
-            return "卖" if self.offset == EnumOFFSET.OPN else "买"
-        else:
-            raise ValueError(f"Invalid direction: {self.key.direction}")
+        try:
+            return OP_DIRECTION[(self.key.direction, self.offset)]
+        except KeyError:
+            raise ValueError(f"Invalid direction: {self.key.direction} or offset: {self.offset}")
 
     @property
     def offsetFlag(self) -> Literal["开仓", "平仓"]:
-        if self.offset == EnumOFFSET.OPN:
-            return "开仓"
-        elif self.offset == EnumOFFSET.CLS:
-            return "平仓"
-        else:
+        try:
+            return OFFSET_FLAG[self.offset]
+        except KeyError:
             raise ValueError(f"Invalid offset: {self.offset}")
 
     def to_dict(self) -> dict:
@@ -80,11 +112,11 @@ class CTrade:
             order_price = self.base_price * (1 + drift)
         else:
             order_price = self.base_price * (1 - drift)
-        self.order_price = (order_price // mini_spread) * mini_spread
+        self.order_price = float(floor_to_tick(order_price, mini_spread))
         return 0
 
 
-@dataclass
+@dataclass(slots=True)
 class CPos:
     key: CKey
     qty: int
@@ -113,6 +145,181 @@ class CPos:
         }
 
 
+@dataclass
+class CTradeBatch:
+    """
+    struct-of-arrays of CTrade, direction and offset are stored as their enum values.
+    base_price and order_price are nan if not available
+    """
+    contract: np.ndarray
+    direction: np.ndarray
+    qty: np.ndarray
+    offset: np.ndarray
+    base_price: np.ndarray
+    order_price: np.ndarray
+
+    def __post_init__(self):
+        self.contract = np.asarray(self.contract, dtype=object)
+        self.direction = np.asarray(self.direction, dtype=np.int8)
+        self.qty = np.asarray(self.qty, dtype=np.int64)
+        self.offset = np.asarray(self.offset, dtype=np.int8)
+        self.base_price = np.asarray(self.base_price, dtype=np.float64)
+        self.order_price = np.asarray(self.order_price, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.contract)
+
+    @staticmethod
+    def names() -> list[str]:
+        return CTrade.names()
+
+    @staticmethod
+    def empty() -> "CTradeBatch":
+        return CTradeBatch(contract=[], direction=[], qty=[], offset=[], base_price=[], order_price=[])
+
+    @property
+    def op_direction(self) -> np.ndarray:
+        """
+        direction * offset > 0 means "买", like OP_DIRECTION
+        """
+        return np.where(self.direction * self.offset > 0, "买", "卖")
+
+    @property
+    def offsetFlag(self) -> np.ndarray:
+        return np.where(self.offset == EnumOFFSET.OPN.value, "开仓", "平仓")
+
+    def select(self, mask: np.ndarray) -> "CTradeBatch":
+        return CTradeBatch(
+            contract=self.contract[mask],
+            direction=self.direction[mask],
+            qty=self.qty[mask],
+            offset=self.offset[mask],
+            base_price=self.base_price[mask],
+            order_price=self.order_price[mask],
+        )
+
+    def to_dict(self) -> dict[str, np.ndarray]:
+        return {
+            "contract": self.contract,
+            "direction": self.direction,
+            "qty": self.qty,
+            "offset": self.offset,
+            "base_price": self.base_price,
+            "order_price": self.order_price,
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.to_dict(), columns=self.names())
+
+    @staticmethod
+    def from_frame(df: pd.DataFrame) -> "CTradeBatch":
+        return CTradeBatch(**{name: df[name].to_numpy() for name in CTrade.names()})
+
+    @staticmethod
+    def from_trades(trades: list[CTrade]) -> "CTradeBatch":
+        return CTradeBatch(
+            contract=[t.key.contract for t in trades],
+            direction=[t.key.direction.value for t in trades],
+            qty=[t.qty for t in trades],
+            offset=[t.offset.value for t in trades],
+            base_price=[np.nan if t.base_price is None else t.base_price for t in trades],
+            order_price=[np.nan if t.order_price is None else t.order_price for t in trades],
+        )
+
+    def to_trades(self, nan_as_none: bool = True) -> list[CTrade]:
+        """
+
+        :param nan_as_none: convert nan prices to None
+        """
+        trades: list[CTrade] = []
+        for contract, direction, qty, offset, base_price, order_price in zip(
+                self.contract, self.direction, self.qty, self.offset, self.base_price, self.order_price):
+            trade = CTrade(
+                key=CKey(contract=contract, direction=EnumPOSD(int(direction))),
+                offset=EnumOFFSET(int(offset)),
+                qty=int(qty),
+                base_price=None if (nan_as_none and np.isnan(base_price)) else float(base_price),
+                order_price=None if (nan_as_none and np.isnan(order_price)) else float(order_price),
+            )
+            trades.append(trade)
+        return trades
+
+
+@dataclass
+class CPositionBook:
+    """
+    Columnar position book, one row for each (contract, direction).
+    base_price is nan if not available
+    """
+    contract: np.ndarray
+    direction: np.ndarray
+    qty: np.ndarray
+    base_price: np.ndarray
+
+    def __post_init__(self):
+        self.contract = np.asarray(self.contract, dtype=object)
+        self.direction = np.asarray(self.direction, dtype=np.int8)
+        self.qty = np.asarray(self.qty, dtype=np.int64)
+        self.base_price = np.asarray(self.base_price, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.contract)
+
+    @staticmethod
+    def empty() -> "CPositionBook":
+        return CPositionBook(contract=[], direction=[], qty=[], base_price=[])
+
+    @staticmethod
+    def from_dict(poses: dict[CKey, CPos]) -> "CPositionBook":
+        return CPositionBook(
+            contract=[k.contract for k in poses],
+            direction=[k.direction.value for k in poses],
+            qty=[p.qty for p in poses.values()],
+            base_price=[np.nan if p.base_price is None else p.base_price for p in poses.values()],
+        )
+
+    def to_dict(self) -> dict[CKey, CPos]:
+        res: dict[CKey, CPos] = {}
+        for contract, direction, qty, base_price in zip(self.contract, self.direction, self.qty, self.base_price):
+            key = CKey(contract=contract, direction=EnumPOSD(int(direction)))
+            res[key] = CPos(key=key, qty=int(qty), base_price=None if np.isnan(base_price) else float(base_price))
+        return res
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "contract": self.contract,
+            "direction": self.direction,
+            "qty": self.qty,
+            "base_price": self.base_price,
+        })
+
+    def cal_trades_from_another(self, another: "CPositionBook") -> CTradeBatch:
+        """
+
+        :param another: the position book before trading
+        :return: trades to move from another to self.
+                 base_price of each trade comes from self, like CPos.cal_trade_from_another
+        """
+        merged = pd.merge(
+            left=self.to_frame(),
+            right=another.to_frame()[["contract", "direction", "qty"]],
+            on=["contract", "direction"],
+            how="outer",
+            suffixes=("_this", "_prev"),
+        )
+        d = merged["qty_this"].fillna(0).to_numpy(dtype=np.int64) - merged["qty_prev"].fillna(0).to_numpy(
+            dtype=np.int64)
+        traded = d != 0
+        return CTradeBatch(
+            contract=merged["contract"].to_numpy()[traded],
+            direction=merged["direction"].to_numpy()[traded],
+            qty=np.abs(d[traded]),
+            offset=np.where(d[traded] > 0, EnumOFFSET.OPN.value, EnumOFFSET.CLS.value),
+            base_price=merged["base_price"].to_numpy(dtype=np.float64)[traded],
+            order_price=np.full(traded.sum(), np.nan),
+        )
+
+
 @dataclass(frozen=True)
 class CPriceBounds:
     last: float
@@ -139,7 +346,7 @@ class CDepthMd:
     lower_lim: float
 
 
-@dataclass
+@dataclass(slots=True)
 class COrder:
     OrderType: str = "普通单"
     Exchange: str = None  # "DCE", "SHFE", "CZCE"
@@ -172,27 +379,96 @@ class COrder:
 
     @property
     def wind_code(self) -> str:
-        exchange_mapper = {
-            "SHFE": "SHF",
-            "DCE": "DCE",
-            "CZCE": "CZC",
-            "INE": "INE",
-            "GFE": "GFE",
-        }
-        return f"{self.Instrument.upper()}.{exchange_mapper[self.Exchange]}"
+        return f"{self.Instrument.upper()}.{WIND_EXCHANGE[self.Exchange]}"
 
     def update_order_price(self, price_bounds: CPriceBounds, drift: float, mini_spread: float):
         if self.Direction == "买":
             order_price = price_bounds.last * (1 + drift)
-            integer_multiple = (order_price // mini_spread) * mini_spread
+            integer_multiple = float(floor_to_tick(order_price, mini_spread))
             self.Price = min(integer_multiple, price_bounds.upper_lim)
         else:
             order_price = price_bounds.last * (1 - drift)
-            integer_multiple = (order_price // mini_spread) * mini_spread
+            integer_multiple = float(floor_to_tick(order_price, mini_spread))
             self.Price = max(integer_multiple, price_bounds.lower_lim)
         return 0
 
 
+@dataclass
+class COrderBatch:
+    """
+    struct-of-arrays of COrder, fields not listed here are constants
+    with the default values of COrder
+    """
+    Exchange: np.ndarray
+    Product: np.ndarray
+    Instrument: np.ndarray
+    Direction: np.ndarray
+    OfstFlag: np.ndarray
+    Price: np.ndarray
+    VolumeTotal: np.ndarray
+    Strategy: str = None
+
+    def __post_init__(self):
+        self.Exchange = np.asarray(self.Exchange, dtype=object)
+        self.Product = np.asarray(self.Product, dtype=object)
+        self.Instrument = np.asarray(self.Instrument, dtype=object)
+        self.Direction = np.asarray(self.Direction, dtype=object)
+        self.OfstFlag = np.asarray(self.OfstFlag, dtype=object)
+        self.Price = np.asarray(self.Price, dtype=np.float64)
+        self.VolumeTotal = np.asarray(self.VolumeTotal, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.Instrument)
+
+    @staticmethod
+    def names() -> list[str]:
+        return COrder.names()
+
+    @property
+    def wind_code(self) -> np.ndarray:
+        exchanges = np.array([WIND_EXCHANGE[e] for e in self.Exchange], dtype=object)
+        return np.char.add(np.char.add(np.char.upper(self.Instrument.astype(str)), "."), exchanges.astype(str))
+
+    def to_dict(self) -> dict[str, np.ndarray]:
+        n, default = len(self), COrder()
+        res: dict[str, np.ndarray] = {}
+        for name in self.names():
+            if name in ("Exchange", "Product", "Instrument", "Direction", "OfstFlag", "Price", "VolumeTotal"):
+                res[name] = getattr(self, name)
+            elif name == "Strategy":
+                res[name] = np.full(n, self.Strategy, dtype=object)
+            else:
+                res[name] = np.full(n, getattr(default, name), dtype=object)
+        return res
+
+    @staticmethod
+    def from_orders(orders: list[COrder]) -> "COrderBatch":
+        return COrderBatch(
+            Exchange=[o.Exchange for o in orders],
+            Product=[o.Product for o in orders],
+            Instrument=[o.Instrument for o in orders],
+            Direction=[o.Direction for o in orders],
+            OfstFlag=[o.OfstFlag for o in orders],
+            Price=[np.nan if o.Price is None else o.Price for o in orders],
+            VolumeTotal=[o.VolumeTotal for o in orders],
+            Strategy=orders[0].Strategy if orders else None,
+        )
+
+    def to_orders(self) -> list[COrder]:
+        return [
+            COrder(
+                Exchange=exchange, Product=product, Instrument=instrument,
+                Direction=direction, OfstFlag=ofst_flag,
+                Price=None if np.isnan(price) else float(price),
+                VolumeTotal=int(volume), Strategy=self.Strategy,
+            )
+            for exchange, product, instrument, direction, ofst_flag, price, volume in zip(
+                self.Exchange, self.Product, self.Instrument, self.Direction,
+                self.OfstFlag, self.Price, self.VolumeTotal,
+            )
+        ]
+
+
 @dataclass(frozen=True)
 class CAccountMail:
     host: str
@@ -250,3 +526,47 @@ class CCfg:
     @property
     def orders_dir(self) -> str:
         return os.path.join(self.project_data_dir, "orders")
+
+    @property
+    def pnl_dir(self) -> str:
+        return os.path.join(self.project_data_dir, "pnl")
+
+    @property
+    def checks_dir(self) -> str:
+        return os.path.join(self.project_data_dir, "checks")
+
+    @property
+    def traces_dir(self) -> str:
+        return os.path.join(self.project_data_dir, "traces")
+
+    @property
+    def signal_store_dir(self) -> str:
+        return os.path.join(self.project_data_dir, "signal_store")
+
+    @property
+    def replay_dir(self) -> str:
+        return os.path.join(self.project_data_dir, "replay")
+
+    @property
+    def snapshots_dir(self) -> str:
+        return os.path.join(self.project_data_dir, "snapshots")
+
+    @property
+    def contracts_dir(self) -> str:
+        return os.path.join(self.project_data_dir, "contracts")
+
+    @property
+    def md_snapshots_dir(self) -> str:
+        return os.path.join(self.project_data_dir, "md_snapshots")
+
+    @property
+    def wind_md_cache_path(self) -> str:
+        return os.path.join(self.project_data_dir, "wind_md.csv")
+
+    @property
+    def orbit_dir(self) -> str:
+        return os.path.join(self.project_data_dir, "orbit")
+
+    @property
+    def outbox_path(self) -> str:
+        return os.path.join(self.project_data_dir, "outbox.json")